@@ -11,6 +11,15 @@ class SasException( Exception ) :
         self._line = line
         self._msg = msg
 
+# (SasException.__init__ can't be inherited: it calls super( self.__class__ ))
+#
+class LimitExceeded( SasException ) :
+    """parse stopped by a limit: deadline, number of tokens, or value size"""
+    def __init__( self, line = 0, msg = "limit exceeded" ) :
+        Exception.__init__( self )
+        self._line = line
+        self._msg = msg
+
 # simple timings
 #
 from contextlib import contextmanager
@@ -31,12 +40,17 @@ def timer( label ) :
 #from ply.lex import LexError
 #
 #
-from .lexer import StarLexer
+from .lexer import StarLexer, ReplayLexer
 from .handlers import ErrorHandler, ContentHandlerBase, ContentHandler, ContentHandler2, SasContentHandler
+from .values import ValueBuffer, SpilledValue, LazyValue, ColumnIntern, Null, INAPPLICABLE, UNKNOWN, is_null
 from .parsebase import ParserBase
 from .nmrstar import SasParser, SansParser, Parser as SansParser2
 from .mmcif import CifParser
 from .ddl import DdlParser
+from .extract import TagExtractor
+from .query import Query, QueryHandler
+from .entry import Entry, Saveframe, Loop
+from .writer import StarWriter, WriterHandler
 #from .quickcheck import QuickCheck
 
 # because of PLY's design I can't easily re-use lexer regexps elsewhere. so here they are again.
@@ -70,13 +84,18 @@ TOKENS = {
 }
 
 #
-__all__ = ["TOKENS", "KEYWORDS", "SasException",
+__all__ = ["TOKENS", "KEYWORDS", "SasException", "LimitExceeded",
     "ContentHandlerBase", "ParserBase",
-    "StarLexer",
+    "StarLexer", "ReplayLexer", "ValueBuffer", "SpilledValue", "LazyValue", "ColumnIntern",
+    "Null", "INAPPLICABLE", "UNKNOWN", "is_null",
     "ErrorHandler", "ContentHandler", "ContentHandler2", "SasContentHandler",
     "SasParser", "SansParser", "SansParser2",
     "CifParser",
     "DdlParser",
+    "TagExtractor",
+    "Query", "QueryHandler",
+    "Entry", "Saveframe", "Loop",
+    "StarWriter", "WriterHandler",
 #    "QuickCheck"
     ]
 
@@ -0,0 +1,20 @@
+#!/usr/bin/python -u
+#
+# Benchmarks
+#
+# ``suite``: lexer and parser throughput over test files, with JSON baselines.
+# ``counters``: handlers that count callbacks.
+#
+# Run ``python sas/bench/suite.py -h`` for options.
+#
+
+from __future__ import absolute_import
+
+from .counters import CountingErrorHandler, CountingHandler, CountingHandler2, CountingSasHandler
+
+__all__ = [
+        "CountingErrorHandler",
+        "CountingHandler",
+        "CountingHandler2",
+        "CountingSasHandler",
+          ]
@@ -0,0 +1,85 @@
+#!/usr/bin/python -u
+#
+# Handlers that only count events, for benchmarks: one per content handler interface.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+
+_UP = os.path.join( os.path.split( __file__ )[0], "../.." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+#
+#
+class CountingErrorHandler( sas.ErrorHandler ) :
+    """counts messages instead of printing them"""
+    def __init__( self ) :
+        self.errors = 0
+        self.warnings = 0
+    def fatalError( self, line, msg ) :
+        self.errors += 1
+    def error( self, line, msg ) :
+        self.errors += 1
+        return True
+    def warning( self, line, msg ) :
+        self.warnings += 1
+        return False
+
+# common callbacks
+#
+class _Counting( object ) :
+    def __init__( self ) :
+        self.events = 0
+    def startData( self, line, name ) :
+        self.events += 1
+        return False
+    def endData( self, line, name ) :
+        self.events += 1
+    def startSaveframe( self, line, name ) :
+        self.events += 1
+        return False
+    def endSaveframe( self, line, name ) :
+        self.events += 1
+        return False
+    def startLoop( self, line ) :
+        self.events += 1
+        return False
+    def endLoop( self, line ) :
+        self.events += 1
+        return False
+    def comment( self, line, text ) :
+        self.events += 1
+        return False
+
+class CountingHandler( _Counting, sas.ContentHandler ) :
+    """``ContentHandler``: ``events`` is the number of callbacks"""
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        self.events += 1
+        return False
+
+class CountingHandler2( _Counting, sas.ContentHandler2 ) :
+    """``ContentHandler2``: ``events`` is the number of callbacks"""
+    def tag( self, line, tag ) :
+        self.events += 1
+        return False
+    def value( self, line, val, delim ) :
+        self.events += 1
+        return False
+
+class CountingSasHandler( _Counting, sas.SasContentHandler ) :
+    """``SasContentHandler``: ``events`` is the number of callbacks"""
+    def tag( self, line, tag ) :
+        self.events += 1
+        return False
+    def startValue( self, line, delim ) :
+        self.events += 1
+        return False
+    def endValue( self, line, delim ) :
+        self.events += 1
+        return False
+    def characters( self, line, val ) :
+        self.events += 1
+        return False
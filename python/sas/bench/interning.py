@@ -0,0 +1,93 @@
+#!/usr/bin/python -u
+#
+# Memory held by a handler that keeps all loop values, with and without ``intern_values``.
+#
+# The handler appends every loop value to a list. Retained size is the sum of ``sys.getsizeof()``
+# of the distinct value objects plus the lists themselves, so it doesn't depend on the allocator
+# or on what else the process holds. Also reported: parse time and the number of distinct objects.
+#
+# ``SansParser`` runs on ``.str`` files and ``CifParser`` on ``.cif`` files.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+
+_UP = os.path.join( os.path.split( __file__ )[0], "../.." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+from sas.bench import suite
+from sas.bench.counters import CountingErrorHandler
+
+SIZES = (None, 256, 1024, 4096)
+
+#
+#
+class RowKeeper( sas.ContentHandler ) :
+    """keeps loop values, one list per loop"""
+    def __init__( self, size = None ) :
+        self.intern_values = size
+        self.loops = []
+    def startData( self, line, name ) :
+        return False
+    def endData( self, line, name ) :
+        pass
+    def startSaveframe( self, line, name ) :
+        return False
+    def endSaveframe( self, line, name ) :
+        return False
+    def startLoop( self, line ) :
+        self.loops.append( [] )
+        return False
+    def endLoop( self, line ) :
+        return False
+    def comment( self, line, text ) :
+        return False
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        if inloop : self.loops[-1].append( val )
+        return False
+
+    def retained( self ) :
+        """returns (cells, distinct objects, bytes)"""
+        seen = set()
+        cells = 0
+        size = sys.getsizeof( self.loops )
+        for vals in self.loops :
+            size += sys.getsizeof( vals )
+            cells += len( vals )
+            for val in vals :
+                if id( val ) in seen : continue
+                seen.add( id( val ) )
+                size += sys.getsizeof( val )
+        return (cells, len( seen ), size)
+
+def measure( filename, size = None ) :
+    """returns ``dict`` of numbers for one parse of ``filename``"""
+    if filename.endswith( ".cif" ) : parser = sas.CifParser
+    else : parser = sas.SansParser
+    h = RowKeeper( size )
+    start = suite._clock()
+    with open( filename, "rU" ) as f :
+        parser.parse( lexer = sas.StarLexer( f, bufsize = 0 ), content_handler = h,
+            error_handler = CountingErrorHandler() )
+    secs = suite._clock() - start
+    (cells, objects, retained) = h.retained()
+    return { "file" : os.path.basename( filename ), "intern" : size, "cells" : cells, "objects" : objects,
+        "retained" : retained, "time" : round( secs, 3 ) }
+
+#
+#
+if __name__ == "__main__" :
+
+    files = sys.argv[1:]
+    if len( files ) < 1 :
+        files = [os.path.join( suite.TESTFILES, n ) for n in ("bmr15334_3.str", "3fke.cif")]
+    for filename in files :
+        base = None
+        for size in SIZES :
+            rc = measure( filename, size )
+            if base is None : base = rc["retained"]
+            sys.stdout.write( "%-16s intern %-5s %8d cells %8d objects %10.1f KB retained (%5.1f%%) %7.3fs\n"
+                % (rc["file"], size, rc["cells"], rc["objects"], rc["retained"] / 1024.0,
+                100.0 * rc["retained"] / base, rc["time"]) )
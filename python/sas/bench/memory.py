@@ -0,0 +1,245 @@
+#!/usr/bin/python -u
+#
+# Memory benchmarks: each parser with its handler interface (``suite.CASES``), one parse per
+# child process so that peak RSS belongs to that parse alone.
+#
+# The child measures memory above what it had before the parse: ``tracemalloc`` where it's
+# available (python 3.4+), resident set size otherwise. A sampling thread records memory while
+# the parser runs. Reported are
+#
+#   ``peak``     - highest memory during the parse
+#   ``steady``   - median of the samples
+#   ``retained`` - memory still held after the parse
+#
+# Resident set size is counted in whole pages and moves with the allocator's mood, so each case
+# is run ``repeat`` times (in fresh processes) and the smallest numbers are kept, and a baseline
+# comparison ignores changes under ``FLOOR`` bytes.
+#
+# The counting handlers keep nothing, so the numbers are what the parser and the callback
+# interface cost. Default inputs are ``testfiles`` plus synthetic files (``synth.Synth``)
+# with large text values and with large loops.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import gc
+import json
+import shutil
+import subprocess
+import tempfile
+import threading
+import resource
+
+_UP = os.path.join( os.path.split( __file__ )[0], "../.." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+from sas.bench import suite
+from sas.bench.synth import Synth
+
+try :
+    import tracemalloc
+except ImportError :
+    tracemalloc = None
+
+INTERVAL = 0.005
+THRESHOLD = 0.2
+REPEAT = 3
+FLOOR = 512 * 1024
+
+# synthetic inputs: name, Synth parameters
+#
+SYNTHETIC = (
+    ("text.str", { "saveframes" : 2, "rows" : 4, "columns" : 2, "items" : 2, "semicolon" : 0.5, "text_size" : 1048576 }),
+    ("loops.str", { "saveframes" : 2, "rows" : 20000, "columns" : 10 }),
+    ("loops.cif", { "saveframes" : 2, "rows" : 20000, "columns" : 10, "mmcif" : True }),
+)
+
+#
+# memory probes
+#
+_PAGE = os.sysconf( "SC_PAGE_SIZE" )
+
+def rss() :
+    """current resident set size, bytes"""
+    with open( "/proc/self/statm", "rb" ) as f :
+        return int( f.read().split()[1] ) * _PAGE
+
+# ru_maxrss survives exec() so it may be the parent's: use VmHWM, which can be reset
+#
+def reset_peak_rss() :
+    """start peak RSS count from current RSS (linux 4.0+)"""
+    try :
+        with open( "/proc/self/clear_refs", "wb" ) as f :
+            f.write( "5" )
+    except (IOError, OSError) :
+        pass
+
+def peak_rss() :
+    """peak resident set size, bytes"""
+    with open( "/proc/self/status", "rb" ) as f :
+        for line in f :
+            if line.startswith( "VmHWM:" ) :
+                return int( line.split()[1] ) * 1024
+    return resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss * 1024
+
+class _Sampler( threading.Thread ) :
+    def __init__( self, probe ) :
+        threading.Thread.__init__( self )
+        self.daemon = True
+        self.samples = []
+        self._probe = probe
+        self._stop = threading.Event()
+    def run( self ) :
+        while not self._stop.is_set() :
+            self.samples.append( self._probe() )
+            self._stop.wait( INTERVAL )
+    def stop( self ) :
+        self._stop.set()
+        self.join()
+
+#
+# child: run one case on one file, return the numbers
+#
+def measure( case, filename ) :
+    func = None
+    for (name, exts, unit, f) in suite.CASES :
+        if name == case : func = f
+    if func is None :
+        raise sas.SasException( msg = "unknown case %s" % (case,) )
+
+    lexer = sas.StarLexer( bufsize = 0 )
+    gc.collect()
+    if tracemalloc is not None :
+        method = "tracemalloc"
+        tracemalloc.start()
+        probe = lambda : tracemalloc.get_traced_memory()[0]
+    else :
+        method = "rss"
+        probe = rss
+        reset_peak_rss()
+    base = probe()
+
+    sampler = _Sampler( probe )
+    sampler.start()
+    start = suite._clock()
+    func( lexer, filename )
+    secs = suite._clock() - start
+    sampler.stop()
+
+    if tracemalloc is not None :
+        peak = tracemalloc.get_traced_memory()[1]
+    else :
+        peak = peak_rss()
+    gc.collect()
+    retained = probe()
+    if tracemalloc is not None : tracemalloc.stop()
+
+    samples = sorted( sampler.samples )
+    if len( samples ) < 1 : samples = [retained]
+    return {
+        "case" : case,
+        "file" : os.path.basename( filename ),
+        "bytes" : os.path.getsize( filename ),
+        "method" : method,
+        "peak" : max( 0, peak - base ),
+        "steady" : max( 0, samples[len( samples ) // 2] - base ),
+        "retained" : max( 0, retained - base ),
+        "samples" : len( samples ),
+        "time" : round( secs, 3 )
+    }
+
+#
+# parent
+#
+def synthetic_files( outdir ) :
+    """write ``SYNTHETIC`` files into ``outdir``, returns their names"""
+    rc = []
+    for (name, params) in SYNTHETIC :
+        filename = os.path.join( outdir, name )
+        Synth( **params ).write_file( filename )
+        rc.append( filename )
+    return rc
+
+# one child process: returns measure() result
+#
+def _child( case, filename ) :
+    p = subprocess.Popen( [sys.executable, os.path.realpath( __file__ ), "--child", case, filename],
+        stdout = subprocess.PIPE )
+    (stdout, stderr) = p.communicate()
+    if p.returncode != 0 :
+        raise sas.SasException( msg = "%s on %s failed" % (case, filename) )
+    return json.loads( stdout )
+
+def run( files = None, cases = None, out = None, repeat = REPEAT ) :
+    """
+    Run each case on each file in a child process ``repeat`` times, returns results ``dict``
+    with the smallest of each number (saved and compared with ``suite.save()`` and
+    ``suite.compare()``).
+    """
+    tmp = None
+    if files is None :
+        tmp = tempfile.mkdtemp()
+        files = suite.default_files() + synthetic_files( tmp )
+    results = {}
+    try :
+        for (name, exts, unit, func) in suite.CASES :
+            if (cases is not None) and (not name in cases) : continue
+            for filename in files :
+                if os.path.splitext( filename )[1] not in exts : continue
+                rc = _child( name, filename )
+                for i in range( repeat - 1 ) :
+                    more = _child( name, filename )
+                    for field in ("peak", "steady", "retained", "time") :
+                        rc[field] = min( rc[field], more[field] )
+                rc["runs"] = repeat
+                results["%s:%s" % (name, rc["file"])] = rc
+                if out is not None :
+                    out.write( "%-16s %-16s %10.1f KB peak %10.1f KB steady %10.1f KB retained (%s)\n"
+                        % (name, rc["file"], rc["peak"] / 1024.0, rc["steady"] / 1024.0, rc["retained"] / 1024.0,
+                        rc["method"]) )
+    finally :
+        if tmp is not None : shutil.rmtree( tmp )
+    return results
+
+#
+#
+if __name__ == "__main__" :
+
+    if (len( sys.argv ) == 4) and (sys.argv[1] == "--child") :
+        sys.stdout.write( json.dumps( measure( sys.argv[2], sys.argv[3] ) ) )
+        sys.exit( 0 )
+
+    import argparse
+
+    par = argparse.ArgumentParser( description = "SAS memory benchmarks" )
+    par.add_argument( "-n", "--repeat", dest = "repeat", type = int, default = REPEAT,
+        help = "runs per case, smallest numbers are kept" )
+    par.add_argument( "-c", "--case", dest = "cases", action = "append", help = "run only this case (repeatable)" )
+    par.add_argument( "-s", "--save", dest = "save", help = "write results to this JSON baseline" )
+    par.add_argument( "-b", "--baseline", dest = "baseline", help = "compare with this JSON baseline" )
+    par.add_argument( "-t", "--threshold", dest = "threshold", type = float, default = THRESHOLD,
+        help = "regression threshold, fraction of baseline peak" )
+    par.add_argument( "-f", "--floor", dest = "floor", type = int, default = FLOOR,
+        help = "ignore peak changes smaller than this many bytes" )
+    par.add_argument( "files", nargs = "*", help = "input files (default: testfiles and synthetic files)" )
+    args = par.parse_args()
+
+    files = args.files
+    if len( files ) < 1 : files = None
+    results = run( files, args.cases, sys.stdout, max( 1, args.repeat ) )
+
+    if args.save is not None :
+        suite.save( results, args.save, 1 )
+
+    if args.baseline is not None :
+        (rows, regressions) = suite.compare( suite.load( args.baseline ), results, args.threshold,
+            field = "peak", lower_is_better = True, floor = args.floor )
+        for (key, old, new, change) in rows :
+            flag = (key in regressions) and "REGRESSION" or ""
+            sys.stdout.write( "%-38s %10d -> %10d peak %+7.1f%% %s\n" % (key, old, new, change * 100, flag) )
+        if len( regressions ) > 0 :
+            sys.stdout.write( "%d regression(s) over %0.0f%% and %d KB\n" % (len( regressions ), args.threshold * 100,
+                args.floor // 1024) )
+            sys.exit( 1 )
@@ -0,0 +1,101 @@
+#!/usr/bin/python -u
+#
+# Scaling harness: generates synthetic files of growing size (``synth.Synth``, one parameter
+# varied, the others fixed) and times each parser from ``suite.CASES`` on them.
+#
+# For each pair of successive sizes it reports the exponent ``log( t2 / t1 ) / log( s2 / s1 )``
+# (``s`` is file size): about 1 means linear scaling, about 2 quadratic.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import math
+import shutil
+import tempfile
+
+_UP = os.path.join( os.path.split( __file__ )[0], "../.." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+from sas.bench import suite
+from sas.bench.synth import Synth
+
+#
+#
+def scale( vary, values, params = None, mmcif = False, trials = 3, cases = None, tmpdir = None, out = None ) :
+    """
+    Time parsers on synthetic files where parameter ``vary`` takes each of ``values``.
+
+    ``params`` are other ``Synth`` parameters. Returns ``{ case : [(value, bytes, seconds), ...] }``.
+    """
+    if params is None : params = {}
+    ext = mmcif and ".cif" or ".str"
+
+# DDL syntax is NMR-STAR's: DdlParser runs on the NMR-STAR files too
+#
+    kinds = mmcif and (".cif",) or (".str", ".dic")
+    lexer = sas.StarLexer( bufsize = 0 )
+    rc = {}
+    tmp = tempfile.mkdtemp( dir = tmpdir )
+    try :
+        for val in values :
+            p = dict( params )
+            p[vary] = val
+            filename = os.path.join( tmp, "synth" + ext )
+            size = Synth( mmcif = mmcif, **p ).write_file( filename )
+            for (name, exts, unit, func) in suite.CASES :
+                if len( [k for k in kinds if k in exts] ) < 1 : continue
+                if (cases is not None) and (not name in cases) : continue
+                best = None
+                for i in range( trials ) :
+                    start = suite._clock()
+                    func( lexer, filename )
+                    secs = suite._clock() - start
+                    if (best is None) or (secs < best) : best = secs
+                rc.setdefault( name, [] ).append( (val, size, best) )
+                if out is not None :
+                    out.write( "%-16s %s=%-8s %12d bytes %9.3fs %8.3f MB/s\n"
+                        % (name, vary, val, size, best, size / best / 1048576.0) )
+    finally :
+        shutil.rmtree( tmp )
+    return rc
+
+def exponents( points ) :
+    """``(value, bytes, seconds)`` points -> list of ``(value, exponent)`` for successive pairs"""
+    rc = []
+    for i in range( 1, len( points ) ) :
+        (v1, s1, t1) = points[i - 1]
+        (v2, s2, t2) = points[i]
+        if (s2 == s1) or (t1 <= 0) or (t2 <= 0) : continue
+        rc.append( (v2, math.log( t2 / t1 ) / math.log( float( s2 ) / s1 )) )
+    return rc
+
+#
+#
+if __name__ == "__main__" :
+
+    import argparse
+
+    par = argparse.ArgumentParser( description = "parser scaling on synthetic files" )
+    par.add_argument( "--cif", dest = "mmcif", action = "store_true", help = "mmCIF instead of NMR-STAR" )
+    par.add_argument( "-v", "--vary", dest = "vary", default = "rows",
+        choices = ("saveframes", "loops", "rows", "columns", "items", "text_size"), help = "parameter to vary" )
+    par.add_argument( "-n", "--trials", dest = "trials", type = int, default = 3 )
+    par.add_argument( "-c", "--case", dest = "cases", action = "append", help = "run only this parser (repeatable)" )
+    par.add_argument( "-p", "--param", dest = "params", action = "append", default = [],
+        help = "fixed Synth parameter, name=value (repeatable)" )
+    par.add_argument( "values", nargs = "*", type = int, help = "values of the varied parameter" )
+    args = par.parse_args()
+
+    params = {}
+    for p in args.params :
+        (k, v) = p.split( "=", 1 )
+        params[k] = (k in ("quoted", "semicolon")) and float( v ) or int( v )
+    values = args.values
+    if len( values ) < 1 : values = [1000, 2000, 4000, 8000, 16000]
+
+    results = scale( args.vary, values, params, args.mmcif, args.trials, args.cases, out = sys.stdout )
+    sys.stdout.write( "\n" )
+    for name in sorted( results.keys() ) :
+        sys.stdout.write( "%-16s %s\n" % (name, "  ".join( "%s:%0.2f" % (v, e) for (v, e) in exponents( results[name] ) )) )
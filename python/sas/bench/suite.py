@@ -0,0 +1,187 @@
+#!/usr/bin/python -u
+#
+# Throughput benchmarks: the lexer alone (iterator and send() modes) and each parser with
+# its handler interface, over a set of files.
+#
+# Each (case, file) is run ``trials`` times; the best time gives MB/s and tokens/s (lexer)
+# or events/s (parsers, ``events`` is the number of handler callbacks). Results are saved
+# as JSON and a later run can be compared against them: a case whose MB/s dropped by more
+# than ``threshold`` (fraction) is a regression.
+#
+# Which cases run on a file is decided by its extension: ``.str`` - NMR-STAR parsers,
+# ``.cif`` - ``CifParser``, ``.dic`` - ``DdlParser``. Lexer cases run on all files.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import glob
+import json
+import platform
+import timeit
+
+_UP = os.path.join( os.path.split( __file__ )[0], "../.." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+from sas.bench.counters import CountingErrorHandler, CountingHandler, CountingHandler2, CountingSasHandler
+
+TESTFILES = os.path.realpath( os.path.join( os.path.split( __file__ )[0], "../../../testfiles" ) )
+TRIALS = 5
+THRESHOLD = 0.1
+FORMAT = 1
+
+_clock = timeit.default_timer
+
+#
+# cases: callable( lexer, filename ) -> number of tokens/events
+#
+def lex_iter( lexer, filename ) :
+    n = 0
+    with open( filename, "rU" ) as f :
+        lexer.reset( f, bufsize = 0 )
+        for t in lexer :
+            n += 1
+    return n
+
+def lex_send( lexer, filename ) :
+    n = 0
+    lexer.reset()
+    with open( filename, "rU" ) as f :
+        for line in f :
+            lexer.send( line )
+            for t in lexer :
+                n += 1
+    return n
+
+def _parser_case( parser, handler ) :
+    def case( lexer, filename ) :
+        h = handler()
+        with open( filename, "rU" ) as f :
+            lexer.reset( f, bufsize = 0 )
+            parser.parse( lexer = lexer, content_handler = h, error_handler = CountingErrorHandler() )
+        return h.events
+    return case
+
+# name, file extensions, unit, callable
+#
+CASES = (
+    ("lexer-iter", (".str", ".cif", ".dic"), "tokens", lex_iter),
+    ("lexer-send", (".str", ".cif", ".dic"), "tokens", lex_send),
+    ("SansParser", (".str",), "events", _parser_case( sas.SansParser, CountingHandler )),
+    ("SasParser", (".str",), "events", _parser_case( sas.SasParser, CountingSasHandler )),
+    ("nvparser.Parser", (".str",), "events", _parser_case( sas.SansParser2, CountingHandler2 )),
+    ("CifParser", (".cif",), "events", _parser_case( sas.CifParser, CountingHandler )),
+    ("DdlParser", (".dic",), "events", _parser_case( sas.DdlParser, CountingHandler )),
+)
+
+def default_files() :
+    return sorted( glob.glob( os.path.join( TESTFILES, "*" ) ) )
+
+#
+#
+def run( files = None, trials = TRIALS, cases = None, out = None ) :
+    """
+    Run benchmarks, returns results ``dict`` (see ``save()``).
+
+    ``cases`` is a list of case names (default: all), ``out`` a stream for progress lines.
+    """
+    if files is None : files = default_files()
+    lexer = sas.StarLexer( bufsize = 0 )
+    results = {}
+    for (name, exts, unit, func) in CASES :
+        if (cases is not None) and (not name in cases) : continue
+        for filename in files :
+            if os.path.splitext( filename )[1] not in exts : continue
+            size = os.path.getsize( filename )
+            times = []
+            for i in range( trials ) :
+                start = _clock()
+                count = func( lexer, filename )
+                times.append( _clock() - start )
+            times.sort()
+            best = max( times[0], 1e-9 )
+            rc = {
+                "case" : name,
+                "file" : os.path.basename( filename ),
+                "bytes" : size,
+                unit : count,
+                "best" : round( times[0], 6 ),
+                "median" : round( times[len( times ) // 2], 6 ),
+                "MB/s" : round( size / best / 1048576.0, 3 ),
+                unit + "/s" : round( count / best, 1 )
+            }
+            results["%s:%s" % (name, rc["file"])] = rc
+            if out is not None :
+                out.write( "%-16s %-20s %8.3f MB/s %12.1f %s/s\n" % (name, rc["file"], rc["MB/s"], rc[unit + "/s"], unit) )
+    return results
+
+#
+# baselines
+#
+def save( results, filename, trials = TRIALS ) :
+    """write results as JSON baseline"""
+    doc = { "format" : FORMAT, "python" : platform.python_version(), "machine" : platform.node(),
+        "trials" : trials, "results" : results }
+    with open( filename, "wb" ) as f :
+        json.dump( doc, f, indent = 1, sort_keys = True )
+
+def load( filename ) :
+    """returns results ``dict`` from a baseline"""
+    with open( filename, "rU" ) as f :
+        doc = json.load( f )
+    if doc.get( "format" ) != FORMAT :
+        raise sas.SasException( msg = "unsupported baseline format in %s" % (filename,) )
+    return doc["results"]
+
+def compare( baseline, results, threshold = THRESHOLD, field = "MB/s", lower_is_better = False, floor = 0 ) :
+    """
+    returns list of ``(key, old, new, change)`` of ``field`` for cases present in both,
+    and list of keys of those that got worse by more than ``threshold`` (fraction)
+    and by more than ``floor`` (in units of ``field``)
+    """
+    rows = []
+    regressions = []
+    for key in sorted( results.keys() ) :
+        if not key in baseline : continue
+        old = baseline[key][field]
+        new = results[key][field]
+        if old <= 0 : continue
+        change = float( new - old ) / old
+        rows.append( (key, old, new, change) )
+        if lower_is_better : change = -change
+        if (change < -threshold) and (abs( new - old ) > floor) :
+            regressions.append( key )
+    return (rows, regressions)
+
+#
+#
+if __name__ == "__main__" :
+
+    import argparse
+
+    par = argparse.ArgumentParser( description = "SAS throughput benchmarks" )
+    par.add_argument( "-n", "--trials", dest = "trials", type = int, default = TRIALS, help = "trials per case" )
+    par.add_argument( "-c", "--case", dest = "cases", action = "append", help = "run only this case (repeatable)" )
+    par.add_argument( "-s", "--save", dest = "save", help = "write results to this JSON baseline" )
+    par.add_argument( "-b", "--baseline", dest = "baseline", help = "compare with this JSON baseline" )
+    par.add_argument( "-t", "--threshold", dest = "threshold", type = float, default = THRESHOLD,
+        help = "regression threshold, fraction of baseline MB/s" )
+    par.add_argument( "files", nargs = "*", help = "input files (default: testfiles)" )
+    args = par.parse_args()
+
+    files = args.files
+    if len( files ) < 1 : files = None
+    results = run( files, args.trials, args.cases, sys.stdout )
+
+    if args.save is not None :
+        save( results, args.save, args.trials )
+
+    if args.baseline is not None :
+        (rows, regressions) = compare( load( args.baseline ), results, args.threshold )
+        for (key, old, new, change) in rows :
+            flag = (key in regressions) and "REGRESSION" or ""
+            sys.stdout.write( "%-38s %8.3f -> %8.3f MB/s %+7.1f%% %s\n" % (key, old, new, change * 100, flag) )
+        if len( regressions ) > 0 :
+            sys.stdout.write( "%d regression(s) over %0.0f%%\n" % (len( regressions ), args.threshold * 100) )
+            sys.exit( 1 )
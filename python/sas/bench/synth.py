@@ -0,0 +1,142 @@
+#!/usr/bin/python -u
+#
+# Synthetic NMR-STAR and mmCIF input for scaling benchmarks.
+#
+# Output is deterministic for given parameters (and seed). NMR-STAR has ``saveframes`` saveframes,
+# each with ``items`` free tags and ``loops`` loops; mmCIF has the same number of categories,
+# without saveframes. Loops have ``rows`` rows of ``columns`` values. Values are numbers and
+# words; a ``quoted`` fraction of them are quoted phrases and a ``semicolon`` fraction are
+# semicolon-delimited text blocks of about ``text_size`` characters.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import random
+
+_UP = os.path.join( os.path.split( __file__ )[0], "../.." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+WORDS = ("ALA", "ARG", "ASN", "ASP", "CYS", "GLN", "GLU", "GLY", "HIS", "ILE", "LEU", "LYS",
+    "MET", "PHE", "PRO", "SER", "THR", "TRP", "TYR", "VAL", "CA", "CB", "HA", "N", "H", "C",
+    "protein", "sample", "buffer", "spectrometer", "assigned", "chemical", "shift", "peak")
+
+#
+#
+class Synth( object ) :
+    """
+    Generator of synthetic STAR files; see module comment for parameters.
+    """
+
+    def __init__( self, saveframes = 10, loops = 1, rows = 100, columns = 8, items = 10,
+            quoted = 0.1, semicolon = 0.01, text_size = 200, mmcif = False, seed = 1 ) :
+        self.saveframes = saveframes
+        self.loops = loops
+        self.rows = rows
+        self.columns = columns
+        self.items = items
+        self.quoted = quoted
+        self.semicolon = semicolon
+        self.text_size = text_size
+        self.mmcif = bool( mmcif )
+        self.seed = seed
+
+    @property
+    def params( self ) :
+        """parameters as ``dict``"""
+        return dict( (k, getattr( self, k )) for k in ("saveframes", "loops", "rows", "columns", "items",
+            "quoted", "semicolon", "text_size", "mmcif", "seed") )
+
+    # values
+    #
+    def _text( self ) :
+        lines = []
+        size = 0
+        line = []
+        while size < self.text_size :
+            w = self._rnd.choice( WORDS )
+            line.append( w )
+            size += len( w ) + 1
+            if len( line ) > 10 :
+                lines.append( " ".join( line ) )
+                line = []
+        if len( line ) > 0 : lines.append( " ".join( line ) )
+        return "\n;%s\n;\n" % ("\n".join( lines ),)
+
+    def _value( self ) :
+        r = self._rnd.random()
+        if r < self.semicolon : return self._text()
+        r -= self.semicolon
+        if r < self.quoted : return "'%s %s'" % (self._rnd.choice( WORDS ), self._rnd.choice( WORDS ))
+        r = self._rnd.random()
+        if r < 0.4 : return str( self._rnd.randint( 1, 10000 ) )
+        if r < 0.7 : return "%0.3f" % (self._rnd.uniform( -100, 200 ),)
+        if r < 0.8 : return "."
+        return self._rnd.choice( WORDS )
+
+    #
+    #
+    def write( self, out ) :
+        """write the file to ``out``"""
+        self._rnd = random.Random( self.seed )
+        out.write( "data_synth\n\n" )
+        if self.mmcif : (ind1, ind2) = ("", "")
+        else : (ind1, ind2) = ("   ", "      ")
+        for i in range( self.saveframes ) :
+            buf = []
+            cat = "_Synth_%d" % (i + 1,)
+            if not self.mmcif :
+                buf.append( "save_synth_%d\n" % (i + 1,) )
+                buf.append( "%s%s.Sf_category synth_%d\n" % (ind1, cat, i + 1) )
+            for j in range( self.items ) :
+                buf.append( "%s%s.Item_%d %s\n" % (ind1, cat, j + 1, self._value()) )
+            out.write( "".join( buf ) )
+
+            for j in range( self.loops ) :
+                loop = "%s_loop_%d" % (cat, j + 1)
+                buf = ["\n%sloop_\n" % (ind1,)]
+                for k in range( self.columns ) :
+                    buf.append( "%s%s.Col_%d\n" % (ind2, loop, k + 1) )
+                buf.append( "\n" )
+                for r in range( self.rows ) :
+                    buf.append( "%s%s\n" % (ind2, " ".join( self._value() for k in range( self.columns ) )) )
+                    if len( buf ) > 1000 :
+                        out.write( "".join( buf ) )
+                        buf = []
+                if not self.mmcif : buf.append( "\n%sstop_\n" % (ind1,) )
+                out.write( "".join( buf ) )
+
+            if not self.mmcif : out.write( "save_\n\n" )
+            else : out.write( "#\n" )
+
+    def write_file( self, filename ) :
+        """write the file, returns its size"""
+        with open( filename, "wb" ) as f :
+            self.write( f )
+        return os.path.getsize( filename )
+
+#
+#
+if __name__ == "__main__" :
+
+    import argparse
+
+    par = argparse.ArgumentParser( description = "write synthetic NMR-STAR or mmCIF to stdout" )
+    par.add_argument( "--cif", dest = "mmcif", action = "store_true", help = "mmCIF" )
+    par.add_argument( "--saveframes", type = int, default = 10 )
+    par.add_argument( "--loops", type = int, default = 1, help = "loops per saveframe" )
+    par.add_argument( "--rows", type = int, default = 100 )
+    par.add_argument( "--columns", type = int, default = 8 )
+    par.add_argument( "--items", type = int, default = 10, help = "free tags per saveframe" )
+    par.add_argument( "--quoted", type = float, default = 0.1, help = "fraction of quoted values" )
+    par.add_argument( "--semicolon", type = float, default = 0.01, help = "fraction of semicolon-delimited values" )
+    par.add_argument( "--text-size", dest = "text_size", type = int, default = 200 )
+    par.add_argument( "--seed", type = int, default = 1 )
+    args = par.parse_args()
+
+    s = Synth( saveframes = args.saveframes, loops = args.loops, rows = args.rows, columns = args.columns,
+        items = args.items, quoted = args.quoted, semicolon = args.semicolon, text_size = args.text_size,
+        mmcif = args.mmcif, seed = args.seed )
+    s.write( sys.stdout )
@@ -0,0 +1,492 @@
+#!/usr/bin/python -u
+#
+# Binary cache of parse events.
+#
+# ``EventRecorder`` sits between a parser and the real handlers and records every
+# ``ContentHandler`` and ``ErrorHandler`` callback into a compact binary stream. ``replay()``
+# feeds a recorded stream to any ``ContentHandler``/``ErrorHandler`` pair without lexing.
+# ``EventCache`` ties it together with a store: a directory or an sqlite file, with LRU size cap.
+#
+# Stream format (all integers little-endian):
+#   header : "SASE" + uint16 format version
+#   record : uint8 opcode + payload
+#     TAG                     : int32 line + uint32 length + bytes
+#                               (tag table entry: tag and its line, IDs are assigned in order)
+#     START/END DATA, SAVE    : int32 line + uint32 length + bytes
+#     START/END LOOP          : int32 line
+#     COMMENT, WARNING, ERROR, FATAL : int32 line + uint32 length + bytes
+#     data item               : uint32 tag ID + int32 value line + uint8 (short) or uint32 length
+#                               + bytes. Delimiter, "inloop" flag, and short/long are in the opcode:
+#                               16 + delimiter code * 2 + inloop, plus 16 if long.
+#
+# Recording keeps going after errors and after the handler asked to stop (nothing is forwarded
+# after that), so a stream is the complete parse and replays the same way regardless of what
+# the handlers return. For the same reason all tags are recorded as plain strings: the handler's
+# ``wanted_tags`` and ``null_values`` are applied when events are forwarded or replayed.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import struct
+import hashlib
+import sqlite3
+import tempfile
+import time
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+MAGIC = b"SASE"
+VERSION = 1
+
+(_TAG, _START_DATA, _END_DATA, _START_SAVE, _END_SAVE, _START_LOOP, _END_LOOP, _COMMENT,
+    _WARNING, _ERROR, _FATAL) = range( 11 )
+_SHORT = 16
+_LONG = 32
+
+# delimiters as passed to data()
+#
+_DELIMS = (None, "$", "'", "'''", '"', '"""', ";")
+_DELIM_CODES = dict( (d, i) for (i, d) in enumerate( _DELIMS ) )
+
+_HEADER = struct.Struct( "<4sH" )
+_OP = struct.Struct( "<B" )
+_LINE = struct.Struct( "<i" )
+_LINE_LEN = struct.Struct( "<iI" )
+_SHORT_REC = struct.Struct( "<IiB" )
+_LONG_REC = struct.Struct( "<IiI" )
+
+# data item opcode -> (record, delimiter, inloop)
+#
+_DATA_OPS = {}
+for (_i, _d) in enumerate( _DELIMS ) :
+    for _l in (0, 1) :
+        _DATA_OPS[_SHORT + _i * 2 + _l] = (_SHORT_REC, _d, bool( _l ))
+        _DATA_OPS[_LONG + _i * 2 + _l] = (_LONG_REC, _d, bool( _l ))
+
+if sys.version_info[0] > 2 :
+    def _b( s ) :
+        return s.encode( "utf-8" )
+    def _s( b ) :
+        return b.decode( "utf-8" )
+else :
+    def _b( s ) :
+        if isinstance( s, unicode ) : return s.encode( "utf-8" )
+        return s
+    def _s( b ) :
+        return b
+
+# unquoted value : sas.Null if the handler wants nulls, else None
+#
+def _null_map( content_handler ) :
+    if getattr( content_handler, "null_values", False ) : return sas.values.NULL_VALUES
+    return None
+
+#
+#
+class EventRecorder( sas.ContentHandler, sas.ErrorHandler ) :
+    """
+    Record parse events, optionally passing them on to ``content_handler`` and ``error_handler``.
+
+    Once either of those returns ``True`` (stop) the events are no longer passed on, but recording
+    continues to EOF. ``getvalue()`` returns the recorded stream.
+
+    The recorder itself wants all tags and gets nulls as strings; ``content_handler``'s
+    ``wanted_tags`` and ``null_values`` are applied to what is passed on.
+    """
+
+    def __init__( self, content_handler = None, error_handler = None ) :
+        self._ch = content_handler
+        self._eh = error_handler
+        self._wanted = getattr( content_handler, "wanted_tags", None )
+        self._nulls = _null_map( content_handler )
+        self._forward = (content_handler is not None) or (error_handler is not None)
+        self._tags = {}
+        self._out = [_HEADER.pack( MAGIC, VERSION )]
+
+    def getvalue( self ) :
+        """recorded stream"""
+        return b"".join( self._out )
+
+    #
+    #
+    def _str( self, op, line, text ) :
+        b = _b( text )
+        self._out.append( _OP.pack( op ) + _LINE_LEN.pack( line, len( b ) ) )
+        self._out.append( b )
+
+    def _pass( self, rc ) :
+        if rc : self._forward = False
+        return False
+
+# ErrorHandler
+#
+    def fatalError( self, line, msg ) :
+        self._str( _FATAL, line, msg )
+        if self._forward and (self._eh is not None) :
+            self._eh.fatalError( line, msg )
+        self._forward = False
+    def error( self, line, msg ) :
+        self._str( _ERROR, line, msg )
+        if self._forward and (self._eh is not None) :
+            return self._pass( self._eh.error( line, msg ) )
+        return False
+    def warning( self, line, msg ) :
+        self._str( _WARNING, line, msg )
+        if self._forward and (self._eh is not None) :
+            return self._pass( self._eh.warning( line, msg ) )
+        return False
+
+# ContentHandler
+#
+    def startData( self, line, name ) :
+        self._str( _START_DATA, line, name )
+        if self._forward and (self._ch is not None) :
+            return self._pass( self._ch.startData( line, name ) )
+        return False
+    def endData( self, line, name ) :
+        self._str( _END_DATA, line, name )
+        if self._forward and (self._ch is not None) :
+            self._ch.endData( line, name )
+    def startSaveframe( self, line, name ) :
+        self._str( _START_SAVE, line, name )
+        if self._forward and (self._ch is not None) :
+            return self._pass( self._ch.startSaveframe( line, name ) )
+        return False
+    def endSaveframe( self, line, name ) :
+        self._str( _END_SAVE, line, name )
+        if self._forward and (self._ch is not None) :
+            return self._pass( self._ch.endSaveframe( line, name ) )
+        return False
+    def startLoop( self, line ) :
+        self._out.append( _OP.pack( _START_LOOP ) + _LINE.pack( line ) )
+        if self._forward and (self._ch is not None) :
+            return self._pass( self._ch.startLoop( line ) )
+        return False
+    def endLoop( self, line ) :
+        self._out.append( _OP.pack( _END_LOOP ) + _LINE.pack( line ) )
+        if self._forward and (self._ch is not None) :
+            return self._pass( self._ch.endLoop( line ) )
+        return False
+    def comment( self, line, text ) :
+        self._str( _COMMENT, line, text )
+        if self._forward and (self._ch is not None) :
+            return self._pass( self._ch.comment( line, text ) )
+        return False
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        tagid = self._tags.get( (tag, tagline) )
+        if tagid is None :
+            tagid = len( self._tags )
+            self._tags[(tag, tagline)] = tagid
+            self._str( _TAG, tagline, tag )
+        b = _b( val )
+        op = _DELIM_CODES[delim] * 2 + (inloop and 1 or 0)
+        if len( b ) < 256 :
+            self._out.append( _OP.pack( _SHORT + op ) + _SHORT_REC.pack( tagid, valline, len( b ) ) )
+        else :
+            self._out.append( _OP.pack( _LONG + op ) + _LONG_REC.pack( tagid, valline, len( b ) ) )
+        self._out.append( b )
+        if self._forward and (self._ch is not None) :
+            if (self._wanted is not None) and (not tag in self._wanted) : return False
+            if (self._nulls is not None) and (delim is None) and (val in self._nulls) : val = self._nulls[val]
+            return self._pass( self._ch.data( tag, tagline, val, valline, delim, inloop ) )
+        return False
+
+#
+#
+def check( data ) :
+    """
+    Walk recorded stream ``data`` without calling anything, raise ``sas.SasException`` if it is
+    truncated or malformed. (``replay()`` may have called the handlers before it finds a problem.)
+    """
+    if (len( data ) < _HEADER.size) or (_HEADER.unpack_from( data, 0 ) != (MAGIC, VERSION)) :
+        raise sas.SasException( msg = "not a SAS event stream (or wrong version)" )
+
+    ntags = 0
+    end = len( data )
+    pos = _HEADER.size
+    while pos < end :
+        op = _OP.unpack_from( data, pos )[0]
+        pos += _OP.size
+        if op >= _SHORT :
+            rec = _DATA_OPS.get( op )
+            if rec is None : break
+            rec = rec[0]
+            if pos + rec.size > end : break
+            (tagid, valline, length) = rec.unpack_from( data, pos )
+            if tagid >= ntags :
+                raise sas.SasException( msg = "undefined tag ID %d in SAS event stream" % (tagid,) )
+            pos += rec.size + length
+        elif op in (_START_LOOP, _END_LOOP) :
+            pos += _LINE.size
+        elif op <= _FATAL :
+            if pos + _LINE_LEN.size > end : break
+            (line, length) = _LINE_LEN.unpack_from( data, pos )
+            pos += _LINE_LEN.size + length
+            if op == _TAG : ntags += 1
+        else :
+            raise sas.SasException( msg = "bad opcode %d in SAS event stream" % (op,) )
+    if pos != end :
+        raise sas.SasException( msg = "truncated or bad SAS event stream" )
+
+#
+#
+def replay( data, content_handler, error_handler ) :
+    """
+    Feed recorded stream ``data`` to handlers.
+
+    Callbacks work the same as with a parser: return ``True`` to stop. ``wanted_tags``
+    and ``null_values`` are honoured, ``row_filters`` are not. A malformed stream raises
+    ``sas.SasException`` part way through, use ``check()`` first if that matters.
+    """
+    assert isinstance( content_handler, sas.ContentHandler )
+    assert isinstance( error_handler, sas.ErrorHandler )
+
+    (magic, version) = _HEADER.unpack_from( data, 0 )
+    if (magic != MAGIC) or (version != VERSION) :
+        raise sas.SasException( msg = "not a SAS event stream (or wrong version)" )
+
+    ch = content_handler
+    eh = error_handler
+    wanted = ch.wanted_tags
+    nulls = _null_map( ch )
+    tags = []
+    keep = []
+    end = len( data )
+    pos = _HEADER.size
+    op_size = _OP.size
+    data_ops = _DATA_OPS
+    unpack_op = _OP.unpack_from
+    unpack_str = _LINE_LEN.unpack_from
+
+    while pos < end :
+        op = unpack_op( data, pos )[0]
+        pos += op_size
+
+        if op >= _SHORT :
+            (rec, delim, inloop) = data_ops[op]
+            (tagid, valline, length) = rec.unpack_from( data, pos )
+            pos += rec.size + length
+            if not keep[tagid] : continue
+            (tag, tagline) = tags[tagid]
+            val = _s( data[pos - length:pos] )
+            if (nulls is not None) and (delim is None) and (val in nulls) : val = nulls[val]
+            if ch.data( tag, tagline, val, valline, delim, inloop ) :
+                return
+
+        elif op in (_START_LOOP, _END_LOOP) :
+            line = _LINE.unpack_from( data, pos )[0]
+            pos += _LINE.size
+            if op == _START_LOOP : rc = ch.startLoop( line )
+            else : rc = ch.endLoop( line )
+            if rc : return
+
+        else :
+            (line, length) = unpack_str( data, pos )
+            pos += _LINE_LEN.size + length
+            text = _s( data[pos - length:pos] )
+            if op == _TAG :
+                tags.append( (text, line) )
+                keep.append( (wanted is None) or (text in wanted) )
+            elif op == _START_DATA :
+                if ch.startData( line, text ) : return
+            elif op == _END_DATA :
+                ch.endData( line, text )
+            elif op == _START_SAVE :
+                if ch.startSaveframe( line, text ) : return
+            elif op == _END_SAVE :
+                if ch.endSaveframe( line, text ) : return
+            elif op == _COMMENT :
+                if ch.comment( line, text ) : return
+            elif op == _WARNING :
+                if eh.warning( line, text ) : return
+            elif op == _ERROR :
+                if eh.error( line, text ) : return
+            elif op == _FATAL :
+                eh.fatalError( line, text )
+                return
+            else :
+                raise sas.SasException( msg = "bad opcode %d in SAS event stream" % (op,) )
+
+#######################################################
+# stores: get( key ) returns bytes or None, put( key, data )
+#
+class DirectoryCache( object ) :
+    """
+    One file per entry in ``path``, least recently used entries are removed when total size
+    goes over ``max_bytes``.
+    """
+
+    def __init__( self, path, max_bytes = 256 * 1024 * 1024 ) :
+        self._path = os.path.realpath( path )
+        self._max = int( max_bytes )
+        if not os.path.isdir( self._path ) :
+            os.makedirs( self._path )
+
+    def _file( self, key ) :
+        return os.path.join( self._path, key + ".sase" )
+
+    def get( self, key ) :
+        name = self._file( key )
+        try :
+            with open( name, "rb" ) as f :
+                data = f.read()
+        except (IOError, OSError) :
+            return None
+
+# last access time is file's mtime
+#
+        try :
+            os.utime( name, None )
+        except OSError :
+            pass
+        return data
+
+    def put( self, key, data ) :
+        (fd, tmp) = tempfile.mkstemp( dir = self._path, suffix = ".tmp" )
+        with os.fdopen( fd, "wb" ) as f :
+            f.write( data )
+        os.rename( tmp, self._file( key ) )
+        self._evict()
+
+    def _evict( self ) :
+        files = []
+        total = 0
+        for name in os.listdir( self._path ) :
+            if not name.endswith( ".sase" ) : continue
+            name = os.path.join( self._path, name )
+            try :
+                st = os.stat( name )
+            except OSError :
+                continue
+            files.append( (st.st_mtime, st.st_size, name) )
+            total += st.st_size
+
+        files.sort()
+        for (mtime, size, name) in files :
+            if total <= self._max : break
+            try :
+                os.unlink( name )
+                total -= size
+            except OSError :
+                pass
+
+#
+#
+class SqliteCache( object ) :
+    """
+    Entries are rows in an sqlite table, least recently used entries are removed when total size
+    goes over ``max_bytes``.
+    """
+
+    def __init__( self, filename, max_bytes = 256 * 1024 * 1024 ) :
+        self._max = int( max_bytes )
+        self._db = sqlite3.connect( filename )
+        self._db.execute( "create table if not exists sas_cache (key text primary key, data blob, " \
+            + "size integer, atime real)" )
+        self._db.commit()
+
+    def close( self ) :
+        self._db.close()
+
+    def get( self, key ) :
+        row = self._db.execute( "select data from sas_cache where key=?", (key,) ).fetchone()
+        if row is None : return None
+        self._db.execute( "update sas_cache set atime=? where key=?", (time.time(), key) )
+        self._db.commit()
+        return bytes( row[0] )
+
+    def put( self, key, data ) :
+        self._db.execute( "insert or replace into sas_cache (key,data,size,atime) values (?,?,?,?)",
+            (key, sqlite3.Binary( data ), len( data ), time.time()) )
+        total = self._db.execute( "select sum(size) from sas_cache" ).fetchone()[0] or 0
+        if total > self._max :
+            for (k, size) in self._db.execute( "select key,size from sas_cache order by atime" ).fetchall() :
+                if total <= self._max : break
+                self._db.execute( "delete from sas_cache where key=?", (k,) )
+                total -= size
+        self._db.commit()
+
+#######################################################
+#
+#
+class EventCache( object ) :
+    """
+    Parse files through a cache.
+
+    ``store`` is a ``DirectoryCache`` or ``SqliteCache`` (or anything with the same ``get()``
+    and ``put()``). Entries are keyed by parser class and file path, size, and mtime, or by
+    parser class and SHA-1 of file contents if ``use_hash`` is true.
+    """
+
+    def __init__( self, store, use_hash = False ) :
+        self._store = store
+        self._use_hash = bool( use_hash )
+
+    #
+    #
+    def key( self, filename, parser ) :
+        """cache key for ``filename`` parsed by ``parser`` class"""
+        h = hashlib.sha1()
+        h.update( _b( "%s.%s:%d:" % (parser.__module__, parser.__name__, VERSION) ) )
+        if self._use_hash :
+            with open( filename, "rb" ) as f :
+                while True :
+                    buf = f.read( 1024 * 1024 )
+                    if not buf : break
+                    h.update( buf )
+        else :
+            st = os.stat( filename )
+            h.update( _b( "%s:%d:%r" % (os.path.realpath( filename ), st.st_size, st.st_mtime) ) )
+        return h.hexdigest()
+
+    #
+    #
+    def parse_file( self, filename, parser, content_handler, error_handler, verbose = False ) :
+        """
+        Replay events for ``filename`` from cache or parse it with ``parser`` (e.g. ``sas.SansParser``)
+        and store them.
+
+        Returns ``True`` on cache hit.
+        """
+        key = self.key( filename, parser )
+        data = self._store.get( key )
+
+# check the whole entry first: once replay() has started the handler can't be reset
+#
+        if data is not None :
+            try :
+                check( data )
+            except (sas.SasException, struct.error) :
+                if verbose : sys.stdout.write( "bad cache entry for %s, re-parsing\n" % (filename,) )
+                data = None
+        if data is not None :
+            replay( data, content_handler, error_handler )
+            return True
+
+        rec = EventRecorder( content_handler, error_handler )
+        with open( filename, "rU" ) as f :
+            lex = sas.StarLexer( f, bufsize = 0, verbose = verbose )
+            parser.parse( lexer = lex, content_handler = rec, error_handler = rec, verbose = verbose )
+        self._store.put( key, rec.getvalue() )
+        return False
+
+#
+#
+if __name__ == "__main__" :
+
+    if len( sys.argv ) < 3 :
+        sys.stderr.write( "usage: %s cachedir file [file ...]\n" % (sys.argv[0],) )
+        sys.exit( 1 )
+
+    import sas.nmrstar.sansparser
+    c = EventCache( DirectoryCache( sys.argv[1] ) )
+    for filename in sys.argv[2:] :
+        with sas.timer( "%s (1st)" % (filename,) ) :
+            c.parse_file( filename, sas.SansParser, sas.nmrstar.sansparser.Ch(), sas.ErrorHandler() )
+        with sas.timer( "%s (2nd)" % (filename,) ) :
+            c.parse_file( filename, sas.SansParser, sas.nmrstar.sansparser.Ch(), sas.ErrorHandler() )
@@ -0,0 +1,233 @@
+#!/usr/bin/python -u
+#
+# NMR-STAR ``_Atom_chem_shift`` loop to typed arrays.
+#
+# The parser is given only the needed ``_Atom_chem_shift`` tags (``wanted_tags``), so values in
+# other saveframes and loop columns are not assembled and not passed to the handler.
+#
+# Numeric columns are ``array.array``s: ids are ``"i"`` (int32, null is -1), shift values and
+# errors are ``"d"`` (float64, null is NaN). Atom and residue names are ``Categorical``: list
+# of distinct values plus an ``"i"`` array of indices into it.
+#
+# The parser passes unquoted nulls as ``sas.Null`` (``null_values``), so numeric columns test
+# them by type; quoted or empty values are only compared with ``NULLS`` if they don't convert.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import array
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+CATEGORY = "_Atom_chem_shift"
+NULLS = ("", ".", "?")
+INT_NULL = -1
+FLOAT_NULL = float( "nan" )
+
+#
+#
+class Categorical( object ) :
+    """dictionary-encoded strings: ``categories`` list and ``codes`` array of indices into it"""
+
+    __slots__ = ("categories", "codes", "_index")
+
+    def __init__( self ) :
+        self.categories = []
+        self.codes = array.array( "i" )
+        self._index = {}
+
+    def append( self, val ) :
+        code = self._index.get( val )
+        if code is None :
+            code = len( self.categories )
+            self._index[val] = code
+            self.categories.append( val )
+        self.codes.append( code )
+
+    def __len__( self ) :
+        return len( self.codes )
+
+    def __getitem__( self, idx ) :
+        return self.categories[self.codes[idx]]
+
+    def __iter__( self ) :
+        cats = self.categories
+        return (cats[c] for c in self.codes)
+
+#
+#
+class ChemShifts( object ) :
+    """columns of ``_Atom_chem_shift`` loop(s)"""
+
+    INT_COLUMNS = ("Assigned_chem_shift_list_ID", "Entity_ID", "Seq_ID")
+    FLOAT_COLUMNS = ("Val", "Val_err")
+    STR_COLUMNS = ("Comp_ID", "Atom_ID", "Atom_type")
+
+    def __init__( self ) :
+        self.columns = {}
+        for col in self.INT_COLUMNS : self.columns[col] = array.array( "i" )
+        for col in self.FLOAT_COLUMNS : self.columns[col] = array.array( "d" )
+        for col in self.STR_COLUMNS : self.columns[col] = Categorical()
+
+    def __len__( self ) :
+        return max( len( c ) for c in self.columns.values() )
+
+    def __getitem__( self, col ) :
+        return self.columns[col]
+
+    # columns missing from a loop: fill with nulls
+    #
+    def _pad( self ) :
+        n = len( self )
+        for (col, c) in self.columns.items() :
+            if len( c ) < n :
+                if col in self.INT_COLUMNS : c.extend( [INT_NULL] * (n - len( c )) )
+                elif col in self.FLOAT_COLUMNS : c.extend( [FLOAT_NULL] * (n - len( c )) )
+                else :
+                    for i in range( n - len( c ) ) : c.append( None )
+
+#
+#
+class ChemShiftExtractor( sas.ContentHandler ) :
+    """
+    Collect ``_Atom_chem_shift`` loops into ``shifts`` (``ChemShifts``)
+    """
+
+    null_values = True
+
+    #
+    #
+    @classmethod
+    def extract( cls, fp, error_handler = None, verbose = False ) :
+        """parse ``fp`` with ``SansParser``, returns ``ChemShifts``"""
+        if error_handler is None : error_handler = sas.ErrorHandler()
+        h = cls()
+        lex = sas.StarLexer( fp, bufsize = 0, verbose = verbose )
+        sas.SansParser.parse( lexer = lex, content_handler = h, error_handler = error_handler, verbose = verbose )
+        return h.shifts
+
+    @classmethod
+    def extract_file( cls, filename, error_handler = None, verbose = False ) :
+        with open( filename, "rU" ) as f :
+            return cls.extract( f, error_handler, verbose )
+
+    #
+    #
+    def __init__( self ) :
+        self.shifts = ChemShifts()
+
+# tag -> callable( value ) that converts and appends
+#
+        self._append = {}
+        for col in ChemShifts.INT_COLUMNS :
+            self._append[CATEGORY + "." + col] = self._int_appender( self.shifts[col] )
+        for col in ChemShifts.FLOAT_COLUMNS :
+            self._append[CATEGORY + "." + col] = self._float_appender( self.shifts[col] )
+        for col in ChemShifts.STR_COLUMNS :
+            self._append[CATEGORY + "." + col] = self.shifts[col].append
+        self.wanted_tags = frozenset( self._append.keys() )
+
+    @staticmethod
+    def _int_appender( arr ) :
+        append = arr.append
+        def f( val ) :
+            if val.__class__ is sas.Null : append( INT_NULL )
+            else :
+                try :
+                    append( int( val ) )
+                except ValueError :
+                    if val in NULLS : append( INT_NULL )
+                    else : raise
+        return f
+
+    @staticmethod
+    def _float_appender( arr ) :
+        append = arr.append
+        def f( val ) :
+            if val.__class__ is sas.Null : append( FLOAT_NULL )
+            else :
+                try :
+                    append( float( val ) )
+                except ValueError :
+                    if val in NULLS : append( FLOAT_NULL )
+                    else : raise
+        return f
+
+# SAS callbacks
+#
+    def startData( self, line, name ) :
+        return False
+    def endData( self, line, name ) :
+        pass
+    def startSaveframe( self, line, name ) :
+        return False
+    def endSaveframe( self, line, name ) :
+        return False
+    def startLoop( self, line ) :
+        return False
+    def comment( self, line, text ) :
+        return False
+
+    def endLoop( self, line ) :
+        self.shifts._pad()
+        return False
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        if inloop :
+            self._append[tag]( val )
+        return False
+
+#
+#
+if __name__ == "__main__" :
+
+# benchmark: naive handler gets every item and keeps rows as dicts, converts at the end
+#
+    import time
+
+    class Naive( sas.ContentHandler ) :
+        def __init__( self ) :
+            self.rows = []
+            self._row = None
+        def startData( self, line, name ) :
+            return False
+        def endData( self, line, name ) :
+            pass
+        def startSaveframe( self, line, name ) :
+            return False
+        def endSaveframe( self, line, name ) :
+            return False
+        def startLoop( self, line ) :
+            return False
+        def endLoop( self, line ) :
+            return False
+        def comment( self, line, text ) :
+            return False
+        def data( self, tag, tagline, val, valline, delim, inloop ) :
+            if inloop and tag.startswith( CATEGORY + "." ) :
+                col = tag[len( CATEGORY ) + 1:]
+                if (self._row is None) or (col in self._row) :
+                    self._row = {}
+                    self.rows.append( self._row )
+                self._row[col] = val
+            return False
+
+    def naive( filename ) :
+        h = Naive()
+        with open( filename, "rU" ) as f :
+            sas.SansParser.parse( lexer = sas.StarLexer( f, bufsize = 0 ), content_handler = h,
+                error_handler = sas.ErrorHandler() )
+        return [(int( r["Seq_ID"] ), r["Comp_ID"], r["Atom_ID"], float( r["Val"] )) for r in h.rows]
+
+    filenames = sys.argv[1:]
+    for (label, func) in (("naive", naive), ("extractor", ChemShiftExtractor.extract_file)) :
+        start = time.time()
+        n = 0
+        for filename in filenames :
+            n += len( func( filename ) )
+        secs = time.time() - start
+        sys.stdout.write( "%s: %d shifts, %0.3fs, %0.2f entries/s\n" % (label, n, secs, len( filenames ) / secs) )
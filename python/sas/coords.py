@@ -0,0 +1,195 @@
+#!/usr/bin/python -u
+#
+# mmCIF ``_atom_site`` to numpy arrays.
+#
+# Only the needed columns are requested from the parser (``wanted_tags``), values are kept
+# as strings until the loop ends and then converted a column at a time. Parsing stops after
+# the ``_atom_site`` loop.
+#
+# Float columns are float32 with nulls ("?" and ".") as NaN, integer columns are int32
+# with nulls as -1, string columns are fixed-width byte strings. The parser passes nulls as
+# ``sas.Null`` (``null_values``), so the null mask of each column is collected as values come
+# in instead of comparing every cell once the loop is done.
+#
+# ``save()`` writes one ``.npy`` file per column, ``load()`` maps them back without parsing.
+#
+# Needs numpy.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import numpy
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+CATEGORY = "_atom_site"
+INT_NULL = -1
+
+#
+#
+class AtomSiteExtractor( sas.ContentHandler ) :
+    """
+    Collect ``_atom_site`` columns, ``arrays`` is a ``dict`` of column name : numpy array
+    (only columns that are in the file).
+    """
+
+    FLOAT_COLUMNS = ("Cartn_x", "Cartn_y", "Cartn_z", "occupancy", "B_iso_or_equiv")
+    INT_COLUMNS = ("id", "label_seq_id", "auth_seq_id", "pdbx_PDB_model_num")
+    STR_COLUMNS = ("group_PDB", "type_symbol", "label_atom_id", "label_alt_id", "label_comp_id",
+        "label_asym_id", "auth_asym_id")
+
+    null_values = True
+
+    #
+    #
+    @classmethod
+    def extract( cls, fp, error_handler = None, verbose = False, **kwargs ) :
+        """parse ``fp`` with ``CifParser``, returns ``dict`` of arrays"""
+        if error_handler is None : error_handler = sas.ErrorHandler()
+        h = cls( **kwargs )
+        lex = sas.StarLexer( fp, bufsize = 0, verbose = verbose )
+        sas.CifParser.parse( lexer = lex, content_handler = h, error_handler = error_handler, verbose = verbose )
+        return h.arrays
+
+    @classmethod
+    def extract_file( cls, filename, error_handler = None, verbose = False, **kwargs ) :
+        with open( filename, "rU" ) as f :
+            return cls.extract( f, error_handler, verbose, **kwargs )
+
+    #
+    #
+    def __init__( self, float_columns = None, int_columns = None, str_columns = None ) :
+        if float_columns is None : float_columns = self.FLOAT_COLUMNS
+        if int_columns is None : int_columns = self.INT_COLUMNS
+        if str_columns is None : str_columns = self.STR_COLUMNS
+
+        self._types = {}
+        for col in float_columns : self._types[col] = numpy.float32
+        for col in int_columns : self._types[col] = numpy.int32
+        for col in str_columns : self._types[col] = numpy.string_
+
+        prefix = CATEGORY + "."
+        self._names = dict( (prefix + col, col) for col in self._types.keys() )
+        self.wanted_tags = frozenset( self._names.keys() )
+
+        self._cols = {}
+        self._nulls = {}
+        self._arrays = None
+
+    @property
+    def arrays( self ) :
+        if self._arrays is None :
+            self._arrays = {}
+            for (tag, vals) in self._cols.items() :
+                col = self._names[tag]
+
+# no index list means no nulls in that column, unless the parser doesn't pass sas.Null
+#
+                nulls = None
+                if self.null_values : nulls = self._nulls.get( tag, [] )
+                self._arrays[col] = _convert( vals, self._types[col], nulls )
+            self._cols = {}
+            self._nulls = {}
+        return self._arrays
+
+    def save( self, outdir ) :
+        """write arrays to ``outdir/<column>.npy``"""
+        save( self.arrays, outdir )
+
+# SAS callbacks
+#
+    def startData( self, line, name ) :
+        return False
+    def endData( self, line, name ) :
+        pass
+    def startLoop( self, line ) :
+        return False
+    def comment( self, line, text ) :
+        return False
+
+# stop after _atom_site loop
+#
+    def endLoop( self, line ) :
+        return len( self._cols ) > 0
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        col = self._cols.get( tag )
+        if col is None :
+            col = []
+            self._cols[tag] = col
+        if val.__class__ is sas.Null :
+            nulls = self._nulls.get( tag )
+            if nulls is None :
+                nulls = []
+                self._nulls[tag] = nulls
+            nulls.append( len( col ) )
+        col.append( val )
+        return False
+
+#
+#
+def _convert( vals, dtype, nulls = None ) :
+    """
+    list of strings to array of ``dtype``, ``nulls`` is list of indices of null values,
+    or ``None`` to find them by comparing values with "?" and "."
+    """
+    arr = numpy.array( vals, dtype = numpy.string_ )
+    if dtype is numpy.string_ :
+        return arr
+    if nulls is None :
+        mask = (arr == "?") | (arr == ".")
+    elif len( nulls ) < 1 :
+        return arr.astype( dtype )
+    else :
+        mask = numpy.zeros( len( vals ), dtype = bool )
+        mask[nulls] = True
+    if not mask.any() :
+        return arr.astype( dtype )
+
+# fill values don't fit in a column of narrower strings: convert the rest, then fill
+#
+    rc = numpy.empty( len( vals ), dtype = dtype )
+    if dtype is numpy.int32 : rc[mask] = INT_NULL
+    else : rc[mask] = numpy.nan
+    rc[~mask] = arr[~mask].astype( dtype )
+    return rc
+
+def save( arrays, outdir ) :
+    """write ``dict`` of arrays to ``outdir/<name>.npy``"""
+    if not os.path.isdir( outdir ) :
+        os.makedirs( outdir )
+    for (name, arr) in arrays.items() :
+        numpy.save( os.path.join( outdir, name + ".npy" ), arr )
+
+def save_npz( arrays, filename ) :
+    """write ``dict`` of arrays to one (uncompressed) ``.npz`` file"""
+    numpy.savez( filename, **arrays )
+
+def load( outdir, mmap_mode = "r" ) :
+    """``dict`` of arrays saved by ``save()``, memory-mapped by default"""
+    rc = {}
+    for name in os.listdir( outdir ) :
+        if name.endswith( ".npy" ) :
+            rc[name[:-4]] = numpy.load( os.path.join( outdir, name ), mmap_mode = mmap_mode )
+    return rc
+
+#
+#
+if __name__ == "__main__" :
+
+    if len( sys.argv ) < 3 :
+        sys.stderr.write( "usage: %s file.cif outdir\n" % (sys.argv[0],) )
+        sys.exit( 1 )
+
+    with sas.timer( "extract" ) :
+        arrays = AtomSiteExtractor.extract_file( sys.argv[1] )
+    with sas.timer( "save" ) :
+        save( arrays, sys.argv[2] )
+    with sas.timer( "load" ) :
+        arrays = load( sys.argv[2] )
+    for name in sorted( arrays.keys() ) :
+        sys.stdout.write( "%s: %s %s\n" % (name, arrays[name].dtype, arrays[name].shape) )
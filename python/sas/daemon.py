@@ -0,0 +1,390 @@
+#!/usr/bin/python -u
+#
+# Parse/validate/extract service on a Unix socket.
+#
+# Worker processes are started once and keep a ``StarLexer`` (reset for each request) and
+# compiled dictionaries (by file name, see ``sas.validate.Dictionary.load()``), so a request
+# doesn't pay for python startup, lexer construction, or dictionary loading.
+#
+# Protocol is JSON lines. Request:
+#
+#   {"id": any, "op": "parse"|"validate"|"extract"|"stats", "file": path, "cif": bool,
+#    "dictionary": path (validate), "tags": [tag, ...] (extract)}
+#
+# Response is a sequence of lines with the same "id":
+#
+#   {"id": ..., "line": n, "severity": "error"|"warning", "message": text}    parse/validate/extract
+#   {"id": ..., "tag": tag, "value": value}                                   extract
+#   {"id": ..., "done": true, "ok": bool, "time": seconds}                    last line
+#
+# Lines are sent while the worker parses: messages as soon as they are reported, extracted
+# values in chunks of ``CHUNK`` (in file order, as the parser reads them). Workers put
+# ``(key, lines, done)`` on one queue shared with the server, a server thread hands them to
+# the connection that sent request ``key``.
+#
+# "stats" returns {"id": ..., "done": true, "stats": {op: {"count", "p50", "p90", "p99"}}}:
+# request latency (seconds) percentiles per operation, as measured by the server.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import json
+import time
+import socket
+import threading
+import collections
+import multiprocessing
+import Queue
+import SocketServer
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+from sas.validate import Dictionary, Validator
+
+# latencies kept per operation
+#
+HISTORY = 10000
+
+# extracted values sent per chunk
+#
+CHUNK = 1000
+
+def percentiles( values, ps = (50, 90, 99) ) :
+    """``dict`` of "p<N>" : value"""
+    rc = {}
+    vals = sorted( values )
+    for p in ps :
+        if len( vals ) < 1 : rc["p%d" % (p,)] = None
+        else : rc["p%d" % (p,)] = vals[min( len( vals ) - 1, int( len( vals ) * p / 100.0 ) )]
+    return rc
+
+#
+# worker process state
+#
+_LEXER = None
+_DICTIONARIES = {}
+_RESULTS = None
+
+def _init_worker( results ) :
+    global _LEXER
+    global _RESULTS
+    _LEXER = sas.StarLexer( bufsize = 0 )
+    _RESULTS = results
+
+def _dictionary( filename ) :
+    d = _DICTIONARIES.get( filename )
+    if d is None :
+        d = Dictionary.load( filename )
+        _DICTIONARIES[filename] = d
+    return d
+
+# response lines of request ``key``: messages go out at once, values in chunks
+#
+class _Out( object ) :
+    def __init__( self, key ) :
+        self._key = key
+        self._buf = []
+    def flush( self ) :
+        if len( self._buf ) > 0 :
+            _RESULTS.put( (self._key, self._buf, None) )
+            self._buf = []
+    def message( self, line, severity, msg ) :
+        self._buf.append( { "line" : line, "severity" : severity, "message" : msg } )
+        self.flush()
+    def value( self, tag, val ) :
+        self._buf.append( { "tag" : tag, "value" : val } )
+        if len( self._buf ) >= CHUNK : self.flush()
+    def done( self, ok, err = None ) :
+        self.flush()
+        _RESULTS.put( (self._key, None, (ok, err)) )
+
+# error handler that sends messages
+#
+class _Messages( sas.ErrorHandler ) :
+    def __init__( self, out ) :
+        self._out = out
+        self.ok = True
+    def fatalError( self, line, msg ) :
+        self._out.message( line, "error", msg )
+        self.ok = False
+    def error( self, line, msg ) :
+        self._out.message( line, "error", msg )
+        self.ok = False
+        return True
+    def warning( self, line, msg ) :
+        self._out.message( line, "warning", msg )
+        return False
+
+class _Validator( Validator ) :
+    def __init__( self, dictionary, out ) :
+        Validator.__init__( self, dictionary )
+        self._out = out
+    def _msg( self, line, severity, msg ) :
+        Validator._msg( self, line, severity, msg )
+        self._out.message( line, severity, msg )
+
+class _Extractor( sas.TagExtractor ) :
+    def __init__( self, tags, out ) :
+        sas.TagExtractor.__init__( self, tags )
+        self._out = out
+    def _collect( self, tag, val, inloop ) :
+        self._out.value( tag, val )
+        return sas.TagExtractor._collect( self, tag, val, inloop )
+
+class _Null( sas.ContentHandler ) :
+    def startData( self, line, name ) :
+        return False
+    def endData( self, line, name ) :
+        pass
+    def startSaveframe( self, line, name ) :
+        return False
+    def endSaveframe( self, line, name ) :
+        return False
+    def startLoop( self, line ) :
+        return False
+    def endLoop( self, line ) :
+        return False
+    def comment( self, line, text ) :
+        return False
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        return False
+
+#
+# runs in worker: sends response dicts (without id) for request ``key``, the last one is ``done``
+#
+def _work( key, req ) :
+    out = _Out( key )
+    try :
+        op = req.get( "op" )
+        parser = req.get( "cif" ) and sas.CifParser or sas.SansParser
+        if not op in ("parse", "validate", "extract") :
+            out.message( -1, "error", "unknown op %s" % (op,) )
+            out.done( False )
+            return
+
+        with open( req["file"], "rU" ) as f :
+            _LEXER.reset( f, bufsize = 0 )
+
+            if op == "parse" :
+                eh = _Messages( out )
+                parser.parse( lexer = _LEXER, content_handler = _Null(), error_handler = eh )
+                ok = eh.ok
+
+            elif op == "validate" :
+                v = _Validator( _dictionary( req["dictionary"] ), out )
+                parser.parse( lexer = _LEXER, content_handler = v, error_handler = v )
+                ok = (len( v.errors ) == 0)
+
+            else :
+                eh = _Messages( out )
+                x = _Extractor( req["tags"], out )
+                parser.parse( lexer = _LEXER, content_handler = x, error_handler = eh )
+                ok = eh.ok
+
+        out.done( ok )
+    except Exception, e :
+        out.done( False, str( e ) )
+
+#
+#
+class _Handler( SocketServer.StreamRequestHandler ) :
+
+    def _send( self, obj ) :
+        self.wfile.write( json.dumps( obj ) + "\n" )
+
+    def handle( self ) :
+        for line in self.rfile :
+            if line.strip() == "" : continue
+            start = time.time()
+            try :
+                req = json.loads( line )
+                rid = req.get( "id" )
+            except ValueError, e :
+                self._send( { "id" : None, "done" : True, "ok" : False, "error" : str( e ) } )
+                continue
+
+            if req.get( "op" ) == "stats" :
+                self._send( { "id" : rid, "done" : True, "ok" : True, "stats" : self.server.stats() } )
+                continue
+
+# write lines as the worker sends them, until it's done
+#
+            (key, q) = self.server.open()
+            try :
+                res = self.server.pool.apply_async( _work, (key, req) )
+                while True :
+                    try :
+                        (lines, done) = q.get( timeout = 1.0 )
+                    except Queue.Empty :
+                        if res.ready() and not res.successful() :
+                            try : res.get()
+                            except Exception, e : done = (False, str( e ))
+                            else : done = (False, "worker failed")
+                            break
+                        continue
+                    if done is not None : break
+                    for r in lines :
+                        r["id"] = rid
+                    self.wfile.write( "\n".join( json.dumps( r ) for r in lines ) + "\n" )
+                    self.wfile.flush()
+                (ok, err) = done
+            finally :
+                self.server.close( key )
+
+            secs = time.time() - start
+            self.server.record( req.get( "op" ), secs )
+            done = { "id" : rid, "done" : True, "ok" : ok, "time" : secs }
+            if err is not None : done["error"] = err
+            self._send( done )
+            self.wfile.flush()
+
+#
+#
+class SasServer( SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer ) :
+    """
+    Serve requests on Unix socket ``path`` with ``workers`` processes. Call ``serve_forever()``.
+    """
+
+    daemon_threads = True
+
+    def __init__( self, path, workers = None ) :
+        if os.path.exists( path ) :
+            os.unlink( path )
+        self.path = path
+        self._results = multiprocessing.Queue()
+        self.pool = multiprocessing.Pool( processes = workers, initializer = _init_worker,
+            initargs = (self._results,) )
+        self._lock = threading.Lock()
+        self._latency = {}
+        self._key = 0
+        self._queues = {}
+        t = threading.Thread( target = self._route )
+        t.daemon = True
+        t.start()
+        SocketServer.UnixStreamServer.__init__( self, path, _Handler )
+
+# worker output -> queue of the connection that sent the request
+#
+    def open( self ) :
+        """returns ``(key, queue)`` for a new request"""
+        with self._lock :
+            self._key += 1
+            q = Queue.Queue()
+            self._queues[self._key] = q
+            return (self._key, q)
+
+    def close( self, key ) :
+        with self._lock :
+            self._queues.pop( key, None )
+
+    def _route( self ) :
+        while True :
+            (key, lines, done) = self._results.get()
+            with self._lock :
+                q = self._queues.get( key )
+            if q is not None :
+                q.put( (lines, done) )
+
+    def record( self, op, secs ) :
+        with self._lock :
+            if not op in self._latency :
+                self._latency[op] = collections.deque( maxlen = HISTORY )
+            self._latency[op].append( secs )
+
+    def stats( self ) :
+        with self._lock :
+            rc = {}
+            for (op, vals) in self._latency.items() :
+                rc[op] = percentiles( vals )
+                rc[op]["count"] = len( vals )
+            return rc
+
+    def server_close( self ) :
+        SocketServer.UnixStreamServer.server_close( self )
+        self.pool.close()
+        self.pool.join()
+        if os.path.exists( self.path ) :
+            os.unlink( self.path )
+
+#
+#
+class SasClient( object ) :
+    """client for ``SasServer`` on Unix socket ``path``"""
+
+    def __init__( self, path ) :
+        self._sock = socket.socket( socket.AF_UNIX, socket.SOCK_STREAM )
+        self._sock.connect( path )
+        self._in = self._sock.makefile( "rb" )
+        self._out = self._sock.makefile( "wb" )
+        self._id = 0
+
+    def close( self ) :
+        self._in.close()
+        self._out.close()
+        self._sock.close()
+
+    def request( self, op, **kwargs ) :
+        """send request, yield response lines (``dict``s), the last one has ``done``"""
+        self._id += 1
+        req = dict( kwargs )
+        req["op"] = op
+        req["id"] = self._id
+        self._out.write( json.dumps( req ) + "\n" )
+        self._out.flush()
+        for line in self._in :
+            rc = json.loads( line )
+            yield rc
+            if rc.get( "done" ) : break
+
+    def call( self, op, **kwargs ) :
+        """returns ``(results, last line)``"""
+        rc = list( self.request( op, **kwargs ) )
+        return (rc[:-1], rc[-1])
+
+#
+#
+if __name__ == "__main__" :
+
+    import argparse
+    import signal
+
+    par = argparse.ArgumentParser( description = "SAS parse/validate service" )
+    par.add_argument( "-j", "--jobs", dest = "jobs", type = int, default = None, help = "number of worker processes" )
+    par.add_argument( "-n", dest = "count", type = int, default = 10, help = "client: requests per file" )
+    par.add_argument( "-d", "--dictionary", dest = "dictionary", help = "client: validate against this dictionary" )
+    par.add_argument( "mode", choices = ("serve", "client") )
+    par.add_argument( "socket" )
+    par.add_argument( "files", nargs = "*" )
+    args = par.parse_args()
+
+    if args.mode == "serve" :
+        server = SasServer( args.socket, args.jobs )
+        signal.signal( signal.SIGTERM, lambda signum, frame : sys.exit( 0 ) )
+        try :
+            server.serve_forever()
+        except KeyboardInterrupt :
+            pass
+        finally :
+            server.server_close()
+        sys.exit( 0 )
+
+# client: send requests, report latencies as seen by the client and by the server
+#
+    c = SasClient( args.socket )
+    lat = []
+    for i in range( args.count ) :
+        for filename in args.files :
+            start = time.time()
+            if args.dictionary is not None :
+                (results, last) = c.call( "validate", file = os.path.realpath( filename ), cif = filename.endswith( ".cif" ),
+                    dictionary = os.path.realpath( args.dictionary ) )
+            else :
+                (results, last) = c.call( "parse", file = os.path.realpath( filename ), cif = filename.endswith( ".cif" ) )
+            lat.append( time.time() - start )
+    sys.stdout.write( "client: %d requests %s\n" % (len( lat ), json.dumps( percentiles( lat ) )) )
+    (results, last) = c.call( "stats" )
+    sys.stdout.write( "server: %s\n" % (json.dumps( last["stats"] ),) )
+    c.close()
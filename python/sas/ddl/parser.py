@@ -38,7 +38,7 @@ class Parser( sas.ParserBase ) :
         if self._verbose : sys.stdout.write( self.__class__.__name__ + "._read_value(%s)\n" % (delimiter,) )
 
         stop = False
-        val = ""
+        val = sas.ValueBuffer( self._spill, self._lazy )
         try :
             for token in self._lexer :
 
@@ -47,7 +47,7 @@ class Parser( sas.ParserBase ) :
                         if self._eh.error( line = token.lineno, msg = "newline in quoted value: %s" % (val,) ) :
                             stop = True
                             break
-                        val += "\n"
+                        val.append( "\n" )
                         continue
 
                 if delimiter == "SINGLESTART" :
@@ -70,7 +70,7 @@ class Parser( sas.ParserBase ) :
 #
                 if delimiter == "SEMISTART" :
                     if token.type == "SEMIEND" :
-                        if val.endswith( "\n" ) : val = val.rstrip( "\n" )
+                        val.rstrip_newlines()
                         break
 
                 if not delimiter in ("SINGLESTART","DOUBLESTART") :
@@ -84,7 +84,7 @@ class Parser( sas.ParserBase ) :
 # stop on the 1st hit
 #
                             break
-                val += token.value
+                val.append( token.value )
 
             else :
                 ln = -1
@@ -94,10 +94,10 @@ class Parser( sas.ParserBase ) :
                 stop = True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             stop = True
 
-        return (val, stop)
+        return (val.value(), stop)
 
     # top-level parse does not return anything
     #
@@ -138,7 +138,7 @@ class Parser( sas.ParserBase ) :
 
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return
 
     # returns a stop sign: if true: stop parsing
@@ -255,7 +255,7 @@ class Parser( sas.ParserBase ) :
                 return True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
     # this is 99% a copy-paste of parse_data()
@@ -357,7 +357,7 @@ class Parser( sas.ParserBase ) :
                 return True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
     # returns a stop sign: if true: stop parsing
@@ -562,7 +562,7 @@ class Parser( sas.ParserBase ) :
                 return True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
 ###################################################################################################
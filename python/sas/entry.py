@@ -0,0 +1,354 @@
+#!/usr/bin/python -u
+#
+# Lazy in-memory model of a STAR file: Entry -> Saveframe -> Loop
+#
+# ``Entry.from_file()`` makes one quick pass over the file with the lexer (no parser, no handler)
+# and records where each saveframe starts and ends. A saveframe is read and parsed only when
+# it's accessed, and kept until ``release()``d.
+#
+# mmCIF files have no saveframes: there each category (table) is presented as a saveframe of
+# the same name, made of all the places in the file where that category's items or loops are.
+#
+# Loops are stored column-wise.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import collections
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+# category part of the tag: "_Entity.ID" -> "_Entity"
+#
+def _category( tag ) :
+    i = tag.find( "." )
+    if i < 0 : return tag
+    return tag[:i]
+
+#
+#
+class Loop( object ) :
+    """
+    Loop (table): ``tags`` and ``columns``, a list of value lists (one per tag).
+    """
+
+    __slots__ = ("tags", "columns", "line")
+
+    def __init__( self, line = -1 ) :
+        self.tags = []
+        self.columns = []
+        self.line = line
+
+    @property
+    def category( self ) :
+        """category of the 1st tag"""
+        if len( self.tags ) < 1 : return None
+        return _category( self.tags[0] )
+
+    def __len__( self ) :
+        if len( self.columns ) < 1 : return 0
+        return len( self.columns[0] )
+
+    def column( self, tag ) :
+        """list of values for ``tag``, ``KeyError`` if there is no such tag"""
+        try :
+            return self.columns[self.tags.index( tag )]
+        except ValueError :
+            raise KeyError( tag )
+
+    def row( self, idx ) :
+        """tuple of values in row ``idx``"""
+        return tuple( col[idx] for col in self.columns )
+
+    def __iter__( self ) :
+        return iter( zip( *self.columns ) )
+
+#
+#
+class Saveframe( object ) :
+    """
+    Saveframe: ``items`` is an ordered ``dict`` of free tags and values, ``loops`` is a list of
+    ``Loop``s. ``category`` is the value of ``Sf_category`` tag (NMR-STAR) or category name
+    (mmCIF).
+    """
+
+    __slots__ = ("name", "category", "line", "items", "loops")
+
+    def __init__( self, name, category = None, line = -1 ) :
+        self.name = name
+        self.category = category
+        self.line = line
+        self.items = collections.OrderedDict()
+        self.loops = []
+
+    def __getitem__( self, tag ) :
+        return self.items[tag]
+
+    def get( self, tag, default = None ) :
+        return self.items.get( tag, default )
+
+    def loop( self, category ) :
+        """first loop of ``category`` (e.g. ``"_Atom_chem_shift"``) or ``None``"""
+        for l in self.loops :
+            if l.category == category :
+                return l
+        return None
+
+# saveframe location in the file
+#
+_Span = collections.namedtuple( "_Span", ["start", "end", "line"] )
+
+#
+#
+class _Builder( sas.ContentHandler ) :
+    """builds ``Saveframe`` from parser callbacks"""
+
+    def __init__( self, frame ) :
+        self._frame = frame
+        self._loop = None
+        self._index = None
+
+    def startData( self, line, name ) :
+        return False
+    def endData( self, line, name ) :
+        pass
+    def startSaveframe( self, line, name ) :
+        return False
+    def endSaveframe( self, line, name ) :
+        return False
+    def startLoop( self, line ) :
+        self._loop = Loop( line )
+        self._index = {}
+        self._frame.loops.append( self._loop )
+        return False
+    def endLoop( self, line ) :
+        self._loop = None
+        return False
+    def comment( self, line, text ) :
+        return False
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        if not inloop :
+            self._frame.items[tag] = val
+            if (self._frame.category is None) and tag.endswith( ".Sf_category" ) :
+                self._frame.category = val
+            return False
+
+        idx = self._index.get( tag )
+        if idx is None :
+            idx = len( self._loop.tags )
+            self._index[tag] = idx
+            self._loop.tags.append( tag )
+            self._loop.columns.append( [] )
+        self._loop.columns[idx].append( val )
+        return False
+
+#
+#
+class Entry( object ) :
+    """
+    Lazily loaded STAR file.
+
+    Saveframes are accessed by name: ``entry["entity_1"]``, or by category:
+    ``entry.by_category( "entity" )``. ``names`` lists all saveframe names in file order.
+    """
+
+    #
+    #
+    @classmethod
+    def from_file( cls, filename, mmcif = False, error_handler = None, verbose = False ) :
+        """index ``filename``, NMR-STAR or mmCIF if ``mmcif`` is true"""
+        obj = cls( filename, mmcif, error_handler, verbose )
+        obj._index()
+        return obj
+
+    def __init__( self, filename, mmcif = False, error_handler = None, verbose = False ) :
+        self._filename = filename
+        self._mmcif = bool( mmcif )
+        self._eh = error_handler
+        if self._eh is None : self._eh = sas.ErrorHandler()
+        self._verbose = bool( verbose )
+
+        self.name = None
+        self._spans = collections.OrderedDict()
+        self._categories = {}
+        self._frames = {}
+
+    @property
+    def names( self ) :
+        return list( self._spans.keys() )
+
+    def __len__( self ) :
+        return len( self._spans )
+
+    def __iter__( self ) :
+        for name in self._spans.keys() :
+            yield self[name]
+
+    def __contains__( self, name ) :
+        return name in self._spans
+
+    def __getitem__( self, name ) :
+        frame = self._frames.get( name )
+        if frame is None :
+            if not name in self._spans :
+                raise KeyError( name )
+            frame = self._load( name )
+            self._frames[name] = frame
+        return frame
+
+    def by_category( self, category ) :
+        """list of saveframes of ``category``"""
+        return [self[name] for name in self._spans.keys() if self._categories.get( name ) == category]
+
+    def release( self, name = None ) :
+        """drop parsed saveframe ``name`` (all if ``None``) from memory"""
+        if name is None : self._frames.clear()
+        else : self._frames.pop( name, None )
+
+    #
+    # quick pass: lexer only, record saveframe start and end offsets
+    #
+    def _index( self ) :
+        with open( self._filename, "rb" ) as f :
+            lex = sas.StarLexer( f, bufsize = 0, verbose = self._verbose )
+            try :
+                if self._mmcif : self._index_cif( lex )
+                else : self._index_star( lex )
+            except sas.SasException, e :
+                self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+
+    def _index_star( self, lex ) :
+        name = None
+        start = None
+        line = -1
+        category = None
+        last_tag = None
+        for token in lex :
+            if token.type in ("NL", "SPACE", "COMMENT") : continue
+
+            if token.type == "DATASTART" :
+                if self.name is None : self.name = token.value
+            elif token.type == "SAVESTART" :
+                name = token.value
+                start = lex.position( token )
+                line = token.lineno
+                category = None
+            elif token.type == "SAVEEND" :
+                if name is not None :
+                    self._spans[name] = _Span( start, lex.position( token ) + len( token.value ), line )
+                    self._categories[name] = category
+                name = None
+            elif token.type == "TAGNAME" :
+                last_tag = token.value
+                continue
+            elif token.type in ("CHARACTERS", "FRAMECODE") :
+                if (last_tag is not None) and (category is None) and last_tag.endswith( ".Sf_category" ) :
+                    category = token.value
+            last_tag = None
+
+    # mmCIF: category spans are free item runs and loops
+    #
+    def _index_cif( self, lex ) :
+        cat = None
+        start = None
+        line = -1
+        in_loop = False
+        loop_vals = False
+        for token in lex :
+            if token.type in ("NL", "SPACE", "COMMENT") : continue
+
+            if token.type == "DATASTART" :
+                if self.name is None : self.name = token.value
+                self._add_span( cat, start, lex.position( token ), line )
+                cat = None
+                in_loop = False
+                continue
+
+            if token.type == "LOOPSTART" :
+                self._add_span( cat, start, lex.position( token ), line )
+                cat = None
+                start = lex.position( token )
+                line = token.lineno
+                in_loop = True
+                loop_vals = False
+                continue
+
+            if token.type == "TAGNAME" :
+                if in_loop and not loop_vals :
+                    if cat is None : cat = _category( token.value )
+                    continue
+                if in_loop or (_category( token.value ) != cat) :
+                    self._add_span( cat, start, lex.position( token ), line )
+                    cat = _category( token.value )
+                    start = lex.position( token )
+                    line = token.lineno
+                    in_loop = False
+                continue
+
+            if in_loop : loop_vals = True
+
+        self._add_span( cat, start, lex._consumed, line )
+
+    def _add_span( self, cat, start, end, line ) :
+        if cat is None : return
+        if not cat in self._spans :
+            self._spans[cat] = []
+            self._categories[cat] = cat
+        self._spans[cat].append( _Span( start, end, line ) )
+
+    #
+    # read and parse a saveframe
+    #
+    def _load( self, name ) :
+        if self._mmcif :
+            frame = Saveframe( name, category = name )
+            spans = self._spans[name]
+            parser = sas.CifParser
+        else :
+            frame = Saveframe( name, category = self._categories.get( name ) )
+            spans = [self._spans[name]]
+            parser = sas.SansParser
+
+        b = _Builder( frame )
+        with open( self._filename, "rb" ) as f :
+            for span in spans :
+                if frame.line < 0 : frame.line = span.line
+                f.seek( span.start )
+                text = f.read( span.end - span.start )
+
+# fake data block: one line before the span
+#
+                lex = sas.StarLexer( verbose = self._verbose )
+                lex.lexer.lineno = span.line - 1
+                lex.send( "data_%s\n%s\n" % (self.name, text) )
+                parser.parse( lexer = lex, content_handler = b, error_handler = self._eh, verbose = self._verbose )
+        return frame
+
+#
+#
+if __name__ == "__main__" :
+
+    if len( sys.argv ) < 2 :
+        sys.stderr.write( "usage: %s [-c] file [saveframe ...]\n" % (sys.argv[0],) )
+        sys.exit( 1 )
+
+    mmcif = False
+    args = sys.argv[1:]
+    if args[0] == "-c" :
+        mmcif = True
+        args = args[1:]
+
+    with sas.timer( "index" ) :
+        e = Entry.from_file( args[0], mmcif = mmcif )
+    sys.stdout.write( "%s: %d saveframes\n" % (e.name, len( e ),) )
+    for name in args[1:] :
+        with sas.timer( "load %s" % (name,) ) :
+            sf = e[name]
+        sys.stdout.write( "%s (%s): %d items\n" % (sf.name, sf.category, len( sf.items ),) )
+        for l in sf.loops :
+            sys.stdout.write( "  loop %s: %d tags, %d rows\n" % (l.category, len( l.tags ), len( l ),) )
@@ -0,0 +1,197 @@
+#!/usr/bin/python -u
+#
+# Export loops to CSV (or TSV).
+#
+# Each loop is written to its own stream: by default, file named after the loop category
+# (without leading underscore) in the output directory. If a category comes up again with
+# the same tags, its rows are added to the same file, otherwise a new file is started
+# (``category.2.csv``, etc.)
+#
+# Rows are collected in a reusable buffer and written out in batches, memory use doesn't
+# depend on the number of rows.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import csv
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+#
+#
+class CsvExporter( sas.ContentHandler ) :
+    """
+    Write loops to CSV files in ``outdir``, or to streams returned by ``opener( name )``.
+
+    ``delimiter``: ``","`` for CSV, ``"\\t"`` for TSV. ``batch``: rows per ``writerows()``.
+    Call ``close()`` when done.
+    """
+
+    #
+    #
+    @classmethod
+    def export( cls, fp, outdir, parser = None, delimiter = ",", error_handler = None, verbose = False ) :
+        """parse ``fp`` with ``parser`` (``SansParser`` by default), returns list of file names"""
+        if parser is None : parser = sas.SansParser
+        if error_handler is None : error_handler = sas.ErrorHandler()
+        h = cls( outdir = outdir, delimiter = delimiter )
+        try :
+            lex = sas.StarLexer( fp, bufsize = 0, verbose = verbose )
+            parser.parse( lexer = lex, content_handler = h, error_handler = error_handler, verbose = verbose )
+        finally :
+            h.close()
+        return h.names
+
+    @classmethod
+    def export_file( cls, filename, outdir, parser = None, delimiter = ",", error_handler = None, verbose = False ) :
+        with open( filename, "rU" ) as f :
+            return cls.export( f, outdir, parser, delimiter, error_handler, verbose )
+
+    #
+    #
+    def __init__( self, outdir = None, opener = None, delimiter = ",", batch = 1000 ) :
+        assert (outdir is not None) or (opener is not None)
+        self._outdir = outdir
+        self._opener = opener
+        self._delimiter = delimiter
+        self._ext = (delimiter == "\t") and ".tsv" or ".csv"
+        self._batch = int( batch )
+
+        self._streams = {}
+        self._files = []
+        self.names = []
+
+        self._tags = None
+        self._first = None
+        self._writer = None
+        self._row = None
+        self._ncols = 0
+        self._col = 0
+        self._rows = []
+
+    def _open( self, name ) :
+        if self._opener is not None :
+            return self._opener( name )
+        return open( os.path.join( self._outdir, name + self._ext ), "wb" )
+
+    # writer for category and tags: same file if same tags, else next file
+    #
+    def _get_writer( self, tags ) :
+        category = tags[0]
+        i = category.find( "." )
+        if i > 0 : category = category[:i]
+        category = category.lstrip( "_" )
+
+        streams = self._streams.setdefault( category, [] )
+        for (t, w) in streams :
+            if t == tags :
+                return w
+
+        name = category
+        if len( streams ) > 0 :
+            name = "%s.%d" % (category, len( streams ) + 1)
+        f = self._open( name )
+        self._files.append( f )
+        self.names.append( name )
+        w = csv.writer( f, delimiter = self._delimiter, lineterminator = "\n" )
+        w.writerow( [t[t.find( "." ) + 1:] for t in tags] )
+        streams.append( (tags, w) )
+        return w
+
+    def _start_rows( self ) :
+        self._ncols = len( self._tags )
+        self._writer = self._get_writer( tuple( self._tags ) )
+        self._row = [None] * self._ncols
+        self._col = 0
+
+    def _flush( self ) :
+        if len( self._rows ) > 0 :
+            self._writer.writerows( self._rows )
+            self._rows = []
+
+    def close( self ) :
+        for f in self._files :
+            if self._opener is None : f.close()
+            elif hasattr( f, "flush" ) : f.flush()
+        self._files = []
+        self._streams = {}
+
+# SAS callbacks
+#
+    def startData( self, line, name ) :
+        return False
+    def endData( self, line, name ) :
+        pass
+    def startSaveframe( self, line, name ) :
+        return False
+    def endSaveframe( self, line, name ) :
+        return False
+    def comment( self, line, text ) :
+        return False
+
+    def startLoop( self, line ) :
+        self._tags = []
+        self._first = []
+        self._writer = None
+        return False
+
+    def endLoop( self, line ) :
+        if self._writer is None :
+            if len( self._tags ) < 1 : return False
+            self._start_rows()
+            self._rows.append( tuple( self._first ) )
+        elif self._col > 0 :
+            self._rows.append( tuple( self._row[:self._col] ) + ("",) * (self._ncols - self._col) )
+        self._flush()
+        self._tags = None
+        self._first = None
+        self._writer = None
+        return False
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        if not inloop : return False
+
+# first row: collect tags (and values) until the first tag repeats
+#
+        if self._writer is None :
+            if (len( self._tags ) < 1) or (tag != self._tags[0]) :
+                self._tags.append( tag )
+                self._first.append( val )
+                return False
+            self._start_rows()
+            self._rows.append( tuple( self._first ) )
+            self._first = None
+
+        row = self._row
+        row[self._col] = val
+        self._col += 1
+        if self._col == self._ncols :
+            self._rows.append( tuple( row ) )
+            self._col = 0
+            if len( self._rows ) >= self._batch :
+                self._flush()
+        return False
+
+#
+#
+if __name__ == "__main__" :
+
+    if len( sys.argv ) < 3 :
+        sys.stderr.write( "usage: %s [-c] [-t] file outdir\n" % (sys.argv[0],) )
+        sys.exit( 1 )
+
+    args = sys.argv[1:]
+    parser = sas.SansParser
+    delimiter = ","
+    while args[0] in ("-c", "-t") :
+        if args[0] == "-c" : parser = sas.CifParser
+        else : delimiter = "\t"
+        args = args[1:]
+
+    with sas.timer( "export" ) :
+        names = CsvExporter.export_file( args[0], args[1], parser = parser, delimiter = delimiter )
+    sys.stdout.write( "%d files\n" % (len( names ),) )
@@ -0,0 +1,190 @@
+#!/usr/bin/python -u
+#
+# Generic tag/value extractor.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+#
+#
+class TagExtractor( sas.ContentHandler ) :
+    """
+    Collect values of selected tags.
+
+    ``wanted_tags`` is an iterable of tags to collect.
+
+    ``stop_when`` is either ``"all_found"``: stop parsing once every wanted tag was seen (for
+    loop tags: once the loop they are in ended), or a tag: stop parsing when that tag is read.
+    (The tag does not have to be one of ``wanted_tags``.)
+
+    Free values are collected in ``items``: a list of ``(saveframe name, { tag : value })``
+    pairs, loop values -- in ``loops``: a list of ``(saveframe name, [ { tag : value }, ... ])``.
+    mmCIF files have no saveframes so the data block name is used instead.
+
+    The set of wanted tags is passed on to the parser as ``wanted_tags``: parsers that support it
+    skip everything else.
+    """
+
+    ALL_FOUND = "all_found"
+
+    #
+    #
+    @classmethod
+    def extract( cls, fp, wanted_tags, stop_when = ALL_FOUND, parser = None, error_handler = None,
+            verbose = False ) :
+        """
+        Parse ``fp`` with ``parser`` (``sas.SansParser`` by default) and return the extractor
+        """
+        if parser is None : parser = sas.SansParser
+        if error_handler is None : error_handler = sas.ErrorHandler()
+        h = cls( wanted_tags, stop_when )
+        lex = sas.StarLexer( fp, bufsize = 0, verbose = verbose )
+        parser.parse( lexer = lex, content_handler = h, error_handler = error_handler, verbose = verbose )
+        return h
+
+    @classmethod
+    def extract_file( cls, filename, wanted_tags, stop_when = ALL_FOUND, parser = None,
+            error_handler = None, verbose = False ) :
+        with open( filename, "rU" ) as f :
+            return cls.extract( f, wanted_tags, stop_when, parser, error_handler, verbose )
+
+    #
+    #
+    def __init__( self, wanted_tags, stop_when = ALL_FOUND ) :
+        self._tags = frozenset( wanted_tags )
+        assert len( self._tags ) > 0
+
+        self._stop_tag = None
+        if stop_when != self.ALL_FOUND :
+            self._stop_tag = stop_when
+
+# dispatch table: tag -> callback
+#
+        self._dispatch = dict( (tag, self._collect) for tag in self._tags )
+        if self._stop_tag is not None :
+            if self._stop_tag in self._tags :
+                self._dispatch[self._stop_tag] = self._collect_and_stop
+            else :
+                self._dispatch[self._stop_tag] = self._stop
+
+        self.wanted_tags = frozenset( self._dispatch.keys() )
+
+        self.items = []
+        self.loops = []
+        self._found = set()
+        self._frame = None
+        self._frame_items = None
+        self._rows = None
+        self._row = None
+
+    #
+    #
+    def values( self, tag ) :
+        """all collected values of ``tag`` in the order they were read"""
+        rc = []
+        for (name, items) in self.items :
+            if tag in items :
+                rc.append( items[tag] )
+        for (name, rows) in self.loops :
+            for row in rows :
+                if tag in row :
+                    rc.append( row[tag] )
+        return rc
+
+    # stop sign for "all_found"
+    #
+    def _done( self ) :
+        if self._stop_tag is not None : return False
+        return len( self._found ) == len( self._tags )
+
+    # dispatch targets
+    #
+    def _collect( self, tag, val, inloop ) :
+        if inloop :
+            if (self._row is None) or (tag in self._row) :
+                self._row = {}
+                self._rows.append( self._row )
+            self._row[tag] = val
+            return False
+
+        if self._frame_items is None :
+            self._frame_items = {}
+            self.items.append( (self._frame, self._frame_items) )
+        self._frame_items[tag] = val
+        self._found.add( tag )
+        return self._done()
+
+    def _collect_and_stop( self, tag, val, inloop ) :
+        self._collect( tag, val, inloop )
+        self._end_rows()
+        return True
+
+    def _stop( self, tag, val, inloop ) :
+        self._end_rows()
+        return True
+
+    # keep rows of the current loop, if any: at the end of loop or when stopping in the middle
+    #
+    def _end_rows( self ) :
+        if (self._rows is not None) and (len( self._rows ) > 0) :
+            self.loops.append( (self._frame, self._rows) )
+            for tag in self._rows[0].keys() :
+                if tag in self._tags :
+                    self._found.add( tag )
+        self._rows = None
+        self._row = None
+
+# SAS callbacks
+#
+    def startData( self, line, name ) :
+        self._frame = name
+        self._frame_items = None
+        return False
+    def endData( self, line, name ) :
+        pass
+    def startSaveframe( self, line, name ) :
+        self._frame = name
+        self._frame_items = None
+        return False
+    def endSaveframe( self, line, name ) :
+        self._frame_items = None
+        return False
+    def startLoop( self, line ) :
+        self._rows = []
+        self._row = None
+        return False
+
+    # loop tags count as found once the whole loop is read
+    #
+    def endLoop( self, line ) :
+        self._end_rows()
+        return self._done()
+
+    def comment( self, line, text ) :
+        return False
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        f = self._dispatch.get( tag )
+        if f is None : return False
+        return f( tag, val, inloop )
+
+#
+#
+if __name__ == "__main__" :
+
+    tags = sys.argv[1:]
+    if len( tags ) < 1 :
+        sys.stderr.write( "usage: %s tag [tag ...] < input\n" % (sys.argv[0],) )
+        sys.exit( 1 )
+
+    with sas.timer( "extract" ) :
+        h = TagExtractor.extract( sys.stdin, tags )
+    for tag in tags :
+        sys.stdout.write( "%s: %s\n" % (tag, h.values( tag ),) )
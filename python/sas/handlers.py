@@ -43,6 +43,16 @@ class ContentHandlerBase :
 
     __metaclass__ = abc.ABCMeta
 
+# if not None, parsers that assemble delimited values pass those longer than this many characters
+# as ``sas.values.SpilledValue`` (file-like, kept in a temporary file) instead of a string
+#
+    spill_threshold = None
+
+# if True, those parsers pass multi-piece delimited values as ``sas.values.LazyValue``:
+# pieces are joined only when the value is used as a string
+#
+    lazy_values = False
+
     # not abstract because global blocks aren't used in mmcif or nmr-star
     #
     def startGlobal( self, line ) :
@@ -91,8 +101,31 @@ class ContentHandler( ContentHandlerBase ) :
 
     This is convenient in many cases, but can be inefficient on files with large
     semicolon- or triple-quote-delimited text values
+
+    ``wanted_tags``: if not ``None``, a container (e.g. ``set``) of tags the handler wants.
+    Parsers that support it will not assemble values nor call ``data()`` for other tags.
+
+    ``row_filters``: if not ``None``, a ``dict`` of loop tag : callable( value ). When the
+    callable returns ``False`` parsers that support it skip the rest of the loop row: neither
+    that value nor the following ones are passed to ``data()``. Values that came before it
+    were, so the handler must drop what it has of the current row.
     """
 
+# parsers check these once, before parsing
+#
+    wanted_tags = None
+    row_filters = None
+
+# if not None, ``SansParser`` and ``CifParser`` intern loop tags and pass repeated loop values
+# as the same string object, with a cache of this many values per column (``sas.ColumnIntern``)
+#
+    intern_values = None
+
+# if True, ``SansParser`` and ``CifParser`` pass unquoted ``.`` and ``?`` as ``sas.INAPPLICABLE``
+# and ``sas.UNKNOWN`` (``sas.Null``, equal to the strings) so nulls can be told by identity
+#
+    null_values = False
+
     @abc.abstractmethod
     def data( self, tag, tagline, val, valline, delim, inloop ) :
         raise Exception( "Abstract method called" )
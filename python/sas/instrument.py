@@ -0,0 +1,198 @@
+#!/usr/bin/python -u
+#
+# Opt-in parse instrumentation.
+#
+# ``Profiler`` is passed to ``ParserBase.parse( ..., profiler = p )``. For the duration of the
+# parse it swaps the lexer's class for a subclass with a timed ``next()`` and shadows the
+# content handler's callbacks with timed wrappers (instance attributes); both are put back
+# afterwards. Without a profiler nothing is wrapped, so there is no per-token cost.
+#
+# Collected: tokens by type, time in the lexer, in handler callbacks, and the rest (parser),
+# plus time and tokens per saveframe and per loop, keyed by tag category (the part of the
+# first tag before the dot).
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import json
+import collections
+import timeit
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+_clock = timeit.default_timer
+
+CALLBACKS = ("startGlobal", "endGlobal", "startData", "endData", "startSaveframe", "endSaveframe",
+    "startLoop", "endLoop", "comment", "data", "tag", "value", "startValue", "endValue", "characters")
+
+#
+#
+class Profiler( object ) :
+    """
+    Counters and timers for one or more parses, see ``as_dict()``.
+    """
+
+    def __init__( self ) :
+        self.tokens = collections.defaultdict( int )
+        self.calls = collections.defaultdict( int )
+        self.lexer_time = 0.0
+        self.handler_time = 0.0
+        self.total_time = 0.0
+        self.parses = 0
+        self.saveframes = {}
+        self.loops = {}
+        self._lexer = None
+        self._ch = None
+        self._saved = None
+
+# current saveframe and loop: [category, start time, start token count]
+#
+        self._frame = None
+        self._loop = None
+        self._ntokens = 0
+
+    #
+    #
+    def attach( self, lexer, content_handler ) :
+        """instrument ``lexer`` and ``content_handler`` until ``detach()``"""
+        assert self._lexer is None
+        self._lexer = lexer
+        self._ch = content_handler
+        self._start = _clock()
+
+        base = lexer.__class__
+        base_next = base.next
+        tokens = self.tokens
+        prof = self
+        def next( lex ) :
+            start = _clock()
+            try :
+                t = base_next( lex )
+            finally :
+                prof.lexer_time += _clock() - start
+            tokens[t.type] += 1
+            prof._ntokens += 1
+            return t
+        lexer.__class__ = type( "Profiled" + base.__name__, (base,), { "next" : next, "__next__" : next } )
+
+        self._saved = {}
+        for name in CALLBACKS :
+            func = getattr( content_handler, name, None )
+            if func is None : continue
+            if name in content_handler.__dict__ : self._saved[name] = content_handler.__dict__[name]
+            else : self._saved[name] = None
+            setattr( content_handler, name, self._wrap( name, func ) )
+
+    def detach( self ) :
+        """undo ``attach()``"""
+        if self._lexer is None : return
+        self._lexer.__class__ = self._lexer.__class__.__bases__[0]
+        for (name, func) in self._saved.items() :
+            if func is None : delattr( self._ch, name )
+            else : setattr( self._ch, name, func )
+        self.total_time += _clock() - self._start
+        self.parses += 1
+        self._lexer = None
+        self._ch = None
+        self._saved = None
+        self._frame = None
+        self._loop = None
+
+    #
+    #
+    def _wrap( self, name, func ) :
+        calls = self.calls
+        prof = self
+        if name == "startSaveframe" : hook = self._start_frame
+        elif name == "endSaveframe" : hook = self._end_frame
+        elif name == "startLoop" : hook = self._start_loop
+        elif name == "endLoop" : hook = self._end_loop
+        elif name == "data" : hook = lambda args, kwargs : prof._tag( kwargs.get( "tag" ) or args[0] )
+        elif name == "tag" : hook = lambda args, kwargs : prof._tag( kwargs.get( "tag" ) or args[1] )
+        else : hook = None
+        def wrapper( *args, **kwargs ) :
+            if hook is not None : hook( args, kwargs )
+            start = _clock()
+            try :
+                return func( *args, **kwargs )
+            finally :
+                prof.handler_time += _clock() - start
+                calls[name] += 1
+        return wrapper
+
+    def _start_frame( self, args, kwargs ) :
+        self._frame = [None, _clock(), self._ntokens]
+    def _end_frame( self, args, kwargs ) :
+        if self._frame is not None :
+            self._add( self.saveframes, self._frame )
+            self._frame = None
+    def _start_loop( self, args, kwargs ) :
+        self._loop = [None, _clock(), self._ntokens]
+    def _end_loop( self, args, kwargs ) :
+        if self._loop is not None :
+            self._add( self.loops, self._loop )
+            self._loop = None
+
+    def _tag( self, tag ) :
+        if (self._loop is not None) and (self._loop[0] is None) :
+            self._loop[0] = tag.split( "." )[0]
+        if (self._frame is not None) and (self._frame[0] is None) :
+            self._frame[0] = tag.split( "." )[0]
+
+    def _add( self, table, cur ) :
+        key = cur[0] is None and "?" or cur[0]
+        rec = table.get( key )
+        if rec is None :
+            rec = { "count" : 0, "time" : 0.0, "tokens" : 0 }
+            table[key] = rec
+        rec["count"] += 1
+        rec["time"] += _clock() - cur[1]
+        rec["tokens"] += self._ntokens - cur[2]
+
+    #
+    #
+    def as_dict( self ) :
+        """all numbers as ``dict``"""
+        return {
+            "parses" : self.parses,
+            "time" : { "total" : self.total_time, "lexer" : self.lexer_time, "handler" : self.handler_time,
+                "parser" : max( 0.0, self.total_time - self.lexer_time - self.handler_time ) },
+            "tokens" : dict( self.tokens ),
+            "callbacks" : dict( self.calls ),
+            "saveframes" : self.saveframes,
+            "loops" : self.loops
+        }
+
+    def to_json( self, **kwargs ) :
+        return json.dumps( self.as_dict(), **kwargs )
+
+    def report( self, out = sys.stdout, top = 10 ) :
+        """write a short text summary"""
+        d = self.as_dict()
+        lines = ["time: %(total)0.3fs total, %(lexer)0.3fs lexer, %(handler)0.3fs handler, %(parser)0.3fs parser"
+            % d["time"]]
+        lines.append( "tokens: " + ", ".join( "%s %d" % (k, v) for (k, v)
+            in sorted( d["tokens"].items(), key = lambda x : -x[1] ) ) )
+        for label in ("saveframes", "loops") :
+            items = sorted( d[label].items(), key = lambda x : -x[1]["time"] )[:top]
+            if len( items ) < 1 : continue
+            lines.append( "%s by time:" % (label,) )
+            for (key, rec) in items :
+                lines.append( "  %-40s %6d %9.3fs %10d tokens" % (key, rec["count"], rec["time"], rec["tokens"]) )
+        out.write( "\n".join( lines ) + "\n" )
+
+#
+#
+if __name__ == "__main__" :
+
+    from sas.bench.counters import CountingHandler
+
+    prof = Profiler()
+    lex = sas.StarLexer( fp = sys.stdin, bufsize = 0 )
+    sas.SansParser.parse( lexer = lex, content_handler = CountingHandler(), error_handler = sas.ErrorHandler(),
+        profiler = prof )
+    prof.report()
@@ -49,6 +49,9 @@ from __future__ import absolute_import
 import sys
 import os
 import re
+import struct
+import stat
+import time
 import ply.lex as lex
 import collections
 import types
@@ -127,6 +130,11 @@ class StarLexer( object ) :
     whitespace_pattern = re.compile( r"\s" )
     newline_pattern = re.compile( r"\n" )
 
+# progress callback, see set_progress(), and limits, see set_limits()
+#
+    _progress = None
+    _limits = None
+
 # token regexps
 #  method-tokens are applied in order 
 #  except for the exceptions
@@ -603,6 +611,11 @@ class StarLexer( object ) :
         self._verbose = bool( verbose )
         self.lexer = lex.lex( module = self, errorlog = lex.NullLogger(), **lexer_args )
 
+# input offsets: characters read so far and where the current chunk starts
+#
+        self._consumed = 0
+        self._chunk_start = 0
+
     # iterator
     #
     def __iter__( self ) :
@@ -625,7 +638,11 @@ class StarLexer( object ) :
         for line in self._fp :
             buf += line
             if len( buf ) >= self._bufsize :
+                self._chunk_start = self._consumed
+                self._consumed += len( buf )
                 self.lexer.input( buf )
+                if self._progress is not None : self._report_progress()
+                if self._limits is not None : self._check_limits()
 #                sys.stderr.write( "INP: buf is |%s|\n" % (buf,) )
                 yield
                 buf = ""
@@ -633,9 +650,17 @@ class StarLexer( object ) :
 # out of for: last chunk
 #
         if len( buf ) > 0 :
+            self._chunk_start = self._consumed
+            self._consumed += len( buf )
             self.lexer.input( buf )
+            if self._progress is not None : self._report_progress()
+            if self._limits is not None : self._check_limits()
             yield
 
+# and the final count (only once: this runs again if the parser asks for more)
+#
+        if self._progress is not None : self._report_progress( force = True )
+
     #
     #
     def next( self ) :
@@ -687,7 +712,327 @@ class StarLexer( object ) :
 
         if self._verbose : sys.stdout.write( self.__class__.__name__ + ".send()\n" )
 
+        self._chunk_start = self._consumed
+        self._consumed += len( lines )
         self.lexer.input( lines )
+        if self._progress is not None : self._report_progress()
+        if self._limits is not None : self._check_limits()
+
+    #
+    #
+    def reset( self, fp = None, bufsize = None ) :
+        """start over with new input: ``fp`` as in the constructor, or ``None`` for ``send()``.
+
+        Building the PLY lexer is the slow part of the constructor, this reuses it."""
+
+        if self._verbose : sys.stdout.write( self.__class__.__name__ + ".reset()\n" )
+
+        self._fp = fp
+        if bufsize is not None : self._bufsize = bufsize
+        self.lexer.input( "" )
+        self.lexer.lineno = 1
+        self.lexer.lexstatestack = []
+        self.lexer.begin( "INITIAL" )
+        self._consumed = 0
+        self._chunk_start = 0
+        self._progress = None
+        self.set_limits()
+
+    #
+    #
+    def set_progress( self, callback, every_bytes = 1048576, every_secs = None, total = None ) :
+        """call ``callback( consumed, total, line, mbps )`` as input is read.
+
+        It's called at chunk boundaries once ``every_bytes`` characters were read or ``every_secs``
+        seconds passed since the last call (either can be ``None``), and at the end of input file.
+        ``consumed`` is the number of characters read so far, ``total`` is input size: ``total``
+        parameter or, if it's ``None``, size of the input file if it's a regular file, else ``None``.
+        ``line`` is the current line number and ``mbps`` is MB/s since the last call.
+
+        ``callback = None`` turns it off, so does ``reset()``."""
+
+        self._progress = callback
+        if callback is None : return
+        if (total is None) and (self._fp is not None) :
+            try :
+                st = os.fstat( self._fp.fileno() )
+                if stat.S_ISREG( st.st_mode ) : total = st.st_size
+            except (AttributeError, IOError, OSError) :
+                pass
+        self._progress_total = total
+        self._progress_bytes = every_bytes
+        self._progress_secs = every_secs
+        self._progress_last = (self._consumed, time.time())
+
+    def _report_progress( self, force = False ) :
+        (last, when) = self._progress_last
+        now = time.time()
+        if force :
+            if self._consumed <= last : return
+        else :
+            if ((self._progress_bytes is None) or (self._consumed - last < self._progress_bytes)) \
+                    and ((self._progress_secs is None) or (now - when < self._progress_secs)) :
+                return
+        mbps = 0.0
+        if now > when : mbps = (self._consumed - last) / (now - when) / 1048576.0
+        self._progress_last = (self._consumed, now)
+        self._progress( self._consumed, self._progress_total, self._lineno(), mbps )
+
+    def _lineno( self ) :
+        return self.lexer.lineno
+
+    #
+    #
+    def set_limits( self, deadline = None, max_tokens = None, max_value = None ) :
+        """stop with ``sas.LimitExceeded`` when
+
+          * ``deadline``: this many seconds have passed (from now),
+          * ``max_tokens``: more tokens than this have been returned,
+          * ``max_value``: a multi-line (semicolon or triple-quoted) value is longer than this.
+
+        Time and value size are checked when the next chunk of input is read, so limits are
+        approximate: by up to one chunk (one line with ``bufsize = 0``). Parsers report the
+        exception through ``ErrorHandler.fatalError()`` and stop; what the handler got before
+        that is intact. Call with no arguments (or ``reset()``) to remove the limits."""
+
+        if self.__dict__.get( "_counting" ) is not None :
+            self.__class__ = self._counting
+        self._counting = None
+        self._limits = None
+        if (deadline is None) and (max_tokens is None) and (max_value is None) : return
+
+        self._limits = (deadline, max_value)
+        if deadline is not None : self._deadline = time.time() + deadline
+        self._value_start = None
+
+# token count: swap in a subclass with counting next(), so there is no cost without the limit
+#
+        if max_tokens is not None :
+            base = self.__class__
+            base_next = base.next
+            def next( lex ) :
+                t = base_next( lex )
+                lex._tokens += 1
+                if lex._tokens > max_tokens :
+                    raise sas.LimitExceeded( line = t.lineno, msg = "limit exceeded: more than %d tokens" % (max_tokens,) )
+                return t
+            self._tokens = 0
+            self._counting = base
+            self.__class__ = type( "Counting" + base.__name__, (base,), { "next" : next, "__next__" : next } )
+
+    def _check_limits( self ) :
+        (deadline, max_value) = self._limits
+        if (deadline is not None) and (time.time() > self._deadline) :
+            raise sas.LimitExceeded( line = self.lexer.lineno, msg = "limit exceeded: deadline of %ss passed" % (deadline,) )
+        if max_value is not None :
+
+# at chunk boundary lexer state is as of the end of previous chunk
+#
+            if self.lexer.current_state() == "INITIAL" :
+                self._value_start = None
+            else :
+                if self._value_start is None : self._value_start = self._chunk_start
+                elif self._consumed - self._value_start > max_value :
+                    raise sas.LimitExceeded( line = self.lexer.lineno,
+                        msg = "limit exceeded: value longer than %d characters" % (max_value,) )
+
+    #
+    #
+    def position( self, token ) :
+        """input offset of ``token``: number of characters read before it.
+
+        (Bytes if the input file was opened in binary mode.)"""
+        return self._chunk_start + token.lexpos
+
+    #
+    #
+    def record( self, out ) :
+        """read all input and write the tokens to binary file ``out``, see ``ReplayLexer``.
+
+        returns number of tokens written"""
+
+        if self._verbose : sys.stdout.write( self.__class__.__name__ + ".record()\n" )
+
+        out.write( _TOKEN_HEADER.pack( _TOKEN_MAGIC, _TOKEN_VERSION ) )
+        buf = []
+        size = 0
+        num = 0
+        for t in self :
+            val = _b( t.value )
+            buf.append( _TOKEN_REC.pack( _TOKEN_CODES[t.type], t.lineno, len( val ) ) )
+            buf.append( val )
+            size += len( val )
+            num += 1
+            if size > 1048576 :
+                out.write( b"".join( buf ) )
+                buf = []
+                size = 0
+        out.write( b"".join( buf ) )
+        return num
+
+################################################################
+# binary token stream
+#  header: "SAST" + uint16 version
+#  token : uint8 type code + int32 line + uint32 length + value bytes
+#
+# type codes are indexes in _TOKEN_TYPES: PLY token names plus lowercase "characters" (escaped
+# double quote) and "error"
+#
+_TOKEN_MAGIC = b"SAST"
+_TOKEN_VERSION = 1
+_TOKEN_HEADER = struct.Struct( "<4sH" )
+_TOKEN_REC = struct.Struct( "<BiI" )
+_TOKEN_TYPES = StarLexer.tokens + ("characters", "error")
+_TOKEN_CODES = dict( (t, i) for (i, t) in enumerate( _TOKEN_TYPES ) )
+
+if sys.version_info[0] > 2 :
+    def _b( s ) :
+        return s.encode( "utf-8" )
+    def _s( b ) :
+        return b.decode( "utf-8" )
+else :
+    def _b( s ) :
+        if isinstance( s, unicode ) : return s.encode( "utf-8" )
+        return s
+    def _s( b ) :
+        return b
+
+# token returned by ReplayLexer: same attributes as PLY's LexToken
+#
+class ReplayToken( object ) :
+    __slots__ = ("type", "value", "lineno", "lexpos", "lexer")
+    def __str__( self ) :
+        return "ReplayToken(%s,%r,%d,%d)" % (self.type, self.value, self.lineno, self.lexpos)
+    __repr__ = __str__
+
+# stands in for PLY lexer in ReplayToken.lexer:
+#  mmCIF and DDL parsers push back the last token by decrementing lexer.lexpos
+#
+class _Rewind( object ) :
+    def __init__( self, replay ) :
+        self._replay = replay
+    def _get_lexpos( self ) :
+        if self._replay._last is None : return 0
+        return sys.maxsize
+    def _set_lexpos( self, pos ) :
+        self._replay._unread()
+    lexpos = property( _get_lexpos, _set_lexpos )
+
+# replay lexer checks progress and limits every this many bytes of token stream
+#
+REPLAY_CHUNK = 65536
+
+#
+#
+class ReplayLexer( StarLexer ) :
+    """
+    Token stream written by ``StarLexer.record()``.
+
+    Can be passed to any parser in place of ``StarLexer``: there's no PLY lexer (and no regexps)
+    behind it, so parse time is parser (and handler) time only.
+
+    ``fp`` is a binary ``file``, or pass the contents as ``data``.
+
+    ``set_progress()`` counts bytes of the token stream (``total`` is its size), and progress and
+    ``deadline`` are checked every ``REPLAY_CHUNK`` bytes of it. ``max_tokens`` works as usual,
+    ``max_value`` is not checked: values were read when the stream was recorded.
+    """
+
+    def __init__( self, fp = None, data = None, verbose = False ) :
+        if verbose : sys.stdout.write( self.__class__.__name__ + ".init()\n" )
+
+        self._fp = None
+        self._verbose = bool( verbose )
+        self.lexer = None
+
+        if data is None :
+            assert fp is not None
+            data = fp.read()
+        (magic, version) = _TOKEN_HEADER.unpack_from( data, 0 )
+        if (magic != _TOKEN_MAGIC) or (version != _TOKEN_VERSION) :
+            raise sas.SasException( msg = "not a SAS token stream (or wrong version)" )
+
+        self._data = data
+        self._pos = _TOKEN_HEADER.size
+        self._end = len( data )
+        self._last = None
+        self._rewind = _Rewind( self )
+
+# position in stream is the input offset for progress; no checks until progress or limits are set
+#
+        self._consumed = 0
+        self._chunk_start = 0
+        self._line = 0
+        self._check_at = self._end + 1
+
+    # push back the last token
+    #
+    def _unread( self ) :
+        if self._last is None :
+            raise sas.SasException( msg = "can't push back: no token" )
+        self._pos = self._last
+        self._last = None
+
+    #
+    #
+    def next( self ) :
+        """returns the next token"""
+        if self._pos >= self._end :
+            if self._progress is not None :
+                self._consumed = self._pos
+                self._report_progress( force = True )
+            raise StopIteration
+
+        (code, line, length) = _TOKEN_REC.unpack_from( self._data, self._pos )
+        start = self._pos + _TOKEN_REC.size
+        t = ReplayToken()
+        t.type = _TOKEN_TYPES[code]
+        t.value = _s( self._data[start:start + length] )
+        t.lineno = line
+        t.lexpos = self._pos
+        t.lexer = self._rewind
+        self._last = self._pos
+        self._pos = start + length
+        self._line = line
+        if self._pos >= self._check_at : self._checkpoint()
+        return t
+
+    # progress and limits
+    #
+    def _checkpoint( self ) :
+        self._consumed = self._pos
+        self._check_at = self._pos + REPLAY_CHUNK
+        if self._progress is not None : self._report_progress()
+        if self._limits is not None : self._check_limits()
+
+    def _schedule( self ) :
+        if (self._progress is None) and (self._limits is None) : self._check_at = self._end + 1
+        else : self._check_at = self._pos + REPLAY_CHUNK
+
+    def set_progress( self, callback, every_bytes = 1048576, every_secs = None, total = None ) :
+        if total is None : total = self._end
+        StarLexer.set_progress( self, callback, every_bytes, every_secs, total )
+        self._schedule()
+    set_progress.__doc__ = StarLexer.set_progress.__doc__
+
+    def set_limits( self, deadline = None, max_tokens = None, max_value = None ) :
+        StarLexer.set_limits( self, deadline, max_tokens, max_value )
+        self._schedule()
+    set_limits.__doc__ = StarLexer.set_limits.__doc__
+
+    def _check_limits( self ) :
+        (deadline, max_value) = self._limits
+        if (deadline is not None) and (time.time() > self._deadline) :
+            raise sas.LimitExceeded( line = self._line, msg = "limit exceeded: deadline of %ss passed" % (deadline,) )
+
+    def _lineno( self ) :
+        return self._line
+
+    def send( self, lines ) :
+        raise sas.SasException( msg = "can't send() input to replay lexer" )
+
+    def reset( self, fp = None, bufsize = None ) :
+        raise sas.SasException( msg = "can't reset() replay lexer" )
 
 #
 #
@@ -702,6 +1047,25 @@ if __name__ == "__main__" :
         if sys.argv[1] == "send" :
             iterator = False
 
+# record token stream to a file: lexer.py record out.tok < input
+#
+        if sys.argv[1] == "record" :
+            with sas.timer( "lexer (record)" ) :
+                l = StarLexer( fp = sys.stdin, bufsize = 0 )
+                with open( sys.argv[2], "wb" ) as out :
+                    l.record( out )
+            sys.exit( 0 )
+
+# and replay it: lexer.py replay in.tok
+#
+        if sys.argv[1] == "replay" :
+            with sas.timer( "lexer (replay)" ) :
+                with open( sys.argv[2], "rb" ) as inp :
+                    l = ReplayLexer( inp )
+                for t in l :
+                    pass
+            sys.exit( 0 )
+
     if iterator :
         with sas.timer( "lexer (iter)" ) :
             l = StarLexer( fp = sys.stdin, bufsize = 0, verbose = True )
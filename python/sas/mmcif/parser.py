@@ -30,15 +30,16 @@ class CifParser( sas.ParserBase ) :
 
     # read a delimited value
     # returns a pair: val, stop where stop is the "stop parsing" sign
+    # if keep is false the value is read past but not assembled (val is None)
     #
-    def _read_value( self, delimiter ) :
+    def _read_value( self, delimiter, keep = True ) :
         assert isinstance( self._lexer, sas.StarLexer )
         assert delimiter in ("SINGLESTART","TSINGLESTART","DOUBLESTART","TDOUBLESTART","SEMISTART")
 
         if self._verbose : sys.stdout.write( self.__class__.__name__ + "._read_value(%s)\n" % (delimiter,) )
 
         stop = False
-        val = ""
+        val = sas.ValueBuffer( self._spill, self._lazy )
         try :
             for token in self._lexer :
 
@@ -47,7 +48,7 @@ class CifParser( sas.ParserBase ) :
                         if self._eh.error( line = token.lineno, msg = "newline in quoted value: %s" % (val,) ) :
                             stop = True
                             break
-                        val += "\n"
+                        if keep : val.append( "\n" )
                         continue
 
                 if delimiter == "SINGLESTART" :
@@ -70,8 +71,7 @@ class CifParser( sas.ParserBase ) :
 #
                 if delimiter == "SEMISTART" :
                     if token.type == "SEMIEND" :
-                        if val.endswith( "\n" ) :
-                            val = val.rstrip( "\n" )
+                        if keep : val.rstrip_newlines()
                         break
 
                 if not delimiter in ("SINGLESTART","DOUBLESTART") :
@@ -82,7 +82,7 @@ class CifParser( sas.ParserBase ) :
                                     % (m.group( 1 ),) ) :
                                 stop = True
                             break
-                val += token.value
+                if keep : val.append( token.value )
 
             else :
                 ln = -1
@@ -92,10 +92,11 @@ class CifParser( sas.ParserBase ) :
                 stop = True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             stop = True
 
-        return (val, stop)
+        if not keep : return (None, stop)
+        return (val.value(), stop)
 
     # top-level parse does not return anything
     #
@@ -107,6 +108,10 @@ class CifParser( sas.ParserBase ) :
 
         if self._verbose : sys.stdout.write( self.__class__.__name__ + "._parse_file()\n" )
 
+# tags the handler wants, None for all
+#
+        self._wanted = self._ch.wanted_tags
+
         try :
             for token in self._lexer :
 
@@ -137,7 +142,7 @@ class CifParser( sas.ParserBase ) :
                 return
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return
 
     # returns a stop sign: if true: stop parsing
@@ -188,9 +193,13 @@ class CifParser( sas.ParserBase ) :
                                 % (token.value,) ) :
                             return True
                     assert isinstance( last_tag, tuple )
-                    if self._ch.data( tag = last_tag[0], tagline = last_tag[1], val = token.value,
-                            valline = token.lineno, delim = sas.TOKENS[token.type], inloop = False ) :
-                        return True
+                    if (self._wanted is None) or (last_tag[0] in self._wanted) :
+                        val = token.value
+                        if (self._nulls is not None) and (token.type == "CHARACTERS") and (val in self._nulls) :
+                            val = self._nulls[val]
+                        if self._ch.data( tag = last_tag[0], tagline = last_tag[1], val = val,
+                                valline = token.lineno, delim = sas.TOKENS[token.type], inloop = False ) :
+                            return True
                     need_value = False
                     continue
 
@@ -199,12 +208,14 @@ class CifParser( sas.ParserBase ) :
                         if self._eh.error( line = token.lineno, msg = "value not expected here (found delimiter)" ) :
                             return True
                     assert isinstance( last_tag, tuple )
-                    (val, stop) = self._read_value( token.type )
+                    keep = (self._wanted is None) or (last_tag[0] in self._wanted)
+                    (val, stop) = self._read_value( token.type, keep )
                     if stop : return True
 
-                    if self._ch.data( tag = last_tag[0], tagline = last_tag[1], val = val,
-                            valline = token.lineno, delim = sas.TOKENS[token.type], inloop = False ) :
-                        return True
+                    if keep :
+                        if self._ch.data( tag = last_tag[0], tagline = last_tag[1], val = val,
+                                valline = token.lineno, delim = sas.TOKENS[token.type], inloop = False ) :
+                            return True
                     need_value = False
                     continue
 
@@ -224,9 +235,16 @@ class CifParser( sas.ParserBase ) :
                 return True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
+    # list of flags: true if handler wants the value in that loop column
+    #
+    def _wanted_columns( self, tags ) :
+        if self._wanted is None :
+            return [True] * len( tags )
+        return [(tag[0] in self._wanted) for tag in tags]
+
     # returns a stop sign: if true: stop parsing
     #
     def _parse_loop( self ) :
@@ -242,6 +260,9 @@ class CifParser( sas.ParserBase ) :
         tags = []
         tag_idx = -1
         numvals = 0
+        keep = None
+        interns = None
+        nulls = self._nulls
 
         try :
             for token in self._lexer :
@@ -291,7 +312,8 @@ class CifParser( sas.ParserBase ) :
 
 # else collect tags
 #
-                    tags.append( (token.value,token.lineno) )
+                    if self._intern is not None : tags.append( (intern( token.value ),token.lineno) )
+                    else : tags.append( (token.value,token.lineno) )
                     continue
 
                 if token.type in ("CHARACTERS","FRAMECODE") :
@@ -305,12 +327,21 @@ class CifParser( sas.ParserBase ) :
                         else :
                             tags.append( "LOOP_WITH_NO_TAGS" )
 
+                    if keep is None :
+                        keep = self._wanted_columns( tags )
+                        interns = self._column_interns( tags )
+
                     numvals += 1
                     tag_idx += 1
                     if tag_idx >= len( tags ) :
                         tag_idx = 0
 
-                    if self._ch.data( tag = tags[tag_idx][0], tagline = tags[tag_idx][1], val = token.value,
+                    if not keep[tag_idx] : continue
+
+                    val = token.value
+                    if (nulls is not None) and (token.type == "CHARACTERS") and (val in nulls) : val = nulls[val]
+                    elif interns is not None : val = interns[tag_idx]( val )
+                    if self._ch.data( tag = tags[tag_idx][0], tagline = tags[tag_idx][1], val = val,
                             valline = token.lineno, delim = sas.TOKENS[token.type], inloop = True ) :
                         return True
                     continue
@@ -326,14 +357,21 @@ class CifParser( sas.ParserBase ) :
                         else :
                             tags.append( "LOOP_WITH_NO_TAGS" )
 
+                    if keep is None :
+                        keep = self._wanted_columns( tags )
+                        interns = self._column_interns( tags )
+
                     numvals += 1
                     tag_idx += 1
                     if tag_idx >= len( tags ) :
                         tag_idx = 0
 
-                    (val, stop) = self._read_value( token.type )
+                    (val, stop) = self._read_value( token.type, keep[tag_idx] )
                     if stop : return True
 
+                    if not keep[tag_idx] : continue
+
+                    if (interns is not None) and (type( val ) is str) : val = interns[tag_idx]( val )
                     if self._ch.data( tag = tags[tag_idx][0], tagline = tags[tag_idx][1], val = val,
                             valline = token.lineno, delim = sas.TOKENS[token.type], inloop = True ) :
                         return True
@@ -362,7 +400,7 @@ class CifParser( sas.ParserBase ) :
                 return True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
 ###################################################################################################
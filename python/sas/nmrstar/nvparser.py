@@ -58,7 +58,7 @@ class Parser( sas.ParserBase ) :
                 return
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return
 
     # returns a stop sign: if true: stop parsing
@@ -100,7 +100,7 @@ class Parser( sas.ParserBase ) :
                 return True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
     # read a delimited value
@@ -113,7 +113,7 @@ class Parser( sas.ParserBase ) :
         if self._verbose : sys.stdout.write( self.__class__.__name__ + "._read_value(%s)\n" % (delimiter,) )
 
         stop = False
-        val = ""
+        val = sas.ValueBuffer( self._spill, self._lazy )
         try :
             for token in self._lexer :
 
@@ -122,7 +122,7 @@ class Parser( sas.ParserBase ) :
                         if self._eh.error( line = token.lineno, msg = "newline in quoted value: %s" % (val,) ) :
                             stop = True
                             break
-                        val += "\n"
+                        val.append( "\n" )
                         continue
 
                 if delimiter == "SINGLESTART" :
@@ -145,7 +145,7 @@ class Parser( sas.ParserBase ) :
 #
                 if delimiter == "SEMISTART" :
                     if token.type == "SEMIEND" :
-                        if val.endswith( "\n" ) : val = val.rstrip( "\n" )
+                        val.rstrip_newlines()
                         break
 
                 if not delimiter in ("SINGLESTART","DOUBLESTART") :
@@ -157,7 +157,7 @@ class Parser( sas.ParserBase ) :
                                 stop = True
                             break
 
-                val += token.value
+                val.append( token.value )
 
             else :
                 ln = -1
@@ -167,10 +167,10 @@ class Parser( sas.ParserBase ) :
                 stop = True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             stop = True
 
-        return (val, stop)
+        return (val.value(), stop)
 
     # returns a stop sign: if true: stop parsing
     #
@@ -277,7 +277,7 @@ class Parser( sas.ParserBase ) :
                 return True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
     # returns a stop sign: if true: stop parsing
@@ -378,7 +378,7 @@ class Parser( sas.ParserBase ) :
                 return True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
 ###################################################################################################
@@ -28,6 +28,11 @@ class SansParser( sas.ParserBase ) :
 
         if self._verbose : sys.stdout.write( self.__class__.__name__ + "._parse_file()\n" )
 
+# tags the handler wants, None for all; loop row filters, None for none
+#
+        self._wanted = self._ch.wanted_tags
+        self._filters = self._ch.row_filters
+
         try :
             for token in self._lexer :
 
@@ -57,7 +62,7 @@ class SansParser( sas.ParserBase ) :
                 self._ch.endData( line = ln, name = self._data_name )
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return
 
     # returns a stop sign: if true: stop parsing
@@ -101,20 +106,21 @@ class SansParser( sas.ParserBase ) :
             return False
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
     # read a delimited value
     # returns a pair: val, stop where stop is the sopt parsing sign
+    # if keep is false the value is read past but not assembled (val is None)
     #
-    def _read_value( self, delimiter ) :
+    def _read_value( self, delimiter, keep = True ) :
         assert isinstance( self._lexer, sas.StarLexer )
         assert delimiter in ("SINGLESTART","TSINGLESTART","DOUBLESTART","TDOUBLESTART","SEMISTART")
 
         if self._verbose : sys.stdout.write( self.__class__.__name__ + "._read_value(%s)\n" % (delimiter,) )
 
         stop = False
-        val = ""
+        val = sas.ValueBuffer( self._spill, self._lazy )
         try :
             for token in self._lexer :
 
@@ -125,7 +131,7 @@ class SansParser( sas.ParserBase ) :
                         if self._eh.error( line = token.lineno, msg = "newline in quoted value: %s" % (val,) ) :
                             stop = True
                             break
-                        val += "\n"
+                        if keep : val.append( "\n" )
                         continue
 
                 if delimiter == "SINGLESTART" :
@@ -148,7 +154,7 @@ class SansParser( sas.ParserBase ) :
 #
                 if delimiter == "SEMISTART" :
                     if token.type == "SEMIEND" :
-                        if val.endswith( "\n" ) : val = val.rstrip( "\n" )
+                        if keep : val.rstrip_newlines()
                         break
 
                 if not delimiter in ("SINGLESTART","DOUBLESTART") :
@@ -160,7 +166,7 @@ class SansParser( sas.ParserBase ) :
                                 stop = True
                             break
 
-                val += token.value
+                if keep : val.append( token.value )
 
             else :
                 ln = -1
@@ -170,10 +176,11 @@ class SansParser( sas.ParserBase ) :
                 stop = True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             stop = True
 
-        return (val, stop)
+        if not keep : return (None, stop)
+        return (val.value(), stop)
 
     # returns a stop sign: if true: stop parsing
     #
@@ -233,9 +240,13 @@ class SansParser( sas.ParserBase ) :
                                 % (token.value,) ) :
                             return True
                     assert isinstance( last_tag, tuple )
-                    if self._ch.data( tag = last_tag[0], tagline = last_tag[1], val = token.value,
-                            valline = token.lineno, delim = sas.TOKENS[token.type], inloop = False ) :
-                        return True
+                    if (self._wanted is None) or (last_tag[0] in self._wanted) :
+                        val = token.value
+                        if (self._nulls is not None) and (token.type == "CHARACTERS") and (val in self._nulls) :
+                            val = self._nulls[val]
+                        if self._ch.data( tag = last_tag[0], tagline = last_tag[1], val = val,
+                                valline = token.lineno, delim = sas.TOKENS[token.type], inloop = False ) :
+                            return True
                     need_value = False
                     continue
 
@@ -244,12 +255,14 @@ class SansParser( sas.ParserBase ) :
                         if self._eh.error( line = token.lineno, msg = "value not expected here (found delimiter)" ) :
                             return True
                     assert isinstance( last_tag, tuple )
-                    (val, stop) = self._read_value( token.type )
+                    keep = (self._wanted is None) or (last_tag[0] in self._wanted)
+                    (val, stop) = self._read_value( token.type, keep )
                     if stop : return True
 
-                    if self._ch.data( tag = last_tag[0], tagline = last_tag[1], val = val,
-                            valline = token.lineno, delim = sas.TOKENS[token.type], inloop = False ) :
-                        return True
+                    if keep :
+                        if self._ch.data( tag = last_tag[0], tagline = last_tag[1], val = val,
+                                valline = token.lineno, delim = sas.TOKENS[token.type], inloop = False ) :
+                            return True
                     need_value = False
                     continue
 
@@ -270,9 +283,26 @@ class SansParser( sas.ParserBase ) :
                 return True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
+    # list of flags: true if handler wants the value in that loop column
+    #
+    def _wanted_columns( self, tags ) :
+        if self._wanted is None :
+            return [True] * len( tags )
+        return [(tag[0] in self._wanted) for tag in tags]
+
+    # list of row filters for loop columns, None if there aren't any
+    #
+    def _column_filters( self, tags ) :
+        if self._filters is None :
+            return None
+        rc = [self._filters.get( tag[0] ) for tag in tags]
+        if rc.count( None ) == len( rc ) :
+            return None
+        return rc
+
     # returns a stop sign: if true: stop parsing
     #
     def _parse_loop( self ) :
@@ -288,6 +318,15 @@ class SansParser( sas.ParserBase ) :
         tag_idx = -1
         numvals = 0
 
+# per-column "wanted" flags and row filters, filled in once all tags are read
+# once a filter rejects a row, the rest of it is skipped
+#
+        keep = None
+        filters = None
+        skip_row = False
+        interns = None
+        nulls = self._nulls
+
         try :
             for token in self._lexer :
 
@@ -319,7 +358,12 @@ class SansParser( sas.ParserBase ) :
                         if self._eh.error( line = token.lineno, msg = "tag not expected here: %s" \
                                 % (token.value,) ) :
                             return True
-                    tags.append( (token.value,token.lineno) )
+                    if self._intern is not None : tags.append( (intern( token.value ),token.lineno) )
+                    else : tags.append( (token.value,token.lineno) )
+
+# late tag (error handler said go on): per-column lists are recomputed at the next value
+#
+                    keep = None
                     continue
 
                 if token.type in ("CHARACTERS","FRAMECODE") :
@@ -332,12 +376,29 @@ class SansParser( sas.ParserBase ) :
                         else :
                             tags.append( "LOOP_WITH_NO_TAGS" )
 
+                    if keep is None :
+                        keep = self._wanted_columns( tags )
+                        filters = self._column_filters( tags )
+                        interns = self._column_interns( tags )
+
                     numvals += 1
                     tag_idx += 1
                     if tag_idx >= len( tags ) :
                         tag_idx = 0
+                        skip_row = False
+
+                    if skip_row : continue
+                    if (filters is not None) and (filters[tag_idx] is not None) :
+                        if not filters[tag_idx]( token.value ) :
+                            skip_row = True
+                            continue
 
-                    if self._ch.data( tag = tags[tag_idx][0], tagline = tags[tag_idx][1], val = token.value,
+                    if not keep[tag_idx] : continue
+
+                    val = token.value
+                    if (nulls is not None) and (token.type == "CHARACTERS") and (val in nulls) : val = nulls[val]
+                    elif interns is not None : val = interns[tag_idx]( val )
+                    if self._ch.data( tag = tags[tag_idx][0], tagline = tags[tag_idx][1], val = val,
                             valline = token.lineno, delim = sas.TOKENS[token.type], inloop = True ) :
                         return True
                     continue
@@ -352,14 +413,30 @@ class SansParser( sas.ParserBase ) :
                         else :
                             tags.append( "LOOP_WITH_NO_TAGS" )
 
+                    if keep is None :
+                        keep = self._wanted_columns( tags )
+                        filters = self._column_filters( tags )
+                        interns = self._column_interns( tags )
+
                     numvals += 1
                     tag_idx += 1
                     if tag_idx >= len( tags ) :
                         tag_idx = 0
+                        skip_row = False
 
-                    (val, stop) = self._read_value( token.type )
+                    read = keep[tag_idx] or ((filters is not None) and (filters[tag_idx] is not None))
+                    (val, stop) = self._read_value( token.type, (read and not skip_row) )
                     if stop : return True
 
+                    if skip_row or (not read) : continue
+                    if (filters is not None) and (filters[tag_idx] is not None) :
+                        if not filters[tag_idx]( val ) :
+                            skip_row = True
+                            continue
+
+                    if not keep[tag_idx] : continue
+
+                    if (interns is not None) and (type( val ) is str) : val = interns[tag_idx]( val )
                     if self._ch.data( tag = tags[tag_idx][0], tagline = tags[tag_idx][1], val = val,
                             valline = token.lineno, delim = sas.TOKENS[token.type], inloop = True ) :
                         return True
@@ -387,7 +464,7 @@ class SansParser( sas.ParserBase ) :
                 return True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
 ###################################################################################################
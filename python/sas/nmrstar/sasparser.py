@@ -57,7 +57,7 @@ class SasParser( sas.ParserBase ) :
                 self._ch.endData( line = ln, name = self._data_name )
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return
 
     # returns a stop sign: if true: stop parsing
@@ -101,7 +101,7 @@ class SasParser( sas.ParserBase ) :
             return False
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
     # returns a stop sign: if true: stop parsing
@@ -256,7 +256,7 @@ class SasParser( sas.ParserBase ) :
                 return True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
     # returns a stop sign: if true: stop parsing
@@ -411,7 +411,7 @@ class SasParser( sas.ParserBase ) :
                 return True
 
         except sas.SasException, e :
-            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+            self._lexer_error( e )
             return True
 
 ###################################################################################################
@@ -44,6 +44,17 @@ class ParserBase( object ) :
         self._data_name = "__FILE__"
         self._save_name = "__UNNAMED__"
 
+# delimited values longer than this go to a temporary file, others may be lazy (sas.values)
+#
+        self._spill = getattr( ch, "spill_threshold", None )
+        self._lazy = bool( getattr( ch, "lazy_values", False ) )
+        self._intern = getattr( ch, "intern_values", None )
+
+# unquoted value : sas.Null, or None to pass nulls as strings
+#
+        self._nulls = None
+        if getattr( ch, "null_values", False ) : self._nulls = sas.values.NULL_VALUES
+
     #
     #
     @property
@@ -57,19 +68,62 @@ class ParserBase( object ) :
     # main
     #
     @classmethod
-    def parse( cls, lexer, content_handler, error_handler, verbose = False ) :
+    def parse( cls, lexer, content_handler, error_handler, verbose = False, profiler = None, progress = None,
+            deadline = None, max_tokens = None, max_value = None ) :
         """
         Main method
 
         parameters are the same as for the contructor
 
+        ``profiler``: optional ``sas.instrument.Profiler``, it instruments the lexer and
+        content handler for the duration of the parse
+
+        ``progress``: optional callable( consumed, total, line, mbps ), called every megabyte of
+        input, see ``StarLexer.set_progress()`` (call that instead for other intervals)
+
+        ``deadline`` (seconds), ``max_tokens``, ``max_value`` (characters): optional limits, see
+        ``StarLexer.set_limits()``. When one is reached the parser calls ``fatalError()`` with
+        a message that starts with "limit exceeded" and stops.
+
+        Progress callback and limits set here are removed from ``lexer`` when the parse is done.
+
         returns parser instance
         """
-        parser = cls( lex = lexer, ch = content_handler, eh = error_handler, verbose = verbose )
-        assert isinstance( parser, ParserBase )
-        parser._parse_file()
+        if progress is not None :
+            lexer.set_progress( progress )
+        limits = (deadline is not None) or (max_tokens is not None) or (max_value is not None)
+        if limits :
+            lexer.set_limits( deadline, max_tokens, max_value )
+        if profiler is not None :
+            profiler.attach( lexer, content_handler )
+        try :
+            parser = cls( lex = lexer, ch = content_handler, eh = error_handler, verbose = verbose )
+            assert isinstance( parser, ParserBase )
+            parser._parse_file()
+        finally :
+            if profiler is not None :
+                profiler.detach()
+            if limits :
+                lexer.set_limits()
+            if progress is not None :
+                lexer.set_progress( None )
         return parser
 
+    # list of per-column intern caches for loop values, None if not interning
+    #
+    def _column_interns( self, tags ) :
+        if self._intern is None :
+            return None
+        return [sas.ColumnIntern( self._intern ) for tag in tags]
+
+    # exception from lexer: limit or lexer error
+    #
+    def _lexer_error( self, e ) :
+        if isinstance( e, sas.LimitExceeded ) :
+            self._eh.fatalError( line = e._line, msg = str( e._msg ) )
+        else :
+            self._eh.fatalError( line = e._line, msg = "Lexer error: " + str( e._msg ) )
+
     @abc.abstractmethod
     def _parse_file() :
         raise Exception( "Abstract method called" )
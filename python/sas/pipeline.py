@@ -0,0 +1,341 @@
+#!/usr/bin/python -u
+#
+# Pass-through filters: parser -> stage -> stage -> ... -> StarWriter
+#
+# Each stage is a ``ContentHandler`` that passes (possibly changed) callbacks on to the next one.
+# Stages hold at most one loop row (``FilterRows``) or the first few items of a saveframe
+# (``DropSaveframes`` by category), so memory use doesn't depend on the size of input.
+#
+# Tags dropped by the pipeline are also passed to the parser as unwanted (see ``wanted_tags``
+# in ``handlers.py``), the parser doesn't assemble their values.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+from sas.writer import StarWriter, WriterHandler
+
+#
+#
+class Stage( sas.ContentHandler ) :
+    """
+    Pipeline stage: passes everything on to the next handler as is. Subclass and override.
+
+    ``upstream_tag()`` returns what the stage turns ``tag`` into: new name or ``None`` if it
+    drops it. ``needs()`` returns ``True`` if the stage looks at ``tag`` value.
+    """
+
+    def __init__( self ) :
+        self._next = None
+
+    def link( self, handler ) :
+        """set next handler in the chain"""
+        assert isinstance( handler, sas.ContentHandler )
+        self._next = handler
+
+    def upstream_tag( self, tag ) :
+        return tag
+    def needs( self, tag ) :
+        return False
+
+    def startData( self, line, name ) :
+        return self._next.startData( line, name )
+    def endData( self, line, name ) :
+        return self._next.endData( line, name )
+    def startSaveframe( self, line, name ) :
+        return self._next.startSaveframe( line, name )
+    def endSaveframe( self, line, name ) :
+        return self._next.endSaveframe( line, name )
+    def startLoop( self, line ) :
+        return self._next.startLoop( line )
+    def endLoop( self, line ) :
+        return self._next.endLoop( line )
+    def comment( self, line, text ) :
+        return self._next.comment( line, text )
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        return self._next.data( tag, tagline, val, valline, delim, inloop )
+
+#
+#
+class DropTags( Stage ) :
+    """drop items and loop columns for ``tags``"""
+
+    def __init__( self, tags ) :
+        super( DropTags, self ).__init__()
+        self._tags = frozenset( tags )
+
+    def upstream_tag( self, tag ) :
+        if tag in self._tags : return None
+        return tag
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        if tag in self._tags : return False
+        return self._next.data( tag, tagline, val, valline, delim, inloop )
+
+#
+#
+class RenameTags( Stage ) :
+    """rename tags: ``mapping`` is a ``dict`` of old name : new name"""
+
+    def __init__( self, mapping ) :
+        super( RenameTags, self ).__init__()
+        self._map = dict( mapping )
+
+    def upstream_tag( self, tag ) :
+        return self._map.get( tag, tag )
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        return self._next.data( self._map.get( tag, tag ), tagline, val, valline, delim, inloop )
+
+#
+#
+class MapValues( Stage ) :
+    """change values: ``funcs`` is a ``dict`` of tag : callable( value ) -> new value"""
+
+    def __init__( self, funcs ) :
+        super( MapValues, self ).__init__()
+        self._funcs = dict( funcs )
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        f = self._funcs.get( tag )
+        if f is not None :
+            val = f( val )
+        return self._next.data( tag, tagline, val, valline, delim, inloop )
+
+#
+#
+class FilterRows( Stage ) :
+    """
+    Drop loop rows: ``filters`` is a ``dict`` of tag : callable( value ) -> bool, a row is passed
+    on if all callables for its values return ``True``. Free items are not filtered.
+
+    The current row is held until the next one starts (its first tag repeats) or the loop ends.
+    """
+
+    def __init__( self, filters ) :
+        super( FilterRows, self ).__init__()
+        self._filters = dict( filters )
+        self._first = None
+        self._row = []
+        self._ok = True
+
+    def needs( self, tag ) :
+        return tag in self._filters
+
+    def _flush( self ) :
+        row = self._row
+        ok = self._ok
+        self._row = []
+        self._ok = True
+        if not ok : return False
+        for args in row :
+            if self._next.data( *args ) :
+                return True
+        return False
+
+    def startLoop( self, line ) :
+        self._first = None
+        self._row = []
+        self._ok = True
+        return self._next.startLoop( line )
+
+    def endLoop( self, line ) :
+        if self._flush() : return True
+        return self._next.endLoop( line )
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        if not inloop :
+            return self._next.data( tag, tagline, val, valline, delim, inloop )
+
+        if self._first is None :
+            self._first = tag
+        elif tag == self._first :
+            if self._flush() : return True
+
+        self._row.append( (tag, tagline, val, valline, delim, inloop) )
+        if self._ok :
+            f = self._filters.get( tag )
+            if (f is not None) and (not f( val )) :
+                self._ok = False
+        return False
+
+#
+#
+class DropSaveframes( Stage ) :
+    """
+    Drop saveframes by ``names`` and/or ``categories`` (value of ``Sf_category`` tag).
+
+    To check the category, callbacks are held until the ``Sf_category`` item.
+    """
+
+    def __init__( self, names = None, categories = None ) :
+        super( DropSaveframes, self ).__init__()
+        self._names = frozenset( names or () )
+        self._categories = frozenset( categories or () )
+        self._drop = False
+        self._held = None
+
+    def needs( self, tag ) :
+        return (len( self._categories ) > 0) and tag.endswith( ".Sf_category" )
+
+    def _release( self ) :
+        held = self._held
+        self._held = None
+        for (name, args) in held :
+            if getattr( self._next, name )( *args ) :
+                return True
+        return False
+
+    def startSaveframe( self, line, name ) :
+        self._drop = name in self._names
+        if self._drop : return False
+        if len( self._categories ) > 0 :
+            self._held = [("startSaveframe", (line, name))]
+            return False
+        return self._next.startSaveframe( line, name )
+
+    def endSaveframe( self, line, name ) :
+        if self._drop :
+            self._drop = False
+            return False
+        if self._held is not None :
+            if self._release() : return True
+        return self._next.endSaveframe( line, name )
+
+    def startLoop( self, line ) :
+        if self._drop : return False
+        if self._held is not None :
+            self._held.append( ("startLoop", (line,)) )
+            return False
+        return self._next.startLoop( line )
+
+    def endLoop( self, line ) :
+        if self._drop : return False
+        if self._held is not None :
+            self._held.append( ("endLoop", (line,)) )
+            return False
+        return self._next.endLoop( line )
+
+    def comment( self, line, text ) :
+        if self._drop : return False
+        if self._held is not None :
+            self._held.append( ("comment", (line, text)) )
+            return False
+        return self._next.comment( line, text )
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        if self._drop : return False
+        if self._held is None :
+            return self._next.data( tag, tagline, val, valline, delim, inloop )
+
+        self._held.append( ("data", (tag, tagline, val, valline, delim, inloop)) )
+        if (not inloop) and tag.endswith( ".Sf_category" ) :
+            if val in self._categories :
+                self._drop = True
+                self._held = None
+                return False
+            return self._release()
+        return False
+
+# wanted tags for the parser: tags that make it through the pipeline or that a stage looks at
+#
+class _Wanted( object ) :
+    def __init__( self, stages ) :
+        self._stages = stages
+        self._cache = {}
+
+    def __contains__( self, tag ) :
+        rc = self._cache.get( tag )
+        if rc is None :
+            rc = self._check( tag )
+            self._cache[tag] = rc
+        return rc
+
+    def _check( self, tag ) :
+        for stage in self._stages :
+            if stage.needs( tag ) : return True
+            tag = stage.upstream_tag( tag )
+            if tag is None : return False
+        return True
+
+#
+#
+class Pipeline( object ) :
+    """
+    Chain of ``stages`` that writes to ``out``.
+
+    E.g. ``Pipeline( [DropSaveframes( categories = ["spectral_peak_list"] ),
+    DropTags( ["_Entry.Details"] )], sys.stdout ).run( sys.stdin )``
+    """
+
+    def __init__( self, stages, out, mmcif = False ) :
+        self._stages = list( stages )
+        self._mmcif = bool( mmcif )
+        self._writer = StarWriter( out, mmcif = self._mmcif )
+
+        handler = WriterHandler( self._writer )
+        for stage in reversed( self._stages ) :
+            assert isinstance( stage, Stage )
+            stage.link( handler )
+            handler = stage
+        self._head = handler
+        self._head.wanted_tags = _Wanted( self._stages )
+
+    @property
+    def handler( self ) :
+        """first handler in the chain, pass it to the parser"""
+        return self._head
+
+    def run( self, fp, parser = None, error_handler = None, verbose = False ) :
+        """parse ``fp`` with ``parser`` (``SansParser`` or ``CifParser`` by default)"""
+        if parser is None :
+            parser = self._mmcif and sas.CifParser or sas.SansParser
+        if error_handler is None : error_handler = sas.ErrorHandler()
+        lex = sas.StarLexer( fp, bufsize = 0, verbose = verbose )
+        parser.parse( lexer = lex, content_handler = self._head, error_handler = error_handler, verbose = verbose )
+        self._writer.flush()
+
+    def run_file( self, filename, parser = None, error_handler = None, verbose = False ) :
+        with open( filename, "rU" ) as f :
+            self.run( f, parser, error_handler, verbose )
+
+#
+#
+if __name__ == "__main__" :
+
+    import argparse
+    import time
+
+    par = argparse.ArgumentParser( description = "filter STAR file" )
+    par.add_argument( "-c", "--cif", dest = "mmcif", default = False, action = "store_true", help = "mmCIF input" )
+    par.add_argument( "-x", "--drop-category", dest = "categories", action = "append", default = [],
+        help = "drop saveframes of this category" )
+    par.add_argument( "-s", "--drop-saveframe", dest = "saveframes", action = "append", default = [],
+        help = "drop saveframe with this name" )
+    par.add_argument( "-d", "--drop-tag", dest = "tags", action = "append", default = [], help = "drop tag" )
+    par.add_argument( "-r", "--rename", dest = "rename", action = "append", default = [], help = "old_tag=new_tag" )
+    par.add_argument( "-o", "--output", dest = "output", help = "output file (default: stdout)" )
+    par.add_argument( "input", help = "input file" )
+    args = par.parse_args()
+
+    stages = []
+    if (len( args.categories ) > 0) or (len( args.saveframes ) > 0) :
+        stages.append( DropSaveframes( names = args.saveframes, categories = args.categories ) )
+    if len( args.tags ) > 0 :
+        stages.append( DropTags( args.tags ) )
+    if len( args.rename ) > 0 :
+        stages.append( RenameTags( dict( r.split( "=", 1 ) for r in args.rename ) ) )
+
+    out = sys.stdout
+    if args.output is not None :
+        out = open( args.output, "wb" )
+    start = time.time()
+    Pipeline( stages, out, mmcif = args.mmcif ).run_file( args.input )
+    if args.output is not None :
+        out.close()
+    sys.stderr.write( "%s: %0.3f\n" % (args.input, time.time() - start) )
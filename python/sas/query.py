@@ -0,0 +1,404 @@
+#!/usr/bin/python -u
+#
+# Streaming queries over STAR files.
+#
+# Query syntax (keywords are case-insensitive):
+#
+#   SELECT tag [, tag ...]
+#     [WHERE condition [AND condition ...]]
+#     [IN saveframe_category [, saveframe_category ...]]
+#     [WITH condition [AND condition ...]]
+#
+#   condition := tag op literal | tag BETWEEN literal AND literal
+#   op        := = | != | < | <= | > | >=
+#
+# SELECT tags must all be from the same table (category). WHERE conditions apply to rows of that
+# table, their tags can be given without category: "Atom_ID" is the same as "_Atom_chem_shift.Atom_ID"
+# if selecting "_Atom_chem_shift.Val". IN limits the search to saveframes of given category
+# (NMR-STAR only), WITH limits it to data blocks (entries) where any value of each WITH tag
+# satisfies the condition(s). Conditions on the same tag are ANDed: "Val >= 50 AND Val <= 55" is
+# a range. Range operators compare numerically, non-numeric values never match.
+#
+# E.g.
+#   SELECT _Atom_chem_shift.Val WHERE Atom_ID = 'CA' WITH _Entity.Polymer_type = 'polypeptide(L)'
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import re
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+# query tokens: quoted string, operator, or anything else
+#
+_TOKEN = re.compile( r"""\s*(?:'(?P<squote>[^']*)'|"(?P<dquote>[^"]*)"|(?P<op><=|>=|!=|=|<|>|,)|(?P<word>[^\s,=<>!'"]+))""" )
+_KEYWORDS = ("SELECT", "WHERE", "AND", "BETWEEN", "IN", "WITH")
+
+# predicates
+#
+def _to_float( val ) :
+    try :
+        return float( val )
+    except (TypeError, ValueError) :
+        return None
+
+def _predicate( op, args ) :
+    """compile condition into a callable( value ) -> bool"""
+    if op == "=" :
+        ref = args[0]
+        return lambda val : val == ref
+    if op == "!=" :
+        ref = args[0]
+        return lambda val : val != ref
+
+    nums = [_to_float( a ) for a in args]
+    if None in nums :
+        raise ValueError( "%s needs numeric argument(s): %s" % (op, args,) )
+
+    def between( val ) :
+        v = _to_float( val )
+        return (v is not None) and (nums[0] <= v <= nums[1])
+    def lt( val ) :
+        v = _to_float( val )
+        return (v is not None) and (v < nums[0])
+    def le( val ) :
+        v = _to_float( val )
+        return (v is not None) and (v <= nums[0])
+    def gt( val ) :
+        v = _to_float( val )
+        return (v is not None) and (v > nums[0])
+    def ge( val ) :
+        v = _to_float( val )
+        return (v is not None) and (v >= nums[0])
+
+    rc = { "BETWEEN" : between, "<" : lt, "<=" : le, ">" : gt, ">=" : ge }.get( op )
+    if rc is None :
+        raise ValueError( "unknown operator %s" % (op,) )
+    return rc
+
+#
+#
+class Query( object ) :
+    """
+    Compiled query.
+
+    ``select`` is a list of tags, ``where`` and ``with_`` are lists of ``(tag, op, arg [, arg])``
+    tuples, ``categories`` is a list of saveframe categories. See module comment for details.
+
+    Use ``Query.compile( text )`` to make one from a query string.
+    """
+
+    #
+    #
+    @classmethod
+    def compile( cls, text ) :
+        """parse query string"""
+        tokens = []
+        pos = 0
+        text = text.strip()
+        while pos < len( text ) :
+            m = _TOKEN.match( text, pos )
+            if not m :
+                raise ValueError( "query syntax error at: %s" % (text[pos:],) )
+            pos = m.end()
+            if m.group( "word" ) is not None :
+                if m.group( "word" ).upper() in _KEYWORDS :
+                    tokens.append( ("KW", m.group( "word" ).upper()) )
+                else :
+                    tokens.append( ("WORD", m.group( "word" )) )
+            elif m.group( "op" ) is not None :
+                tokens.append( ("OP", m.group( "op" )) )
+            elif m.group( "squote" ) is not None :
+                tokens.append( ("WORD", m.group( "squote" )) )
+            else :
+                tokens.append( ("WORD", m.group( "dquote" )) )
+
+        if (len( tokens ) < 2) or (tokens[0] != ("KW", "SELECT")) :
+            raise ValueError( "query must start with SELECT" )
+
+        idx = [1]
+        def peek() :
+            if idx[0] < len( tokens ) : return tokens[idx[0]]
+            return (None, None)
+        def take( kind ) :
+            tok = peek()
+            if tok[0] != kind :
+                raise ValueError( "query syntax error: expected %s, found %s" % (kind, tok[1],) )
+            idx[0] += 1
+            return tok[1]
+        def names() :
+            rc = [take( "WORD" )]
+            while peek() == ("OP", ",") :
+                idx[0] += 1
+                rc.append( take( "WORD" ) )
+            return rc
+        def conditions() :
+            rc = []
+            while True :
+                tag = take( "WORD" )
+                if peek() == ("KW", "BETWEEN") :
+                    idx[0] += 1
+                    lo = take( "WORD" )
+                    take( "KW" )
+                    hi = take( "WORD" )
+                    rc.append( (tag, "BETWEEN", lo, hi) )
+                else :
+                    op = take( "OP" )
+                    rc.append( (tag, op, take( "WORD" )) )
+                if peek() != ("KW", "AND") : break
+                idx[0] += 1
+            return rc
+
+        select = names()
+        where = []
+        categories = None
+        with_ = []
+        while idx[0] < len( tokens ) :
+            kw = take( "KW" )
+            if kw == "WHERE" : where.extend( conditions() )
+            elif kw == "IN" : categories = names()
+            elif kw == "WITH" : with_.extend( conditions() )
+            else : raise ValueError( "query syntax error: unexpected %s" % (kw,) )
+
+        return cls( select = select, where = where, categories = categories, with_ = with_ )
+
+    #
+    #
+    def __init__( self, select, where = None, categories = None, with_ = None ) :
+        self._select = list( select )
+        if len( self._select ) < 1 :
+            raise ValueError( "nothing to select" )
+
+        self._category = None
+        for tag in self._select :
+            if (not tag.startswith( "_" )) or (tag.find( "." ) < 0) :
+                raise ValueError( "SELECT tag must be fully qualified: %s" % (tag,) )
+            cat = tag[:tag.find( "." )]
+            if self._category is None : self._category = cat
+            elif cat != self._category :
+                raise ValueError( "SELECT tags must be from one category: %s" % (tag,) )
+
+# qualify where tags, compile conditions
+#
+        self._where = []
+        for cond in (where or []) :
+            tag = cond[0]
+            if not tag.startswith( "_" ) :
+                tag = "%s.%s" % (self._category, tag)
+            if not tag.startswith( self._category + "." ) :
+                raise ValueError( "WHERE tag must be from SELECT category: %s" % (tag,) )
+            self._where.append( (tag, _predicate( cond[1], cond[2:] )) )
+
+        self._with = []
+        for cond in (with_ or []) :
+            if not cond[0].startswith( "_" ) :
+                raise ValueError( "WITH tag must be fully qualified: %s" % (cond[0],) )
+            self._with.append( (cond[0], _predicate( cond[1], cond[2:] )) )
+
+        self._categories = None
+        if categories is not None :
+            self._categories = frozenset( categories )
+
+    @property
+    def select( self ) :
+        """selected tags"""
+        return tuple( self._select )
+
+    #
+    #
+    def handler( self ) :
+        """returns new ``QueryHandler`` for this query"""
+        return QueryHandler( self )
+
+    def run( self, fp, parser = None, error_handler = None, verbose = False ) :
+        """
+        Parse ``fp`` with ``parser`` (``sas.SansParser`` by default) and return the list of
+        result tuples (one value per selected tag, ``None`` if missing)
+        """
+        if parser is None : parser = sas.SansParser
+        if error_handler is None : error_handler = sas.ErrorHandler()
+        h = self.handler()
+        lex = sas.StarLexer( fp, bufsize = 0, verbose = verbose )
+        parser.parse( lexer = lex, content_handler = h, error_handler = error_handler, verbose = verbose )
+        return h.results
+
+    def run_file( self, filename, parser = None, error_handler = None, verbose = False ) :
+        with open( filename, "rU" ) as f :
+            return self.run( f, parser, error_handler, verbose )
+
+# list of (tag, predicate) to dict of tag : [predicate, ...]
+#
+def _by_tag( conditions ) :
+    rc = {}
+    for (tag, pred) in conditions :
+        rc.setdefault( tag, [] ).append( pred )
+    return rc
+
+def _all( preds, val ) :
+    for pred in preds :
+        if not pred( val ) : return False
+    return True
+
+# wanted tags: query tags plus any saveframe category tag if needed
+#
+class _QueryTags( object ) :
+    def __init__( self, tags, categories ) :
+        self._tags = frozenset( tags )
+        self._categories = bool( categories )
+    def __contains__( self, tag ) :
+        if tag in self._tags : return True
+        return self._categories and tag.endswith( ".Sf_category" )
+
+#
+#
+class QueryHandler( sas.ContentHandler ) :
+    """
+    Streaming handler that runs a ``Query``.
+
+    Results are in ``results``: list of tuples of selected values. With ``SansParser``, WHERE
+    conditions are pushed down to the parser as row filters, so rejected rows are not assembled.
+    """
+
+    def __init__( self, query ) :
+        assert isinstance( query, Query )
+        self._q = query
+        self.results = []
+
+# tag : list of predicates, all must be true
+#
+        self._where = _by_tag( query._where )
+        self._with = _by_tag( query._with )
+
+        self.wanted_tags = _QueryTags( list( query._select ) + list( self._where.keys() ) \
+                + list( self._with.keys() ), query._categories )
+        self.row_filters = dict( (tag, self._filter( tag, preds )) for (tag, preds) in self._where.items() )
+
+        self._prefix = query._category + "."
+        self._pending = []
+        self._with_ok = set()
+        self._sf_ok = True
+        self._row = {}
+        self._inloop = False
+
+    # row filter for the parser: a rejected row is dropped right away,
+    # the parser won't send the rest of it.
+    # if the tag is already in the row, the row is the previous (complete) one
+    #
+    def _filter( self, tag, preds ) :
+        def f( val ) :
+            if tag in self._row :
+                self._flush()
+            if self._sf_ok and _all( preds, val ) :
+                return True
+            self._row = {}
+            return False
+        return f
+
+    # emit row if it passes
+    #
+    def _flush( self ) :
+        row = self._row
+        self._row = {}
+        if len( row ) < 1 : return
+        for (tag, preds) in self._where.items() :
+            if not _all( preds, row.get( tag ) ) :
+                return
+        self._pending.append( tuple( [row.get( tag ) for tag in self._q._select] ) )
+
+# SAS callbacks
+#
+    def startData( self, line, name ) :
+        self._pending = []
+        self._with_ok = set()
+        self._sf_ok = True
+        return False
+
+    def endData( self, line, name ) :
+        self._flush()
+        if len( self._with_ok ) == len( self._with ) :
+            self.results.extend( self._pending )
+        self._pending = []
+
+    def startSaveframe( self, line, name ) :
+        self._sf_ok = (self._q._categories is None)
+        return False
+    def endSaveframe( self, line, name ) :
+        self._flush()
+        return False
+    def startLoop( self, line ) :
+        self._flush()
+        self._inloop = True
+        return False
+    def endLoop( self, line ) :
+        self._flush()
+        self._inloop = False
+        return False
+    def comment( self, line, text ) :
+        return False
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        if (tag in self._with) and _all( self._with[tag], val ) :
+            self._with_ok.add( tag )
+
+        if (self._q._categories is not None) and tag.endswith( ".Sf_category" ) :
+            self._sf_ok = val in self._q._categories
+            return False
+
+        if not self._sf_ok : return False
+        if not tag.startswith( self._prefix ) : return False
+
+# next row starts when a tag repeats, free items: one row per saveframe
+#
+        if inloop and (tag in self._row) :
+            self._flush()
+        self._row[tag] = val
+        return False
+
+#
+#
+if __name__ == "__main__" :
+
+# self-check: pushed-down results match conditions applied to the whole loop afterwards
+#
+    if (len( sys.argv ) > 1) and (sys.argv[1] == "--check") :
+        from sas.extract import TagExtractor
+
+        filename = os.path.realpath( os.path.join( os.path.split( __file__ )[0], "../../testfiles/bmr15334_3.str" ) )
+        tags = ["_Atom_chem_shift.Atom_ID", "_Atom_chem_shift.Val"]
+        rows = []
+        for (name, loop) in TagExtractor.extract_file( filename, tags ).loops :
+            rows.extend( (r.get( tags[0] ), r.get( tags[1] )) for r in loop )
+        checks = (
+            ("SELECT _Atom_chem_shift.Val WHERE Atom_ID = 'CA'", lambda a, v : a == "CA"),
+            ("SELECT _Atom_chem_shift.Val WHERE Atom_ID = 'CA' AND Val >= 50 AND Val <= 55",
+                lambda a, v : (a == "CA") and (50 <= float( v ) <= 55)),
+            ("SELECT _Atom_chem_shift.Val WHERE Val BETWEEN 100 AND 200 AND Val < 120",
+                lambda a, v : 100 <= float( v ) < 120),
+            ("SELECT _Atom_chem_shift.Val WHERE Atom_ID = 'CA' WITH _Entity.ID >= 1 AND _Entity.ID <= 1",
+                lambda a, v : a == "CA"),
+            ("SELECT _Atom_chem_shift.Val WHERE Atom_ID = 'CA' WITH _Entity.ID >= 1 AND _Entity.ID > 1",
+                lambda a, v : False),
+        )
+        failed = 0
+        for (text, cond) in checks :
+            got = [r[0] for r in Query.compile( text ).run_file( filename )]
+            expected = [v for (a, v) in rows if cond( a, v )]
+            ok = (got == expected)
+            if not ok : failed += 1
+            sys.stdout.write( "%s %d rows: %s\n" % (ok and "OK  " or "FAIL", len( got ), text) )
+        sys.exit( failed > 0 and 1 or 0 )
+
+    if len( sys.argv ) < 2 :
+        sys.stderr.write( "usage: %s \"SELECT ...\" < input\n       %s --check\n" % (sys.argv[0], sys.argv[0]) )
+        sys.exit( 1 )
+
+    q = Query.compile( sys.argv[1] )
+    with sas.timer( "query" ) :
+        rows = q.run( sys.stdin )
+    for row in rows :
+        sys.stdout.write( "\t".join( str( v ) for v in row ) )
+        sys.stdout.write( "\n" )
@@ -0,0 +1,237 @@
+#!/usr/bin/python -u
+#
+# Bulk load NMR-STAR into sqlite3 database.
+#
+# One table per tag category, named after the category without leading underscore
+# ("_Atom_chem_shift.Val" goes into column "Val" of table "Atom_chem_shift"). Free items of
+# a saveframe make one row, loops make one row per loop row. All columns are TEXT, every table
+# also has "_entry" (data block name) and "_saveframe" (saveframe name) columns.
+#
+# Tables are created when first seen and new columns are added as needed. Rows are inserted with
+# ``executemany()`` in batches, the whole load is one transaction.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import sqlite3
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+ENTRY_COLUMN = "_entry"
+SAVEFRAME_COLUMN = "_saveframe"
+
+def _quote( name ) :
+    return '"%s"' % (name.replace( '"', '""' ),)
+
+# "_Entity.ID" -> ("Entity", "ID")
+#
+def _split( tag ) :
+    i = tag.find( "." )
+    if i < 0 : return (tag.lstrip( "_" ), tag.lstrip( "_" ))
+    return (tag[:i].lstrip( "_" ), tag[i + 1:])
+
+#
+#
+class SqliteLoader( sas.ContentHandler2 ) :
+    """
+    ``ContentHandler2`` that inserts everything into sqlite3 ``connection``.
+
+    ``batch`` is the number of rows per ``executemany()``. Call ``commit()`` when done.
+    """
+
+    #
+    #
+    @classmethod
+    def load( cls, filenames, dbfile, batch = 10000, error_handler = None, verbose = False ) :
+        """load NMR-STAR ``filenames`` into ``dbfile``, returns number of rows inserted"""
+        if error_handler is None : error_handler = sas.ErrorHandler()
+        conn = sqlite3.connect( dbfile )
+        try :
+            conn.execute( "pragma synchronous=off" )
+            conn.execute( "pragma journal_mode=memory" )
+            h = cls( conn, batch = batch )
+            for filename in filenames :
+                with open( filename, "rU" ) as f :
+                    lex = sas.StarLexer( f, bufsize = 0, verbose = verbose )
+                    sas.SansParser2.parse( lexer = lex, content_handler = h, error_handler = error_handler,
+                            verbose = verbose )
+            h.commit()
+            return h.rows
+        finally :
+            conn.close()
+
+    #
+    #
+    def __init__( self, connection, batch = 10000 ) :
+        self._conn = connection
+        self._conn.isolation_level = None
+        self._batch = int( batch )
+        self._intx = False
+
+        self._columns = {}
+        self._statements = {}
+        self._pending = {}
+        self.rows = 0
+
+        self._entry = None
+        self._saveframe = None
+        self._items = None
+        self._tag = None
+        self._tags = None
+        self._ncols = 0
+        self._row = None
+        self._loop_key = None
+
+    # tables and statements
+    #
+    def _table_columns( self, table ) :
+        """existing columns of ``table``, creates it if needed"""
+        cols = self._columns.get( table )
+        if cols is not None : return cols
+
+        cols = set( row[1] for row in self._conn.execute( "pragma table_info(%s)" % (_quote( table ),) ) )
+        if len( cols ) < 1 :
+            self._conn.execute( "create table %s (%s text,%s text)" \
+                % (_quote( table ), _quote( ENTRY_COLUMN ), _quote( SAVEFRAME_COLUMN )) )
+            cols = set( [ENTRY_COLUMN, SAVEFRAME_COLUMN] )
+        self._columns[table] = cols
+        return cols
+
+    def _statement( self, table, columns ) :
+        """insert statement for ``table`` and tuple of ``columns``, cached"""
+        key = (table, columns)
+        sql = self._statements.get( key )
+        if sql is not None : return key
+
+        existing = self._table_columns( table )
+        for col in columns :
+            if not col in existing :
+                self._conn.execute( "alter table %s add column %s text" % (_quote( table ), _quote( col )) )
+                existing.add( col )
+
+        sql = "insert into %s (%s,%s,%s) values (?,?%s)" % (_quote( table ), _quote( ENTRY_COLUMN ),
+            _quote( SAVEFRAME_COLUMN ), ",".join( _quote( c ) for c in columns ), ",?" * len( columns ))
+        self._statements[key] = sql
+        self._pending[key] = []
+        return key
+
+    def _add( self, key, row ) :
+        rows = self._pending[key]
+        rows.append( row )
+        if len( rows ) >= self._batch :
+            self._flush( key )
+
+    def _flush( self, key ) :
+        rows = self._pending[key]
+        if len( rows ) < 1 : return
+        self._conn.executemany( self._statements[key], rows )
+        self.rows += len( rows )
+        self._pending[key] = []
+
+    def flush( self ) :
+        """insert all pending rows"""
+        for key in self._pending.keys() :
+            self._flush( key )
+
+    def commit( self ) :
+        """insert pending rows and commit the transaction"""
+        self.flush()
+        if self._intx :
+            self._conn.execute( "commit" )
+            self._intx = False
+
+    # free items: one row per category per saveframe
+    #
+    def _flush_items( self ) :
+        if self._items is None : return
+        items = self._items
+        self._items = None
+        for (table, cols) in items.items() :
+            key = self._statement( table, tuple( c[0] for c in cols ) )
+            self._add( key, tuple( [self._entry, self._saveframe] + [c[1] for c in cols] ) )
+
+# SAS callbacks
+#
+    def startData( self, line, name ) :
+        if not self._intx :
+            self._conn.execute( "begin" )
+            self._intx = True
+        self._entry = name
+        self._saveframe = None
+        return False
+
+    def endData( self, line, name ) :
+        self._flush_items()
+        self.flush()
+
+    def startSaveframe( self, line, name ) :
+        self._saveframe = name
+        return False
+
+    def endSaveframe( self, line, name ) :
+        self._flush_items()
+        self._saveframe = None
+        return False
+
+    def startLoop( self, line ) :
+        self._tags = []
+        self._ncols = 0
+        self._row = None
+        return False
+
+    def endLoop( self, line ) :
+        if (self._row is not None) and (len( self._row ) > 2) :
+            self._row.extend( [None] * (self._ncols + 2 - len( self._row )) )
+            self._add( self._loop_key, tuple( self._row ) )
+        self._tags = None
+        self._row = None
+        return False
+
+    def comment( self, line, text ) :
+        return False
+
+    def tag( self, line, tag ) :
+        if self._tags is not None :
+            self._tags.append( tag )
+        else :
+            self._tag = tag
+        return False
+
+    def value( self, line, val, delim ) :
+        if self._tags is None :
+            (table, col) = _split( self._tag )
+            if self._items is None : self._items = {}
+            self._items.setdefault( table, [] ).append( (col, val) )
+            return False
+
+# first value: tags are all in
+#
+        if self._row is None :
+            table = _split( self._tags[0] )[0]
+            self._ncols = len( self._tags )
+            self._loop_key = self._statement( table, tuple( _split( t )[1] for t in self._tags ) )
+            self._row = [self._entry, self._saveframe]
+
+        self._row.append( val )
+        if len( self._row ) == self._ncols + 2 :
+            self._add( self._loop_key, tuple( self._row ) )
+            self._row = [self._entry, self._saveframe]
+        return False
+
+#
+#
+if __name__ == "__main__" :
+
+    if len( sys.argv ) < 3 :
+        sys.stderr.write( "usage: %s dbfile file [file ...]\n" % (sys.argv[0],) )
+        sys.exit( 1 )
+
+    import time
+    start = time.time()
+    rows = SqliteLoader.load( sys.argv[2:], sys.argv[1] )
+    secs = time.time() - start
+    sys.stdout.write( "%d rows in %0.3fs: %0.0f rows/s\n" % (rows, secs, rows / max( secs, 1e-6 )) )
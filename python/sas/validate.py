@@ -0,0 +1,475 @@
+#!/usr/bin/python -u
+#
+# Validate STAR files against DDL2 dictionary (mmcif_pdbx.dic, mmcif_nmr-star.dic, etc.)
+#
+# ``Dictionary.compile()`` parses the dictionary with ``DdlParser`` once and keeps lookup
+# tables: tag -> type, enumeration, mandatory flag; type -> regexp; category -> key and
+# mandatory tags. Tags and category names are matched case-insensitively.
+#
+# ``Dictionary.load()`` keeps a snapshot of the tables (marshal) next to the dictionary file
+# and reads that instead of parsing if it's newer than the dictionary. Regexps are compiled
+# when first used.
+#
+# ``Validator`` is a ``ContentHandler`` and ``ErrorHandler`` that checks values as they come
+# from the parser. Checks are built once per tag and remember values that already passed.
+# It collects ``(line, severity, message)`` tuples in ``messages``.
+#
+# Checked: unknown tags, values that don't match the type or aren't in the enumeration,
+# missing mandatory tags, duplicate keys in loops. Nulls ("." and "?") pass type checks.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import re
+import marshal
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+ERROR = "error"
+WARNING = "warning"
+NULLS = (".", "?")
+
+# up to this many distinct valid values per tag are remembered
+#
+CACHE_SIZE = 1024
+
+# snapshot file: header is magic, format version, dictionary file size and mtime
+#
+SNAPSHOT_MAGIC = "SASD"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_EXT = ".sasd"
+
+# "_Atom_site.Cartn_x" -> "_atom_site"
+#
+def _category( tag ) :
+    i = tag.find( "." )
+    if i < 0 : return tag
+    return tag[:i]
+
+#
+#
+class Item( object ) :
+    """dictionary definition of a tag"""
+
+    __slots__ = ("tag", "category", "type", "enum", "mandatory")
+
+    def __init__( self, tag, type = None, enum = None, mandatory = False ) :
+        self.tag = tag
+        self.category = _category( tag )
+        self.type = type
+        self.enum = enum
+        self.mandatory = mandatory
+
+#
+#
+class Dictionary( object ) :
+    """
+    Compiled DDL2 dictionary.
+
+    ``item( tag )`` returns ``Item``, ``regex( type )`` returns compiled regexp (``None`` if
+    there's none or it wouldn't compile). ``keys`` and ``mandatory``: lowercase category : list
+    of tags.
+
+    Use ``Dictionary.load( filename )`` to read it from snapshot when possible.
+    """
+
+    #
+    #
+    @classmethod
+    def compile( cls, fp, error_handler = None, verbose = False ) :
+        """parse DDL2 dictionary from ``fp``"""
+        if error_handler is None : error_handler = sas.ErrorHandler()
+        d = cls()
+        b = _DictBuilder( d )
+        lex = sas.StarLexer( fp, bufsize = 0, verbose = verbose )
+        sas.DdlParser.parse( lexer = lex, content_handler = b, error_handler = error_handler, verbose = verbose )
+        b.finish()
+        return d
+
+    @classmethod
+    def compile_file( cls, filename, error_handler = None, verbose = False ) :
+        with open( filename, "rU" ) as f :
+            return cls.compile( f, error_handler, verbose )
+
+    @classmethod
+    def load( cls, filename, snapshot = None, error_handler = None, verbose = False ) :
+        """
+        Read ``snapshot`` (``filename`` + ``.sasd`` by default) if it matches dictionary file's
+        size and mtime, otherwise compile ``filename`` and (try to) save the snapshot.
+        """
+        if snapshot is None : snapshot = filename + SNAPSHOT_EXT
+        st = os.stat( filename )
+        stamp = (SNAPSHOT_MAGIC, SNAPSHOT_VERSION, st.st_size, int( st.st_mtime ))
+        try :
+            with open( snapshot, "rb" ) as f :
+                if marshal.load( f ) == stamp :
+                    return cls._from_tables( marshal.load( f ) )
+        except (IOError, OSError, EOFError, ValueError, TypeError) :
+            pass
+
+        if error_handler is None : error_handler = sas.ErrorHandler()
+        eh = _ErrorCounter( error_handler )
+        d = cls.compile_file( filename, eh, verbose )
+        if eh.errors > 0 : return d
+
+        tmp = "%s.%d" % (snapshot, os.getpid())
+        try :
+            with open( tmp, "wb" ) as f :
+                marshal.dump( stamp, f )
+                marshal.dump( d._tables(), f )
+            os.rename( tmp, snapshot )
+        except (IOError, OSError) :
+            if os.path.exists( tmp ) : os.unlink( tmp )
+        return d
+
+    def __init__( self ) :
+        self._items = {}
+        self._constructs = {}
+        self._regex = {}
+        self.keys = {}
+        self.mandatory = {}
+
+    # raw tables: items are (tag, type, enum, mandatory) tuples
+    #
+    def _tables( self ) :
+        return (self._items, self._constructs, self.keys, self.mandatory)
+
+    @classmethod
+    def _from_tables( cls, tables ) :
+        d = cls()
+        (d._items, d._constructs, d.keys, d.mandatory) = tables
+        return d
+
+    def __len__( self ) :
+        return len( self._items )
+
+    def __contains__( self, tag ) :
+        return tag.lower() in self._items
+
+    @property
+    def types( self ) :
+        """type codes"""
+        return self._constructs.keys()
+
+    def item( self, tag ) :
+        """``Item`` for ``tag`` or ``None``"""
+        rc = self._items.get( tag.lower() )
+        if rc is None : return None
+        return Item( *rc )
+
+    def regex( self, code ) :
+        """compiled regexp for type ``code``"""
+        if code is None : return None
+        code = code.lower()
+        if code in self._regex : return self._regex[code]
+        rc = None
+        construct = self._constructs.get( code )
+        if construct is not None :
+            try :
+                rc = re.compile( r"(?:%s)\Z" % (construct,) )
+            except re.error :
+                pass
+        self._regex[code] = rc
+        return rc
+
+# don't save snapshot of a dictionary with errors
+#
+class _ErrorCounter( sas.ErrorHandler ) :
+    def __init__( self, error_handler ) :
+        self._eh = error_handler
+        self.errors = 0
+    def fatalError( self, line, msg ) :
+        self.errors += 1
+        self._eh.fatalError( line, msg )
+    def error( self, line, msg ) :
+        self.errors += 1
+        return self._eh.error( line, msg )
+    def warning( self, line, msg ) :
+        return self._eh.warning( line, msg )
+
+#
+# dictionary is a list of saveframes, one per category or item (or several items sharing
+# a definition), plus item type list in a data block-level loop
+#
+class _DictBuilder( sas.ContentHandler ) :
+
+    def __init__( self, dictionary ) :
+        self._d = dictionary
+        self._items = {}
+        self._frame = None
+        self._types = None
+
+    # items into tables, mandatory tags into categories
+    #
+    def finish( self ) :
+        for (key, item) in self._items.items() :
+            self._d._items[key] = (item.tag, item.type, item.enum, item.mandatory)
+            if item.mandatory :
+                self._d.mandatory.setdefault( item.category.lower(), [] ).append( item.tag )
+
+    def startData( self, line, name ) :
+        return False
+    def endData( self, line, name ) :
+        return False
+    def startLoop( self, line ) :
+        return False
+    def endLoop( self, line ) :
+        return False
+    def comment( self, line, text ) :
+        return False
+
+    def startSaveframe( self, line, name ) :
+        self._frame = {}
+        return False
+
+    def endSaveframe( self, line, name ) :
+        frame = self._frame
+        self._frame = None
+        if frame is None : return False
+
+        if "_category.id" in frame :
+            cat = "_" + frame["_category.id"][0]
+            keys = frame.get( "_category_key.name" )
+            if keys is not None :
+                self._d.keys[cat.lower()] = list( keys )
+
+        names = frame.get( "_item.name" )
+        if names is not None :
+            codes = frame.get( "_item.mandatory_code", [] )
+            types = frame.get( "_item_type.code" )
+            enum = frame.get( "_item_enumeration.value" )
+            for (i, name) in enumerate( names ) :
+                item = self._items.get( name.lower() )
+                if item is None :
+                    item = Item( name )
+                    self._items[name.lower()] = item
+                if i < len( codes ) :
+                    item.mandatory = (codes[i].lower() == "yes")
+                if types is not None : item.type = types[0]
+                if enum is not None : item.enum = frozenset( enum )
+        return False
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        tag = tag.lower()
+        if self._frame is not None :
+            self._frame.setdefault( tag, [] ).append( val )
+            return False
+
+# type list is a loop in the data block
+#
+        if tag == "_item_type_list.code" :
+            self._types = val
+        elif (tag == "_item_type_list.construct") and (self._types is not None) :
+            self._d._constructs[self._types.lower()] = val
+            self._types = None
+        return False
+
+#
+#
+class Validator( sas.ContentHandler, sas.ErrorHandler ) :
+    """
+    Check values from the parser against ``dictionary``, collect ``(line, severity, message)``
+    in ``messages``. Parser errors are collected there too.
+    """
+
+    #
+    #
+    @classmethod
+    def validate( cls, fp, dictionary, parser = None, verbose = False ) :
+        """parse ``fp`` with ``parser`` (``SansParser`` by default), returns list of messages"""
+        if parser is None : parser = sas.SansParser
+        v = cls( dictionary )
+        lex = sas.StarLexer( fp, bufsize = 0, verbose = verbose )
+        parser.parse( lexer = lex, content_handler = v, error_handler = v, verbose = verbose )
+        return v.messages
+
+    @classmethod
+    def validate_file( cls, filename, dictionary, parser = None, verbose = False ) :
+        with open( filename, "rU" ) as f :
+            return cls.validate( f, dictionary, parser, verbose )
+
+    #
+    #
+    def __init__( self, dictionary ) :
+        assert isinstance( dictionary, Dictionary )
+        self._d = dictionary
+        self.messages = []
+        self._checks = {}
+
+        self._free = {}
+        self._loop = None
+        self._first = None
+        self._first_row = True
+        self._tags = None
+        self._row = None
+        self._row_line = -1
+        self._keys = None
+        self._keyset = None
+
+    @property
+    def errors( self ) :
+        return [m for m in self.messages if m[1] == ERROR]
+
+    def _msg( self, line, severity, msg ) :
+        self.messages.append( (line, severity, msg) )
+
+# error handler: collect, keep going on warnings
+#
+    def fatalError( self, line, msg ) :
+        self._msg( line, ERROR, msg )
+    def error( self, line, msg ) :
+        self._msg( line, ERROR, msg )
+        return True
+    def warning( self, line, msg ) :
+        self._msg( line, WARNING, msg )
+        return False
+
+    # value check for ``tag``: callable( line, value ), built on first sight
+    #
+    def _check( self, tag ) :
+        item = self._d.item( tag )
+        if item is None :
+            reported = [False]
+            def unknown( line, val ) :
+                if not reported[0] :
+                    self._msg( line, ERROR, "unknown tag %s" % (tag,) )
+                    reported[0] = True
+            return unknown
+
+        regex = self._d.regex( item.type )
+        enum = item.enum
+        if (regex is None) and (enum is None) :
+            return lambda line, val : None
+
+        passed = set( NULLS )
+        def check( line, val ) :
+            if val in passed : return
+            if (regex is not None) and (not regex.match( val )) :
+                self._msg( line, ERROR, "invalid %s value for %s: %s" % (item.type, tag, val) )
+                return
+            if (enum is not None) and (not val in enum) :
+                self._msg( line, ERROR, "value not in enumeration for %s: %s" % (tag, val) )
+                return
+            if len( passed ) < CACHE_SIZE :
+                passed.add( val )
+        return check
+
+    # mandatory tags of ``category`` missing from ``tags``
+    #
+    def _check_mandatory( self, line, category, tags ) :
+        mandatory = self._d.mandatory.get( category.lower() )
+        if mandatory is None : return
+        have = set( t.lower() for t in tags )
+        for tag in mandatory :
+            if not tag.lower() in have :
+                self._msg( line, ERROR, "missing mandatory tag %s" % (tag,) )
+
+    def _check_free( self, line ) :
+        for (category, tags) in self._free.items() :
+            self._check_mandatory( line, category, tags )
+        self._free = {}
+
+    # loop row complete: check key
+    #
+    def _end_row( self ) :
+        if (self._keys is not None) and (len( self._row ) > 0) :
+            key = tuple( self._row.get( k ) for k in self._keys )
+            if key in self._keyset :
+                self._msg( self._row_line, ERROR, "duplicate key in %s: %s" % (self._loop, ", ".join( str( k ) for k in key )) )
+            else :
+                self._keyset.add( key )
+        self._row = {}
+
+# SAS callbacks
+#
+    def startData( self, line, name ) :
+        self._free = {}
+        return False
+    def endData( self, line, name ) :
+        self._check_free( line )
+    def startSaveframe( self, line, name ) :
+        self._free = {}
+        return False
+    def endSaveframe( self, line, name ) :
+        self._check_free( line )
+        return False
+    def comment( self, line, text ) :
+        return False
+
+    def startLoop( self, line ) :
+        self._loop = None
+        self._first = None
+        self._first_row = True
+        self._tags = []
+        self._row = {}
+        self._keys = None
+        self._keyset = None
+        return False
+
+    def endLoop( self, line ) :
+        if self._loop is not None :
+            self._end_row()
+            self._check_mandatory( line, self._loop, self._tags )
+        self._loop = None
+        self._keyset = None
+        return False
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        check = self._checks.get( tag )
+        if check is None :
+            check = self._check( tag )
+            self._checks[tag] = check
+        check( valline, val )
+
+        if not inloop :
+            self._free.setdefault( _category( tag ), [] ).append( tag )
+            return False
+
+# loop: tags are collected from the first row, first tag starts a row
+#
+        if self._first is None :
+            self._first = tag
+            self._row_line = valline
+            self._tags.append( tag )
+            self._loop = _category( tag )
+            keys = self._d.keys.get( self._loop.lower() )
+            if keys is not None :
+                self._keys = [k.lower() for k in keys]
+                self._keyset = set()
+        elif tag == self._first :
+            self._end_row()
+            self._row_line = valline
+            self._first_row = False
+        elif self._first_row :
+            self._tags.append( tag )
+
+        if self._keys is not None :
+            self._row[tag.lower()] = val
+        return False
+
+#
+#
+if __name__ == "__main__" :
+
+    if len( sys.argv ) < 3 :
+        sys.stderr.write( "usage: %s [-c] dictionary file [file ...]\n" % (sys.argv[0],) )
+        sys.exit( 1 )
+
+    args = sys.argv[1:]
+    parser = sas.SansParser
+    if args[0] == "-c" :
+        parser = sas.CifParser
+        args = args[1:]
+
+    with sas.timer( "load" ) :
+        d = Dictionary.load( args[0] )
+    sys.stdout.write( "%d items, %d types, %d categories with keys\n" % (len( d ), len( d.types ), len( d.keys )) )
+    for filename in args[1:] :
+        with sas.timer( filename ) :
+            msgs = Validator.validate_file( filename, d, parser = parser )
+        for (line, severity, msg) in msgs :
+            sys.stdout.write( "%s:%s: %s: %s\n" % (filename, line, severity, msg) )
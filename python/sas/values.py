@@ -0,0 +1,342 @@
+#!/usr/bin/python -u
+#
+# Assembly of delimited (quoted and multi-line) values.
+#
+# ``ValueBuffer`` collects the pieces the lexer returns in a list. If ``threshold`` is set
+# and the value grows past it, the pieces are written to a temporary file and the value is
+# returned as a ``SpilledValue`` instead of a string, so memory use stays bounded for huge
+# semicolon or triple-quoted values.
+#
+# With ``lazy`` set, a value of more than one piece is returned as ``LazyValue``: the pieces
+# are kept and only joined when the value is used as a string, so handlers that look at few
+# values (or only compare them) don't pay for joining the rest. (The lexer already returns each
+# piece as a separate string: there is no copy to save for single-piece values.)
+#
+# ``ColumnIntern`` is a per-column cache that makes repeated loop values share one string.
+#
+# ``INAPPLICABLE`` and ``UNKNOWN`` are the STAR nulls, unquoted ``.`` and ``?``: ``Null``
+# singletons that compare equal to those strings, so a null test is ``val is UNKNOWN``
+# or ``is_null( val )`` while code that compares with ``"."``/``"?"`` keeps working.
+# Quoted ``'.'`` and ``'?'`` are still plain strings.
+#
+# Parsers take the threshold from the content handler's ``spill_threshold``, the lazy flag
+# from its ``lazy_values``, intern cache size from its ``intern_values``, and whether to pass
+# nulls as ``Null`` from its ``null_values``: handlers that don't set them always get plain strings.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import tempfile
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+# once spilled, pieces are written out in chunks of about this size
+#
+SPILL_CHUNK = 65536
+
+#
+#
+class SpilledValue( object ) :
+    """
+    Value kept in a temporary file. It is file-like: ``read()``, ``seek()``, ``tell()``, and
+    iteration over lines (from the start). ``len()`` is its size and ``str()`` reads it all.
+    The file is deleted by ``close()`` or when the object is garbage-collected.
+    """
+
+    def __init__( self, fp, size ) :
+        self._fp = fp
+        self._size = size
+        self._fp.seek( 0 )
+
+    def __len__( self ) :
+        return self._size
+
+    def read( self, size = -1 ) :
+        return self._fp.read( size )
+
+    def seek( self, pos, whence = 0 ) :
+        self._fp.seek( pos, whence )
+
+    def tell( self ) :
+        return self._fp.tell()
+
+    def __iter__( self ) :
+        self._fp.seek( 0 )
+        return iter( self._fp )
+
+    def __str__( self ) :
+        self._fp.seek( 0 )
+        return self._fp.read()
+
+    def __eq__( self, other ) :
+        if isinstance( other, SpilledValue ) : other = str( other )
+        if not isinstance( other, basestring ) : return NotImplemented
+        if len( other ) != self._size : return False
+        return str( self ) == other
+
+    def __ne__( self, other ) :
+        rc = self.__eq__( other )
+        if rc is NotImplemented : return rc
+        return not rc
+
+    def close( self ) :
+        self._fp.close()
+
+#
+#
+class LazyValue( object ) :
+    """
+    Value made of pieces, joined on first use as a string (``str()``, or any ``str`` method).
+    ``len()``, ``==``, and ``startswith()`` work on the pieces without joining them.
+    """
+
+    __slots__ = ("_parts", "_size", "_str")
+
+    def __init__( self, parts, size ) :
+        self._parts = parts
+        self._size = size
+        self._str = None
+
+    def __len__( self ) :
+        return self._size
+
+    def __str__( self ) :
+        if self._str is None :
+            self._str = "".join( self._parts )
+            self._parts = None
+        return self._str
+
+    def __repr__( self ) :
+        return repr( str( self ) )
+
+    def __hash__( self ) :
+        return hash( str( self ) )
+
+    def __eq__( self, other ) :
+        if isinstance( other, LazyValue ) : other = str( other )
+        if not isinstance( other, basestring ) : return NotImplemented
+        if len( other ) != self._size : return False
+        if self._str is not None : return self._str == other
+        pos = 0
+        for part in self._parts :
+            if not other.startswith( part, pos ) : return False
+            pos += len( part )
+        return True
+
+    def __ne__( self, other ) :
+        rc = self.__eq__( other )
+        if rc is NotImplemented : return rc
+        return not rc
+
+    def startswith( self, prefix ) :
+        if self._str is not None : return self._str.startswith( prefix )
+        if not isinstance( prefix, basestring ) : return str( self ).startswith( prefix )
+        if len( prefix ) > self._size : return False
+        pos = 0
+        for part in self._parts :
+            if pos >= len( prefix ) : return True
+            n = min( len( part ), len( prefix ) - pos )
+            if not prefix.startswith( part[:n], pos ) : return False
+            pos += n
+        return pos >= len( prefix )
+
+# everything else: as a string
+#
+    def __getattr__( self, name ) :
+        return getattr( str( self ), name )
+
+    def __getitem__( self, idx ) :
+        return str( self )[idx]
+
+    def __add__( self, other ) :
+        return str( self ) + other
+
+    def __radd__( self, other ) :
+        return other + str( self )
+
+#
+#
+class ValueBuffer( object ) :
+    """
+    Pieces of a value being read: ``append()`` them, then ``value()`` returns a string or,
+    if it's over ``threshold`` characters (and ``threshold`` is not ``None``), a ``SpilledValue``.
+    With ``lazy`` a value of two or more pieces is returned as ``LazyValue``.
+    """
+
+    __slots__ = ("_parts", "_pending", "_size", "_threshold", "_file", "_lazy")
+
+    def __init__( self, threshold = None, lazy = False ) :
+        self._parts = []
+        self._pending = 0
+        self._size = 0
+        self._threshold = threshold
+        self._file = None
+        self._lazy = lazy
+
+    def __len__( self ) :
+        return self._size
+
+    def append( self, piece ) :
+        self._parts.append( piece )
+        self._size += len( piece )
+        if self._threshold is None : return
+        self._pending += len( piece )
+        if self._file is None :
+            if self._size > self._threshold :
+                self._file = tempfile.TemporaryFile()
+                self._flush()
+        elif self._pending > SPILL_CHUNK :
+            self._flush()
+
+    def _flush( self ) :
+        self._file.write( "".join( self._parts ) )
+        self._parts = []
+        self._pending = 0
+
+    def rstrip_newlines( self ) :
+        """remove trailing newlines, like ``str.rstrip( "\\n" )``"""
+        while len( self._parts ) > 0 :
+            last = self._parts[-1].rstrip( "\n" )
+            self._size -= len( self._parts[-1] ) - len( last )
+            if self._file is not None : self._pending -= len( self._parts[-1] ) - len( last )
+            if last != "" :
+                self._parts[-1] = last
+                return
+            self._parts.pop()
+
+# all pending pieces were newlines: strip the file
+#
+        if self._file is None : return
+        pos = self._file.tell()
+        while pos > 0 :
+            self._file.seek( pos - 1 )
+            if self._file.read( 1 ) != "\n" : break
+            pos -= 1
+        self._file.seek( pos )
+        self._file.truncate()
+        self._size = pos
+
+    def value( self ) :
+        """string, ``LazyValue``, or ``SpilledValue``"""
+        if self._file is None :
+            if len( self._parts ) == 1 : return self._parts[0]
+            if self._lazy and (len( self._parts ) > 1) : return LazyValue( self._parts, self._size )
+            return "".join( self._parts )
+        self._flush()
+        self._file.flush()
+        return SpilledValue( self._file, self._size )
+
+    def __str__( self ) :
+        return str( self.value() )
+
+#
+# nulls
+#
+class Null( str ) :
+    """
+    Unquoted ``.`` (``INAPPLICABLE``) or ``?`` (``UNKNOWN``). There are only these two
+    instances: test with ``is`` or ``is_null()``.
+    """
+
+    __slots__ = ()
+
+    def __repr__( self ) :
+        if self == "." : return "INAPPLICABLE"
+        return "UNKNOWN"
+
+INAPPLICABLE = Null( "." )
+UNKNOWN = Null( "?" )
+
+# unquoted value : null, for parsers
+#
+NULL_VALUES = { "." : INAPPLICABLE, "?" : UNKNOWN }
+
+def is_null( val ) :
+    """true if ``val`` is ``INAPPLICABLE`` or ``UNKNOWN`` (not for quoted ``'.'``, ``'?'``)"""
+    return val.__class__ is Null
+
+#
+# interning of loop values
+#
+class ColumnIntern( object ) :
+    """
+    Bounded cache for one loop column: ``intern( val )`` returns the first seen string equal
+    to ``val``, so repeated values in the column share one object. When the cache fills up
+    it is emptied if most lookups were hits, or else (mostly distinct values, e.g. coordinates)
+    dropped for good and values are passed through.
+    """
+
+    __slots__ = ("_cache", "_size", "_hits", "_misses")
+
+    def __init__( self, size = 1024 ) :
+        self._cache = {}
+        self._size = size
+        self._hits = 0
+        self._misses = 0
+
+    def __call__( self, val ) :
+        cache = self._cache
+        if cache is None : return val
+        rc = cache.get( val )
+        if rc is not None :
+            self._hits += 1
+            return rc
+        self._misses += 1
+        if len( cache ) >= self._size :
+            if self._hits < self._misses :
+                self._cache = None
+                return val
+            cache.clear()
+            self._hits = 0
+            self._misses = 0
+        cache[val] = val
+        return val
+
+    @property
+    def active( self ) :
+        """``False`` once the column was given up on"""
+        return self._cache is not None
+
+#
+#
+if __name__ == "__main__" :
+
+# compare peak memory of reading a file with large values, with and without spilling
+#
+    import resource
+
+    class H( sas.ContentHandler ) :
+        def __init__( self, threshold ) :
+            self.spill_threshold = threshold
+            self.largest = 0
+        def startData( self, line, name ) :
+            return False
+        def endData( self, line, name ) :
+            pass
+        def startSaveframe( self, line, name ) :
+            return False
+        def endSaveframe( self, line, name ) :
+            return False
+        def startLoop( self, line ) :
+            return False
+        def endLoop( self, line ) :
+            return False
+        def comment( self, line, text ) :
+            return False
+        def data( self, tag, tagline, val, valline, delim, inloop ) :
+            self.largest = max( self.largest, len( val ) )
+            return False
+
+    threshold = None
+    if len( sys.argv ) > 2 : threshold = int( sys.argv[2] )
+    h = H( threshold )
+    with sas.timer( "spill threshold %s" % (threshold,) ) :
+        with open( sys.argv[1], "rU" ) as f :
+            sas.SansParser.parse( lexer = sas.StarLexer( f, bufsize = 0 ), content_handler = h,
+                error_handler = sas.ErrorHandler() )
+    sys.stdout.write( "largest value %d, peak RSS %d KB\n"
+        % (h.largest, resource.getrusage( resource.RUSAGE_SELF ).ru_maxrss) )
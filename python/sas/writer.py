@@ -0,0 +1,367 @@
+#!/usr/bin/python -u
+#
+# Streaming STAR writer.
+#
+# ``StarWriter`` methods mirror ``ContentHandler`` callbacks: startData/endData,
+# startSaveframe/endSaveframe, item (free tag/value), startLoop( tags )/row( values )/endLoop,
+# and comment. Output is collected in a buffer and written out in large chunks.
+#
+# Quoting is picked per value: bareword if possible, then single quotes, double quotes,
+# and semicolon-delimited text block for values with newlines (or both kinds of quotes).
+# A "." or "?" that was quoted in the input (``delim`` is not ``None``) is written quoted,
+# a bare one would read back as a null.
+#
+# Loop rows are buffered in batches, column widths are computed once per batch.
+#
+# ``WriterHandler`` is a ``ContentHandler`` that passes parser callbacks on to a writer.
+#
+
+from __future__ import absolute_import
+
+import sys
+import os
+import re
+
+_UP = os.path.join( os.path.split( __file__ )[0], ".." )
+sys.path.append( os.path.realpath( _UP ) )
+import sas
+
+# value needs quoting: whitespace, or starts with a character that means something else,
+# or with a STAR keyword
+#
+_NEEDS_QUOTES = re.compile( r"\s|^['\"_#$;\[\]]|^(?:data_|save_|loop_|stop_|global_)", re.IGNORECASE )
+
+# closing quote digraphs
+#
+_SINGLE_END = re.compile( r"'\s" )
+_DOUBLE_END = re.compile( r'"\s' )
+
+# values that are nulls when not quoted
+#
+_NULLS = (".", "?")
+
+#
+#
+def quote( val, delim = None ) :
+    """
+    returns ``val`` formatted as a STAR value, ``delim`` is as passed to ``data()``:
+    if not ``None``, a "." or "?" is quoted to keep it from becoming a null
+    """
+    if len( val ) < 1 : return "''"
+    if (delim is not None) and (val in _NULLS) : return "'%s'" % (val,)
+    if not _NEEDS_QUOTES.search( val ) : return val
+    if val.find( "\n" ) < 0 :
+        if not (_SINGLE_END.search( val ) or val.endswith( "'" )) :
+            return "'%s'" % (val,)
+        if not (_DOUBLE_END.search( val ) or val.endswith( '"' )) :
+            return '"%s"' % (val,)
+    return "\n;%s\n;\n" % (val,)
+
+#
+#
+class StarWriter( object ) :
+    """
+    Write STAR to ``out`` (a file or anything with ``write()``).
+
+    ``mmcif``: no indentation and no ``stop_`` after loops.
+    ``bufsize``: output is written in chunks of about this size.
+    ``batch``: number of loop rows buffered for column width calculation.
+    ``tag_width``: free tags are padded to this width.
+    """
+
+    def __init__( self, out, mmcif = False, bufsize = 1048576, batch = 1000, tag_width = 40 ) :
+        self._out = out
+        self._mmcif = bool( mmcif )
+        self._bufsize = int( bufsize )
+        self._batch = int( batch )
+        self._tag_width = int( tag_width )
+
+        self._buf = []
+        self._size = 0
+        self._rows = []
+        self._written = 0
+
+        if self._mmcif :
+            self._indent = ""
+            self._loop_indent = ""
+        else :
+            self._indent = "   "
+            self._loop_indent = "      "
+
+    @property
+    def written( self ) :
+        """number of characters written so far"""
+        return self._written + self._size
+
+    #
+    #
+    def _write( self, s ) :
+        self._buf.append( s )
+        self._size += len( s )
+        if self._size >= self._bufsize :
+            self._flush_buf()
+
+    def _flush_buf( self ) :
+        if len( self._buf ) > 0 :
+            self._out.write( "".join( self._buf ) )
+        self._written += self._size
+        self._buf = []
+        self._size = 0
+
+    def flush( self ) :
+        """write out everything buffered so far"""
+        self._flush_rows()
+        self._flush_buf()
+        if hasattr( self._out, "flush" ) :
+            self._out.flush()
+
+    #
+    #
+    def comment( self, text ) :
+        self._flush_rows()
+        for line in text.split( "\n" ) :
+            self._write( "#%s\n" % (line,) )
+
+    def startData( self, name ) :
+        self._write( "data_%s\n\n" % (name,) )
+
+    def endData( self, name = None ) :
+        self.flush()
+
+    def startSaveframe( self, name ) :
+        self._write( "save_%s\n" % (name,) )
+
+    def endSaveframe( self, name = None ) :
+        self._write( "save_\n\n" )
+
+    def item( self, tag, val, delim = None ) :
+        """free tag/value; ``delim`` ``"$"`` writes a framecode value"""
+        if delim == "$" : val = "$" + val
+        else : val = quote( val, delim )
+        if val.startswith( "\n" ) :
+            self._write( "%s%s%s" % (self._indent, tag, val) )
+        else :
+            self._write( "%s%-*s %s\n" % (self._indent, self._tag_width, tag, val) )
+
+    def startLoop( self, tags ) :
+        self._write( "\n%sloop_\n" % (self._indent,) )
+        for tag in tags :
+            self._write( "%s%s\n" % (self._loop_indent, tag) )
+        self._write( "\n" )
+        self._ncols = len( tags )
+
+    def row( self, values, delims = None ) :
+        """one loop row, ``delims`` (if not ``None``) are value delimiters as passed to ``data()``"""
+        if delims is None :
+            self._rows.append( [quote( v ) for v in values] )
+        else :
+            self._rows.append( [((d == "$") and ("$" + v) or quote( v, d )) for (v, d) in zip( values, delims )] )
+        if len( self._rows ) >= self._batch :
+            self._flush_rows()
+
+    def rows( self, rows ) :
+        """iterable of rows"""
+        for r in rows :
+            self.row( r )
+
+    def endLoop( self ) :
+        self._flush_rows()
+        if self._mmcif : self._write( "\n" )
+        else : self._write( "%sstop_\n\n" % (self._indent,) )
+
+    # write out buffered rows: widths of single-line values per column, then rows
+    #
+    def _flush_rows( self ) :
+        if len( self._rows ) < 1 : return
+
+        widths = [0] * self._ncols
+        for r in self._rows :
+            for (i, v) in enumerate( r ) :
+                if (len( v ) > widths[i]) and (not v.startswith( "\n" )) :
+                    widths[i] = len( v )
+
+        fmt = ["%%-%ds" % (w,) for w in widths]
+        fmt[-1] = "%s"
+        out = []
+        for r in self._rows :
+            line = [self._loop_indent]
+            for (i, v) in enumerate( r ) :
+                if v.startswith( "\n" ) :
+                    line.append( v )
+                    line.append( self._loop_indent )
+                else :
+                    line.append( fmt[i] % (v,) )
+                    line.append( " " )
+            line[-1] = "\n"
+            out.append( "".join( line ) )
+        self._rows = []
+        self._write( "".join( out ) )
+
+#
+#
+class WriterHandler( sas.ContentHandler ) :
+    """
+    Pass ``ContentHandler`` callbacks to ``StarWriter``.
+
+    Loop tags are collected from the first row, so ``startLoop()`` is written when the first
+    row is complete.
+    """
+
+    def __init__( self, writer ) :
+        assert isinstance( writer, StarWriter )
+        self._w = writer
+        self._tags = None
+        self._row = None
+        self._delims = None
+        self._ncols = 0
+        self._delimited = False
+
+    def startData( self, line, name ) :
+        self._w.startData( name )
+        return False
+    def endData( self, line, name ) :
+        self._w.endData( name )
+    def startSaveframe( self, line, name ) :
+        self._w.startSaveframe( name )
+        return False
+    def endSaveframe( self, line, name ) :
+        self._w.endSaveframe( name )
+        return False
+    def startLoop( self, line ) :
+        self._tags = []
+        self._row = []
+        self._delims = []
+        self._ncols = 0
+        self._delimited = False
+        return False
+
+    def endLoop( self, line ) :
+
+# all rows (or tags) filtered out: no loop
+#
+        if len( self._tags ) < 1 :
+            self._tags = None
+            return False
+        if self._ncols == 0 :
+            self._ncols = len( self._tags )
+            self._w.startLoop( self._tags )
+        if len( self._row ) > 0 :
+            self._w.row( self._row + [""] * (self._ncols - len( self._row )), self._delims_or_none() )
+        self._w.endLoop()
+        self._tags = None
+        return False
+
+    def comment( self, line, text ) :
+        self._w.comment( text )
+        return False
+
+    # delimiters are only needed for framecodes and quoted nulls
+    #
+    def _delims_or_none( self ) :
+        if self._delimited : return self._delims
+        return None
+
+    def data( self, tag, tagline, val, valline, delim, inloop ) :
+        if not inloop :
+            self._w.item( tag, val, delim )
+            return False
+
+# first row: collect tags until the first one repeats
+#
+        if self._ncols == 0 :
+            if (len( self._tags ) < 1) or (tag != self._tags[0]) :
+                self._tags.append( tag )
+                self._row.append( val )
+                self._delims.append( delim )
+                if (delim is not None) and ((delim == "$") or (val in _NULLS)) : self._delimited = True
+                return False
+            self._ncols = len( self._tags )
+            self._w.startLoop( self._tags )
+            self._w.row( self._row, self._delims_or_none() )
+            self._row = []
+            self._delims = []
+
+        self._row.append( val )
+        self._delims.append( delim )
+        if (delim is not None) and ((delim == "$") or (val in _NULLS)) : self._delimited = True
+        if len( self._row ) == self._ncols :
+            self._w.row( self._row, self._delims_or_none() )
+            self._row = []
+            self._delims = []
+        return False
+
+#
+#
+if __name__ == "__main__" :
+
+# round trip benchmark: parse and record callbacks, time writing them out,
+# then re-parse the output and compare
+#
+    import time
+    import tempfile
+
+# writer may pick different quotes, what must survive is framecode, null, or value
+#
+    def kind( val, delim ) :
+        if delim == "$" : return "framecode"
+        if (delim is None) and (val in _NULLS) : return "null"
+        return "value"
+
+    class Recorder( sas.ContentHandler ) :
+        def __init__( self ) :
+            self.events = []
+            self.items = []
+        def startData( self, line, name ) :
+            self.events.append( ("startData", (line, name)) )
+            return False
+        def endData( self, line, name ) :
+            self.events.append( ("endData", (line, name)) )
+        def startSaveframe( self, line, name ) :
+            self.events.append( ("startSaveframe", (line, name)) )
+            return False
+        def endSaveframe( self, line, name ) :
+            self.events.append( ("endSaveframe", (line, name)) )
+            return False
+        def startLoop( self, line ) :
+            self.events.append( ("startLoop", (line,)) )
+            return False
+        def endLoop( self, line ) :
+            self.events.append( ("endLoop", (line,)) )
+            return False
+        def comment( self, line, text ) :
+            self.events.append( ("comment", (line, text)) )
+            return False
+        def data( self, tag, tagline, val, valline, delim, inloop ) :
+            self.events.append( ("data", (tag, tagline, val, valline, delim, inloop)) )
+            self.items.append( (tag, val, kind( val, delim ), inloop) )
+            return False
+
+    def parse( parser, filename ) :
+        ch = Recorder()
+        start = time.time()
+        with open( filename, "rU" ) as f :
+            parser.parse( lexer = sas.StarLexer( f, bufsize = 0 ), content_handler = ch, error_handler = sas.ErrorHandler() )
+        return (ch, time.time() - start)
+
+    for filename in sys.argv[1:] :
+        mmcif = filename.endswith( ".cif" )
+        parser = mmcif and sas.CifParser or sas.SansParser
+        size = os.path.getsize( filename )
+        (ch, parse_time) = parse( parser, filename )
+
+        (fd, outname) = tempfile.mkstemp()
+        with os.fdopen( fd, "wb" ) as out :
+            w = StarWriter( out, mmcif = mmcif )
+            h = WriterHandler( w )
+            start = time.time()
+            for (name, args) in ch.events :
+                getattr( h, name )( *args )
+            w.flush()
+            write_time = max( time.time() - start, 1e-6 )
+
+        (ch2, t) = parse( parser, outname )
+        os.unlink( outname )
+
+        sys.stdout.write( "%s: parse %0.2f MB/s, write %0.2f MB/s, round trip %s\n" % (filename,
+            size / parse_time / 1048576.0, w.written / write_time / 1048576.0,
+            (ch.items == ch2.items) and "OK" or "DIFFERENT") )
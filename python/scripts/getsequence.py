@@ -29,6 +29,15 @@ _UP = os.path.realpath( os.path.join( os.path.split( __file__ )[0], ".." ) )
 sys.path.append( _UP )
 import sas
 
+# null values: unquoted "." and "?" come as sas.Null (StarParser sets null_values),
+# quoted or semicolon-delimited ones as strings that may have whitespace around them
+#
+NULLS = ("", ".", "?")
+
+def is_null( val ) :
+    if sas.is_null( val ) : return True
+    return val.strip() in NULLS
+
 #
 #
 #
@@ -153,7 +162,7 @@ class Getsequence( object ) :
 #ERR: null molecule type
                 logging.error( "%s: NULL molecule type in entity %s" % (bmrbid,eid,) )
                 continue
-            if data[eid]["type"] in (".","?") : 
+            if is_null( data[eid]["type"] ) : 
 #ERR: ditto
                 logging.error( "%s: molecule type is ./? in entity %s" % (bmrbid,eid,) )
                 continue
@@ -194,7 +203,7 @@ class Getsequence( object ) :
             name = ""
             if "name" in data[eid].keys() :
                 if data[eid]["name"] is not None :
-                    if not data[eid]["name"] in (".","?") :
+                    if not is_null( data[eid]["name"] ) :
                         name = data[eid]["name"]
 # types
 #
@@ -290,6 +299,10 @@ class StarParser( sas.ContentHandler, sas.ErrorHandler ) :
 #
     _data = None
 
+# get unquoted "." and "?" as sas.INAPPLICABLE and sas.UNKNOWN
+#
+    null_values = True
+
     #
     #
     @classmethod
@@ -357,7 +370,7 @@ class StarParser( sas.ContentHandler, sas.ErrorHandler ) :
             self._entityid = val
             if not val in self._data.keys() :
                 self._data[val] = {}
-        if tag == "_Entity.Name" :
+        if (tag == "_Entity.Name") and not is_null( val ) :
             self._data[self._entityid]["name"] = str( val ).replace( "\n", " " ).strip()
 
 # 2.1 - fake entity IDs
@@ -378,12 +391,12 @@ class StarParser( sas.ContentHandler, sas.ErrorHandler ) :
 
         if (tag == "_Entity.Polymer_seq_one_letter_code_can") or (tag == "_Mol_residue_sequence") :
             seq = val.replace( "\n", "" ).replace( " ", "" ).strip()
-            if seq not in ("", "?", ".") :
+            if seq not in NULLS :
                 self._data[self._entityid]["seq_can"] = seq
 
         if tag == "_Entity.Polymer_seq_one_letter_code" :
             seq = val.replace( "\n", "" ).replace( " ", "" ).strip()
-            if seq not in ("", "?", ".") :
+            if seq not in NULLS :
                 self._data[self._entityid]["seq"] = seq
 
 # shortcut: natural source is mandatory & comes after entities -- stop parsing
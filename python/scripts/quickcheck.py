@@ -2,12 +2,28 @@
 #
 # quick STAR syntax & keyword check
 #
+# Checks one or more files, in parallel. Messages are written to stderr as text, like before,
+# unless ``-o`` or ``--json`` is given: then it writes a JSON-lines report: one line per message
+# ({"file", "line", "severity", "message"}), one per file ({"file", "ok", "errors", "warnings",
+# "time"}), and a summary at the end.
+#
+# The old form ``quickcheck.py infile taglist`` still works: if there are exactly two file
+# arguments, no ``-t``, and the second one is not a STAR file, it is the tag list.
+#
+# Exit status: with one file (or stdin) and text output it's 0, as it always was; with several
+# files or the JSON report it's 1 if any file failed.
+#
 
 from __future__ import absolute_import
 
 import sys
 import os
 import collections
+import argparse
+import glob
+import json
+import time
+import multiprocessing
 
 _UP = os.path.join( os.path.split( __file__ )[0], ".." )
 sys.path.append( os.path.realpath( _UP ) )
@@ -27,13 +43,16 @@ class QuickCheck( sas.ContentHandler, sas.ErrorHandler ) :
 
     Uses ```sas.ContentHandler``` so it should work on any
     kind of STAR file.
+
+    Messages are collected in ``messages`` as ``(line, severity, message)`` tuples, ``print_messages()``
+    writes them out.
     """
 
     @classmethod
     def check_nmr_star( cls, fp, dictionary = None, verbose = False ) :
         chk = cls( dictionary )
-        lex =  sas.StarLexer( fp, bufsize = 0, verbose = verbose )
-        p = sas.SansParser.parse( lexer = lex, content_handler = chk, error_handler = chk, verbose = verbose )
+        chk.parse( fp, verbose )
+        chk.print_messages()
         return (not chk._errs)
 
     @classmethod
@@ -53,19 +72,32 @@ class QuickCheck( sas.ContentHandler, sas.ErrorHandler ) :
             assert isinstance( dictionary, collections.Iterable )
         self._dict = dictionary
         self._errs = False
+        self.messages = []
+
+    def parse( self, fp, verbose = False ) :
+        lex =  sas.StarLexer( fp, bufsize = 0, verbose = verbose )
+        sas.SansParser.parse( lexer = lex, content_handler = self, error_handler = self, verbose = verbose )
+        return (not self._errs)
+
+    def print_messages( self, out = sys.stderr ) :
+        """write all messages in one go"""
+        lines = []
+        for (line, severity, msg) in self.messages :
+            lines.append( message_text( line, severity, msg ) )
+        out.write( "".join( lines ) )
 
     def fatalError( self, line, msg ) :
-        sys.stderr.write("critical parse error in line %s: %s\n" % (line, msg))
+        self.messages.append( (line, "critical parse error", msg) )
         self._errs = True
     def error( self, line, msg ) :
-        sys.stderr.write("parse error in line %s : %s\n" % (line, msg))
+        self.messages.append( (line, "parse error", msg) )
         self._errs = True
         return True
 
     # treat warnings as non-errors, for now
     #
     def warning( self, line, msg ) :
-        sys.stderr.write("parser warning in line %s : %s\n" % (line, msg))
+        self.messages.append( (line, "parser warning", msg) )
         return False
 
 
@@ -89,43 +121,184 @@ class QuickCheck( sas.ContentHandler, sas.ErrorHandler ) :
     def data( self, tag, tagline, val, valline, delim, inloop ) :
         if self._dict is not None :
             if not tag in self._dict :
-                sys.stderr.write("invalid tag in line %s : %s\n" % (tagline, tag))
+                self.messages.append( (tagline, "invalid tag", tag) )
                 self._errs = True
         return False
 
 #
+# list of valid tags: one per line, optionally quoted
+#
+def read_taglist( filename ) :
+    taglist = set()
+    with open( filename, "rU" ) as f :
+        for line in f :
+            tag = line.strip()
+            if tag == "" : continue
+            if (tag[0] == "'") and (tag[-1] == "'" ) :
+                tag = tag.strip( "'" )
+            elif (tag[0] == '"') and (tag[-1] == '"' ) :
+                tag = tag.strip( '"' )
+            if tag != "" :
+                taglist.add( tag )
+    if len( taglist ) < 1 :
+        return None
+    return taglist
+
+#
+# batch mode: each worker process reads the tag list once
 #
+_TAGLIST = None
+
+def _init_worker( taglist ) :
+    global _TAGLIST
+    _TAGLIST = taglist
+
+def check_file( filename ) :
+    """returns ``(filename, ok, messages, seconds)``"""
+    start = time.time()
+    chk = QuickCheck( _TAGLIST )
+    try :
+        with open( filename, "rU" ) as fp :
+            ok = chk.parse( fp )
+    except (IOError, OSError), e :
+        chk.messages.append( (-1, "critical parse error", str( e )) )
+        ok = False
+    return (filename, ok, chk.messages, time.time() - start)
+
+# json report lines for one file
 #
-if __name__ == "__main__" :
+def report( filename, ok, messages, secs ) :
+    lines = []
+    errors = 0
+    for (line, severity, msg) in messages :
+        if severity == "parser warning" : sev = "warning"
+        else :
+            sev = "error"
+            errors += 1
+        lines.append( json.dumps( { "file" : filename, "line" : line, "severity" : sev, "message" : msg } ) )
+    lines.append( json.dumps( { "file" : filename, "ok" : ok, "errors" : errors,
+        "warnings" : len( messages ) - errors, "time" : round( secs, 3 ) } ) )
+    lines.append( "" )
+    return ("\n".join( lines ), errors, len( messages ) - errors)
 
-    infile = None
-    dictfile = None
-    if len( sys.argv ) > 1 :
-        infile = sys.argv[1]
-    if len( sys.argv ) > 2 :
-        dictfile = sys.argv[2]
+# one message as printed by the old single-file version (no space before colon in critical errors)
+#
+def message_text( line, severity, msg ) :
+    if severity == "critical parse error" : return "%s in line %s: %s\n" % (severity, line, msg)
+    return "%s in line %s : %s\n" % (severity, line, msg)
 
-    taglist = set()
-    if dictfile is not None :
-        with open( dictfile, "rU" ) as f :
+# text lines for one file, as printed by the old single-file version
+#
+def text_report( filename, ok, messages, prefix = False ) :
+    lines = []
+    for (line, severity, msg) in messages :
+        if prefix : lines.append( "%s: " % (filename,) )
+        lines.append( message_text( line, severity, msg ) )
+    if not ok :
+        lines.append( "%s check failed!\n" % (filename,) )
+    return "".join( lines )
+
+# STAR file: first line that isn't blank or a comment starts a data (or global) block
+#
+def is_star_file( filename ) :
+    try :
+        with open( filename, "rU" ) as f :
             for line in f :
-                tag = line.strip()
-                if (tag[0] == "'") and (tag[-1] == "'" ) :
-                    tag = tag.strip( "'" )
-                elif (tag[0] == '"') and (tag[-1] == '"' ) :
-                    tag = tag.strip( '"' )
-                if tag != "" :
-                    taglist.add( tag )
-    if len( taglist ) < 1 :
-        taglist = None
+                line = line.strip()
+                if (line == "") or line.startswith( "#" ) : continue
+                return line.lower().startswith( ("data_", "global_") )
+    except (IOError, OSError) :
+        return True
+    return False
 
-    if infile is None :
-        rc = QuickCheck.check_nmr_star( fp = sys.stdin, dictionary = taglist, verbose = False ) # True )
-    else :
-        rc = QuickCheck.check_nmr_star_file( filename = infile, dictionary = taglist, verbose = False ) # = True )
-    if not rc :
-        sys.stderr.write( "%s check failed!\n" % ((infile is None and "stdin" or infile),) )
+# expand globs and file lists
+#
+def input_files( args, listfile = None ) :
+    rc = []
+    for arg in args :
+        names = glob.glob( arg )
+        if len( names ) < 1 : names = [arg]
+        rc.extend( sorted( names ) )
+    if listfile is not None :
+        f = (listfile == "-") and sys.stdin or open( listfile, "rU" )
+        for line in f :
+            if line.strip() != "" : rc.append( line.strip() )
+        if f is not sys.stdin : f.close()
+    return rc
+
+#
+#
+#
+if __name__ == "__main__" :
+
+    par = argparse.ArgumentParser( description = "check STAR file(s)" )
+    par.add_argument( "-t", "--tags", dest = "tags", help = "list of valid tags, one per line" )
+    par.add_argument( "-l", "--list", dest = "listfile", help = "file with list of input files (- for stdin)" )
+    par.add_argument( "-j", "--jobs", dest = "jobs", type = int, default = multiprocessing.cpu_count(),
+        help = "number of worker processes" )
+    par.add_argument( "-o", "--output", dest = "output", help = "JSON-lines report file" )
+    par.add_argument( "--json", dest = "json", action = "store_true", default = False,
+        help = "write JSON-lines report to stdout instead of text to stderr" )
+    par.add_argument( "files", nargs = "*", help = "input files or glob patterns" )
+    args = par.parse_args()
 
+    taglist = None
+    if args.tags is not None :
+        taglist = read_taglist( args.tags )
+
+# single file on stdin: old-style text output
+#
+    files = input_files( args.files, args.listfile )
+
+# old style "quickcheck.py infile taglist"
 #
-# eof
+    if (args.tags is None) and (args.listfile is None) and (len( args.files ) == 2) and (len( files ) == 2) \
+            and (not is_star_file( files[1] )) :
+        taglist = read_taglist( files[1] )
+        files = files[:1]
+
+    if len( files ) < 1 :
+        rc = QuickCheck.check_nmr_star( fp = sys.stdin, dictionary = taglist, verbose = False )
+        if not rc :
+            sys.stderr.write( "stdin check failed!\n" )
+        sys.exit( 0 )
+
+    text = (args.output is None) and (not args.json)
+    out = sys.stdout
+    if args.output is not None :
+        out = open( args.output, "wb" )
+
+    start = time.time()
+    if (args.jobs < 2) or (len( files ) < 2) :
+        _init_worker( taglist )
+        results = (check_file( f ) for f in files)
+        pool = None
+    else :
+        pool = multiprocessing.Pool( processes = args.jobs, initializer = _init_worker, initargs = (taglist,) )
+        results = pool.imap_unordered( check_file, files )
+
+    failed = 0
+    errors = 0
+    warnings = 0
+    for (filename, ok, messages, secs) in results :
+        (lines, errs, warns) = report( filename, ok, messages, secs )
+        if text : sys.stderr.write( text_report( filename, ok, messages, len( files ) > 1 ) )
+        else : out.write( lines )
+        if not ok : failed += 1
+        errors += errs
+        warnings += warns
+
+    if pool is not None :
+        pool.close()
+        pool.join()
+
+    if not text :
+        out.write( json.dumps( { "summary" : { "files" : len( files ), "failed" : failed, "errors" : errors,
+            "warnings" : warnings, "time" : round( time.time() - start, 3 ) } } ) )
+        out.write( "\n" )
+    if out is not sys.stdout : out.close()
+
+# exit status: single file with text output like the old version (always 0), else 1 if any failed
 #
+    if text and (len( files ) < 2) : sys.exit( 0 )
+    sys.exit( failed > 0 and 1 or 0 )